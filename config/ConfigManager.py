@@ -22,6 +22,17 @@ class ConfigManager:
         },
         "file_handling": {
             "overwrite": True
+        },
+        "delete": {
+            "mode": "balanced_groups",
+            "same_remark": False
+        },
+        "performance": {
+            "parallel_workers": 1,
+            "parallel_min_rows": 20000,
+            "io_workers": 4,
+            "source_cache_dir": "cache/paste_sources",
+            "source_cache_mb": 512
         }
     }
 
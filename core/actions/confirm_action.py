@@ -9,6 +9,11 @@ def do_actions_sequential(app, tasks):
     - 依序執行多個工具
     - 每完成一個工具更新 ProgressBar
     - 任何錯誤或取消會停止後續工具
+
+    勾選多個工具時共用同一份 workbook，最後只存檔一次：
+    - 在工具之間按下停止：已完成的工具結果照常存檔
+    - 工具執行中發生錯誤 (或於執行中途被中止)：記憶體中已混入該工具做到一半的變更，
+      無法只保留已完成的部分，因此整份不存檔，並在錯誤視窗中列出未儲存的已完成工具
     """
     if not tasks:
         return
@@ -25,8 +30,13 @@ def do_actions_sequential(app, tasks):
 
     def worker():
         cancelled = False
+        completed = []  # 已完成的工具名稱 (共用工作階段時尚未存檔)
 
         try:
+            # 勾選多個工具時：共用同一份 workbook，只載入一次、最後只存檔一次
+            if total > 1:
+                app.controller.open_session(app.controller.file_path)
+
             for index, (action_name, display_name) in enumerate(tasks, start=1):
 
                 # 🔴 若使用者按了取消：立即停止
@@ -54,16 +64,23 @@ def do_actions_sequential(app, tasks):
                     getattr(app, "append_log")(f"------------- {name} 模組完成 -------------\n"),
                     app.status_label.configure(text=f"狀態：已完成「{name}」")
                 ])
+                completed.append(display_name)
 
 
+            # ---- 收尾：在工具之間中止時，已完成的工具結果仍要存檔 ----
+            if completed:
+                app.controller.commit_session()
+            else:
+                app.controller.discard_session()
 
-            # ---- 收尾 ----
             if cancelled:
                 # 使用者中止
                 app.after(0, lambda: [
 
                     app.status_label.configure(text="狀態：已中止執行"),
-                    getattr(app, "append_log")("⛔ 任務已被使用者中止，後續工具未執行。")
+                    getattr(app, "append_log")("⛔ 任務已被使用者中止，後續工具未執行。"),
+                    getattr(app, "append_log")(
+                        f"💾 已完成的工具結果已儲存：{'、'.join(completed)}" if completed else "ℹ️ 尚未有工具完成，科餘檔未變動。")
                 ])
 
             else:
@@ -75,10 +92,16 @@ def do_actions_sequential(app, tasks):
                 ])
 
         except Exception as e:
-            # 任一工具發生錯誤
-            app.after(0, lambda err=e: [
+            # 任一工具發生錯誤 → 共用工作階段中混有做到一半的變更，整份放棄不存檔
+            shared = app.controller.session is not None
+            app.controller.discard_session()
+            notice = ""
+            if shared and completed:
+                notice = (f"\n\n⚠️ 本次所有變更都沒有儲存 (包含已完成的「{'」、「'.join(completed)}」)，"
+                          f"科餘檔維持執行前狀態，請排除問題後重新執行。")
+            app.after(0, lambda err=e, notice=notice: [
                 app.status_label.configure(text="狀態：發生錯誤，後續工具已停止"),
-                messagebox.showerror("錯誤", f"執行過程發生錯誤，已停止後續工具。\n\n{err}")
+                messagebox.showerror("錯誤", f"執行過程發生錯誤，已停止後續工具。\n\n{err}{notice}")
             ])
 
         finally:
@@ -9,6 +9,7 @@ from core.services.path_service import PathService
 from core.services.excel_service import ExcelService
 from core.services.subject_paste_service import SubjectPasteService
 from core.services.subject_update_service import SubjectUpdateService
+from core.services.workbook_session import WorkbookSession
 from config.ConfigManager import CONFIG
 
 class ExcelController:
@@ -24,6 +25,8 @@ class ExcelController:
         # ⭐ 關鍵修正：在此處初始化 SubjectPasteService
         # 之前就是少了這一行導致 'no attribute subject_paste_service' 錯誤
         self.subject_paste_service = SubjectPasteService()
+        # 多個工具串接執行時共用的科餘檔工作階段 (單一工具執行時為 None，由各模組自行存檔)
+        self.session = None
         # 用於儲存執行當下的環境變數 (廠商ID, 設定, 月份)
         self.context = {
             "vendor_id": None,
@@ -62,6 +65,33 @@ class ExcelController:
         msg = self.excel_service.process_file(self.file_path, latest, make, self.output_path)
         return msg
 
+    # =========================================================================
+    # 共用工作階段：串接多個工具時只載入 / 存檔一次
+    # =========================================================================
+
+    def open_session(self, file_path: str) -> WorkbookSession:
+        """建立共用工作階段，之後的 run_* 都會使用同一份 workbook"""
+        self.session = WorkbookSession(file_path, logger=self.app.append_log)
+        return self.session
+
+    def commit_session(self):
+        """所有工具完成後統一存檔，並結束工作階段"""
+        if self.session is None:
+            return
+        self.app.append_log("💾 正在統一儲存科餘檔...")
+        saved_path = self.session.save()
+        if saved_path:
+            self.app.append_log(f"💾 已儲存科餘檔：{saved_path}")
+        self.session = None
+
+    def discard_session(self):
+        """發生錯誤或使用者中止：放棄記憶體中的變更，不存檔"""
+        if self.session is None:
+            return
+        self.session.close()
+        self.session = None
+        self.app.append_log("⚠️ 已放棄本次未儲存的變更，科餘檔維持執行前狀態。")
+
         # 模組 1：報表貼入科目
         # =========================================================================
 
@@ -119,7 +149,8 @@ class ExcelController:
             input_folder=source_folder,
             make_month=make_month,
             vendor_id=vendor_id,
-            master_file_path=master_file
+            master_file_path=master_file,
+            session=self.session
         )
 
         return f"報表貼入完成！(廠商: {vendor_id})"
@@ -142,14 +173,15 @@ class ExcelController:
         service = SubjectUpdateService(
             file_path=file_path,
             logger=self.app.append_log,  # 寫 log 到 GUI
-            app=self.app  # ⭐ 這行很重要，給 _check_cancel 用
+            app=self.app,  # ⭐ 這行很重要，給 _check_cancel 用
+            session=self.session  # 串接執行時共用同一份 workbook
         )
 
         latest_month = self.app.latest_var.get().strip()
         make_month = self.app.make_var.get().strip()  # 製作科餘年月
 
-        # 先跑檢查
-        result = service.run_check(latest_month)
+        # 先跑檢查 (一併給製作科餘月，分類帳只需掃描一次)
+        result = service.run_check(latest_month, make_month)
 
         if not isinstance(result, dict):
             raise ValueError("回傳結果格式異常，預期為 dict")
@@ -162,8 +194,8 @@ class ExcelController:
         if self.app:
             messagebox.showinfo("完成", "✅ 所有項目均一致，開始進入下一步。")
 
-        # ✅ 呼叫下一步（更新科目分頁）
-        service.run_copy_data(make_month, latest_month)
+        # ✅ 呼叫下一步（更新科目分頁；多月補帳模式時每個月各建一張更新清單）
+        service.run_copy_data(make_month, latest_month, catch_up=self._catch_up_enabled())
 
         return result["message"]
 
@@ -172,6 +204,7 @@ class ExcelController:
         第四模組：科目明細刪除
         - 依「更新清單_XXXX」工作表中的科目列表
         - 到各科目分頁進行摘要分組，若 F/G 加總相等則刪除
+        - 設定檔 delete.mode = "offset_pairs" 時改為逐筆沖銷配對 (確認後刪除)
         """
         # ----------------------------------------------------------------------
         # ★ 關鍵修改 3：JSON 狀態檢查
@@ -186,12 +219,40 @@ class ExcelController:
         service = SubjectDeleteService(
             file_path,
             logger=self.app.append_log,  # log 丟到 GUI 右下角紀錄區
-            app=self.app  # 讓 service 可以讀取 cancel_requested
+            app=self.app,  # 讓 service 可以讀取 cancel_requested
+            session=self.session  # 串接執行時共用同一份 workbook
         )
 
-        msg = service.run_delete(make_month, latest_month)
+        if CONFIG.get('delete.mode', default="balanced_groups") == "offset_pairs":
+            return self._run_delete_offset_pairs(service, make_month, latest_month)
+
+        msg = service.run_delete(make_month, latest_month, catch_up=self._catch_up_enabled())
         return msg
 
+    def _run_delete_offset_pairs(self, service, make_month, latest_month):
+        """
+        逐筆沖銷模式 (設定檔 delete.mode = "offset_pairs")：
+        先列出候選配對到紀錄區，使用者確認後才刪除
+        """
+        pairs = service.find_offset_pairs(
+            make_month, latest_month,
+            same_remark=CONFIG.get('delete.same_remark', default=False),
+            catch_up=self._catch_up_enabled()
+        )
+        if not pairs:
+            return "ℹ️ 沒有找到可沖銷的借貸明細。"
+
+        if self.app and not messagebox.askyesno(
+                "確認刪除", f"找到 {len(pairs)} 組可沖銷的借貸明細 (明細已列在紀錄區)。\n\n確定要刪除這些列嗎？"):
+            return "ℹ️ 已取消沖銷明細刪除。"
+
+        return service.delete_offset_pairs(pairs)
+
+    def _catch_up_enabled(self) -> bool:
+        """GUI 是否勾選「多月補帳」"""
+        option = getattr(self.app, "option_catch_up", None)
+        return bool(option.get()) if option is not None else False
+
     def clear_excel(self):
         """清除目前載入的 Excel 檔案與顯示文字"""
         self.file_path = None
@@ -1,8 +1,15 @@
 # core/services/subject_delete_service.py
-from openpyxl import load_workbook
-from collections import defaultdict
 import os
 
+from config.ConfigManager import CONFIG
+from core.services.date_service import DateService
+from core.services.insert_provenance import DELETE_DONE, parse_rows
+from core.services.money import format_cents, to_cents
+from core.services.offset_matcher import OffsetPair, match_offsetting_rows
+from core.services.parallel_analysis import find_balanced_groups_many, parallel_options
+from core.services.row_compactor import delete_rows_compact, merge_runs
+from core.services.workbook_session import WorkbookSession
+
 
 class SubjectDeleteService:
     """
@@ -15,22 +22,27 @@ class SubjectDeleteService:
        - 若工作表不存在 → 記錄 log，略過
        - 以「摘要（E 欄）」分組，分別加總 F 欄與 G 欄
        - 若某個摘要下 F、G 加總相等 → 刪除該摘要的所有列
+       - 更新清單有記錄本次插入列時，只檢查這些列牽涉到的摘要群組
     """
 
-    def __init__(self, file_path: str, logger=None, app=None):
+    def __init__(self, file_path: str, logger=None, app=None, session: WorkbookSession = None, auto_save=None):
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"找不到檔案：{file_path}")
 
         self.file_path = file_path
-        # 刪除需要真正的活體 workbook
-        self.wb = load_workbook(file_path, data_only=False)
-        # ⭐️ 新增：用於可靠讀取計算值（例如 F/G 欄位）
-        self.wb_values = load_workbook(file_path, data_only=True)
         # logger：預設印到 console；若從 GUI 進來會是 app.append_log
         self.logger = logger or (lambda msg: print(msg))
         # app：用來支援「立即停止執行」的 cancel flag（可為 None）
         self.app = app
 
+        # 共用工作階段：未傳入時自行載入，並在完成後自行存檔
+        self.session = session or WorkbookSession(file_path, logger=self.logger)
+        self.auto_save = (session is None) if auto_save is None else auto_save
+        # 單次解析的雙視圖：刪除在活體 workbook 上進行，F/G 計算值由 self.book 讀取
+        self.book = self.session.book
+        self.wb = self.book.wb
+        self.sheet_names = self.session.sheet_names
+
     # ---------- 共用工具 ----------
 
     def _log(self, msg: str):
@@ -43,49 +55,61 @@ class SubjectDeleteService:
 
     # ---------- 主流程 ----------
 
-    def run_delete(self, make_month: str, latest_month: str) -> str:
+    def run_delete(self, make_month: str, latest_month: str, catch_up: bool = False) -> str:
         """
         對指定的「製作科餘月 / 最新科餘月」執行刪除流程。
+        catch_up=True 為多月補帳模式：合併 (latest_month, make_month] 各月的更新清單，
+        每個分頁只處理一次 (避免前一個月刪列後，後一個月的插入列紀錄失準)。
         回傳一段訊息（給狀態列或彈窗用）
         """
-        summary_name = f"更新清單_{make_month}"
-
-        if summary_name not in self.wb.sheetnames:
-            raise Exception(
-                f"找不到更新清單工作表「{summary_name}」，"
-                f"請先執行『科目更新』工具（第三步驟）。"
-            )
-
-        ws_summary = self.wb[summary_name]
-        self._log(f"📄 使用更新清單工作表：{summary_name}")
+        # 前面模組異動過的分頁先重算公式 (F/G 欄若有公式才會讀到最新計算值)
+        self.session.recalculate()
 
         # 1️⃣ 讀取更新清單 + 檢查 B/C 是否符合目前輸入的年月
-        subjects = self._load_and_validate_summary(ws_summary, make_month, latest_month)
+        subjects = self._collect_summary_subjects(make_month, latest_month, catch_up)
 
         if not subjects:
             msg = "ℹ️ 更新清單中沒有任何科目代號可供刪除。"
             self._log(msg)
             return msg
 
-        # 2️⃣ 逐一處理各科目分頁
+        # 2️⃣ 讀出各分頁的 E/F/G 欄 (workbook 只在這個 thread 讀寫)
+        jobs = []
+        for subject_code, summary_cells, sheet_title, inserted_rows in subjects:
+            self._check_cancel()
+
+            columns = self._read_subject_sheet(sheet_title, inserted_rows)
+            if columns is None:
+                # 分頁不存在 → 已在內部 log，略過
+                continue
+            jobs.append((subject_code, summary_cells, sheet_title, columns))
+
+        # 3️⃣ 各分頁的摘要分組判斷為純計算：資料量大時分散到多個 process，只取回決策
+        self._check_cancel()
+        decisions = find_balanced_groups_many([columns for *_, columns in jobs], **parallel_options(CONFIG))
+
+        # 4️⃣ 依決策逐一刪除
         total_deleted_rows = 0
         processed_sheets = 0
 
-        for subject_code in subjects:
+        for (subject_code, summary_cells, sheet_title, _), groups in zip(jobs, decisions):
             self._check_cancel()
 
-            deleted = self._process_subject_sheet(subject_code)
-            if deleted is None:
-                # 分頁不存在 → 已在內部 log，略過
-                continue
+            deleted = self._delete_balanced_groups(sheet_title, groups)
+
+            # 列已位移，插入列紀錄不再有效；再次執行時改為整張分頁檢查
+            self._mark_summary_rows_done(summary_cells)
 
             processed_sheets += 1
             total_deleted_rows += deleted
-            self._log(f"🧹 分頁「{subject_code}」刪除 {deleted} 列。")
+            self._log(f"🧹 分頁「{sheet_title}」刪除 {deleted} 列。")
 
-        # 3️⃣ 儲存結果
-        self.wb.save(self.file_path)
-        self._log("💾 刪除結果已儲存。")
+        # 5️⃣ 儲存結果 (共用工作階段時由 controller 統一存檔)
+        if self.auto_save:
+            self.session.save()
+            self._log("💾 刪除結果已儲存。")
+        else:
+            self._log("🕒 刪除結果暫存於記憶體，待所有模組完成後統一存檔。")
 
         summary_msg = (
             f"✅ 科目明細刪除完成。共處理 {processed_sheets} 個分頁，"
@@ -96,24 +120,63 @@ class SubjectDeleteService:
 
     # ---------- Step 1：讀取 & 驗證更新清單 ----------
 
+    def _collect_summary_subjects(self, make_month: str, latest_month: str, catch_up: bool = False):
+        """
+        讀取本次要處理的更新清單 (多月補帳模式為區間內每個月各一張)，
+        驗證年月後依分頁合併，回傳格式見 _merge_summary_entries。
+        """
+        months = DateService.months_between(latest_month, make_month) if catch_up else [make_month]
+
+        subjects = []
+        found_summaries = 0
+        for month in months:
+            summary_name = f"更新清單_{month}"
+            if summary_name not in self.sheet_names:
+                if catch_up:
+                    self._log(f"ℹ️ 沒有更新清單工作表「{summary_name}」，略過該月。")
+                    continue
+                raise Exception(
+                    f"找不到更新清單工作表「{summary_name}」，"
+                    f"請先執行『科目更新』工具（第三步驟）。"
+                )
+
+            ws_summary = self.wb[summary_name]
+            found_summaries += 1
+            self._log(f"📄 使用更新清單工作表：{summary_name}")
+            subjects.extend(
+                (ws_summary,) + entry
+                for entry in self._load_and_validate_summary(ws_summary, month, latest_month)
+            )
+
+        if not found_summaries:
+            raise Exception(
+                f"找不到 {months[0]}~{months[-1]} 任何一個月的更新清單工作表，"
+                f"請先執行『科目更新』工具（第三步驟）。"
+            )
+        return self._merge_summary_entries(subjects)
+
     def _load_and_validate_summary(self, ws_summary, make_month: str, latest_month: str):
         """
         讀取更新清單：
         - A 欄：科目代號（分頁名稱）
         - B 欄：製作科餘月
         - C 欄：最新科餘月
+        - D 欄：實際分頁 (例如 @科目)；E 欄：本次插入列；G 欄：刪除狀態
 
         若 B/C 與目前輸入不符 → 直接 raise，避免刪錯批次。
+        回傳 [(科目代號, 更新清單列號, 分頁名稱, 插入列清單 或 None), ...]；
+        舊版更新清單 (無 D/E 欄) 或已刪除過的批次，插入列為 None (整張分頁檢查)。
         """
         subjects = []
         mismatch_rows = []
 
-        for row in ws_summary.iter_rows(min_row=2):
+        for row in ws_summary.iter_rows(min_row=2, max_col=7):
             self._check_cancel()
 
             code = (str(row[0].value).strip() if row[0].value else "")
             make = (str(row[1].value).strip() if row[1].value else "")
             latest = (str(row[2].value).strip() if row[2].value else "")
+            sheet_title = (str(row[3].value).strip() if row[3].value else "") or code
 
             if not code:
                 continue  # 空白列略過
@@ -123,7 +186,11 @@ class SubjectDeleteService:
                 mismatch_rows.append((row[0].row, code, make, latest))
                 continue
 
-            subjects.append(code)
+            inserted_rows = None
+            if row[4].value and row[6].value != DELETE_DONE:
+                inserted_rows = parse_rows(row[4].value)
+
+            subjects.append((code, row[0].row, sheet_title, inserted_rows))
 
         if mismatch_rows:
             lines = [
@@ -139,85 +206,207 @@ class SubjectDeleteService:
         self._log(f"📌 更新清單中共有 {len(subjects)} 個科目需要檢查。")
         return subjects
 
-    # ---------- Step 2：處理單一科目分頁 (已修正：使用雙 Workbook 讀取計算值) ----------
+    @staticmethod
+    def _mark_summary_rows_done(summary_cells):
+        """在更新清單 G 欄標記「已刪除」(只標有插入列紀錄的列)"""
+        for ws_summary, summary_row, has_rows in summary_cells:
+            if has_rows:
+                ws_summary.cell(row=summary_row, column=7, value=DELETE_DONE)
 
-    def _process_subject_sheet(self, subject_code: str):
+    @staticmethod
+    def _merge_summary_entries(entries):
+        """
+        同一分頁在多張更新清單中出現時合併成一筆 (依首次出現順序)：
+        插入列取聯集；任一張沒有插入列紀錄 → 整張分頁檢查 (None)。
+        entries：[(更新清單工作表, 科目代號, 更新清單列號, 分頁名稱, 插入列 或 None), ...]
+        回傳：[(科目代號, [(更新清單工作表, 列號, 是否有插入列紀錄)...], 分頁名稱, 插入列 或 None), ...]
         """
-        對單一科目分頁執行：
-        - 以摘要（E 欄）分組
-        - 將該摘要底下的 F 欄、G 欄金額各自加總
-        - 若一組摘要中 F 總額 == G 總額（誤差容許 0.001）→ 刪除該摘要下所有列
-        回傳：刪除列數；若分頁不存在則回傳 None
+        merged = {}
+        for ws_summary, code, summary_row, sheet_title, inserted_rows in entries:
+            item = merged.get(sheet_title)
+            if item is None:
+                merged[sheet_title] = item = [code, [], sheet_title, []]
+            item[1].append((ws_summary, summary_row, inserted_rows is not None))
+            if inserted_rows is None or item[3] is None:
+                item[3] = None
+            else:
+                item[3].extend(inserted_rows)
+        return [tuple(item) for item in merged.values()]
+
+    # ---------- Step 2：處理單一科目分頁 (由雙視圖 cell store 讀取計算值) ----------
+
+    def _read_subject_sheet(self, sheet_title: str, inserted_rows=None):
         """
-        if subject_code not in self.wb.sheetnames:
-            self._log(f"⚠️ 找不到分頁「{subject_code}」，已略過。")
+        讀取單一科目分頁分組判斷所需的欄位 (E/F/G 計算值)：
+        inserted_rows 有值時只讀這些列的摘要所屬群組 (其餘歷史群組不動)。
+        回傳 (列號, 摘要, F, G) 四個欄清單；分頁不存在回傳 None
+        """
+        if sheet_title not in self.sheet_names:
+            self._log(f"⚠️ 找不到分頁「{sheet_title}」，已略過。")
             return None
 
-        # ⭐️ 取得兩個工作表實例 ⭐️
-        ws_live = self.wb[subject_code]  # 用於刪除列 (Live Workbook)
-        ws_data = self.wb_values[subject_code]  # 用於讀取 F/G 數值 (Data_Only Workbook)
-
-        self._log(f"🔎 開始檢查分頁：{subject_code}")
+        ws = self.wb[sheet_title]
+        self._log(f"🔎 開始檢查分頁：{sheet_title}")
 
-        # 摘要 → { "rows": [index...], "sum_f": float, "sum_g": float }
-        groups = defaultdict(lambda: {"rows": [], "sum_f": 0.0, "sum_g": 0.0})
+        if inserted_rows is None:
+            return self._read_remark_columns(ws)
+        return self._read_affected_groups(ws, inserted_rows)
 
-        # 1️⃣ 先掃描所有列，建立分組
-        # 由於讀取值是計算的基礎，使用 ws_data 的 max_row
-        for r in range(2, ws_data.max_row + 1):
-            self._check_cancel()
+    def _delete_balanced_groups(self, sheet_title: str, groups) -> int:
+        """
+        刪除 F 總額 == G 總額（以整數「分」精確比對）的摘要群組所有列。
+        groups：[(摘要, [列號...], F 合計, G 合計), ...]；回傳刪除列數
+        """
+        ws_live = self.wb[sheet_title]  # 用於刪除列 (Live Workbook)
 
-            # 摘要（E 欄）通常不會是公式，從 ws_live/ws_data 讀取皆可
-            remark = ws_data[f"E{r}"].value
-            if remark is None or str(remark).strip() == "":
-                continue  # 沒摘要就不參與刪除判斷
+        rows_to_delete = []
+        for remark, group_rows, sum_f, sum_g in groups:
+            rows_to_delete.extend(group_rows)
+            self._log(
+                f"🗑️ 摘要「{remark}」：F 合計={format_cents(sum_f)}, G 合計={format_cents(sum_g)} "
+                f"→ 標記刪除 {len(group_rows)} 列"
+            )
 
-            key = str(remark).strip()
+        if not rows_to_delete:
+            self._log(f"ℹ️ 分頁「{sheet_title}」沒有符合刪除條件的明細。")
+            return 0
 
-            # ⭐️ 關鍵修正：從 ws_data 讀取 F/G 欄位的值，確保取得的是計算結果 ⭐️
-            f_val = ws_data[f"F{r}"].value
-            g_val = ws_data[f"G{r}"].value
+        # 一次壓縮刪除：連續列合併成區段，剩餘列只位移一次 (樣式、列高跟著走)
+        runs = merge_runs(rows_to_delete)
+        deleted = delete_rows_compact(ws_live, rows_to_delete)
+        self.session.note_rows_deleted(ws_live, rows_to_delete)
+        self._log(f"✂️ 分頁「{sheet_title}」以 {len(runs)} 個連續區段刪除 {deleted} 列。")
 
-            # 由於 ws_data 是 data_only=True 模式，f_val/g_val 應該是數字或 None
-            try:
-                f_num = float(f_val) if f_val not in (None, "") else 0.0
-            except Exception:
-                # 雖然不應該發生，但作為安全機制仍保留 try/except
-                f_num = 0.0
+        # 列已位移，分頁索引與列指紋需重新掃描
+        self.session.subject_index.invalidate(ws_live)
+        self.session.row_fingerprints.invalidate(ws_live)
+        self.session.mark_dirty(ws_live, runs[0][0])
 
-            try:
-                g_num = float(g_val) if g_val not in (None, "") else 0.0
-            except Exception:
-                g_num = 0.0
+        return deleted
 
-            groups[key]["rows"].append(r)
-            groups[key]["sum_f"] += f_num
-            groups[key]["sum_g"] += g_num
+    # ---------- 逐筆沖銷配對 (先列出候選、審閱後再刪除) ----------
 
-        # 2️⃣ 判斷要刪除的列（F 總額 == G 總額 的摘要群組）
-        rows_to_delete = []
+    def find_offset_pairs(self, make_month: str, latest_month: str,
+                          same_remark: bool = False, catch_up: bool = False):
+        """
+        另一種刪除模式：在更新清單列出的每個科目分頁內，逐筆配對「借方金額 == 貸方金額」的明細。
+        same_remark=True 時只配對摘要相同的兩列。
+        只回傳候選清單 [OffsetPair, ...]，不刪除任何列；確認後再呼叫 delete_offset_pairs。
+        (設定檔 delete.mode = "offset_pairs" 時由 controller 改走此流程)
+        """
+        self.session.recalculate()
 
-        for remark, info in groups.items():
+        pairs = []
+        for subject_code, _, sheet_title, _ in self._collect_summary_subjects(make_month, latest_month, catch_up):
             self._check_cancel()
+            ws = self.sheet_names.get(sheet_title)
+            if ws is None:
+                self._log(f"⚠️ 找不到分頁「{sheet_title}」，已略過。")
+                continue
 
-            sum_f = info["sum_f"]
-            sum_g = info["sum_g"]
+            sheet_pairs = match_offsetting_rows(sheet_title, *self._read_remark_columns(ws), same_remark=same_remark)
+            self._log(f"🔗 分頁「{sheet_title}」找到 {len(sheet_pairs)} 組可沖銷的借貸明細。")
+            pairs.extend(sheet_pairs)
 
-            if abs(sum_f - sum_g) < 0.001 and info["rows"]:
-                rows_to_delete.extend(info["rows"])
-                self._log(
-                    f"🗑️ 摘要「{remark}」：F 合計={sum_f}, G 合計={sum_g} → 標記刪除 {len(info['rows'])} 列"
-                )
+        for pair in pairs:
+            self._log(f"  • {pair.describe()}")
+        return pairs
 
-        if not rows_to_delete:
-            self._log(f"ℹ️ 分頁「{subject_code}」沒有符合刪除條件的明細。")
-            return 0
+    def delete_offset_pairs(self, pairs) -> str:
+        """
+        刪除審閱後確認的沖銷配對 (每個分頁一次壓縮刪除)。
+        刪除前會重新確認列上的借貸金額仍與配對時相同，不符的配對略過不刪。
+        """
+        rows_by_sheet = {}
+        for pair in pairs:
+            rows_by_sheet.setdefault(pair.sheet_title, []).append(pair)
 
-        # 3️⃣ 由下往上刪除列，避免 row index 亂掉
-        rows_to_delete = sorted(set(rows_to_delete), reverse=True)
-        for r in rows_to_delete:
+        total_deleted_rows = 0
+        for sheet_title, sheet_pairs in rows_by_sheet.items():
             self._check_cancel()
-            # ⭐️ 關鍵修正：使用 ws_live 執行刪除 ⭐️
-            ws_live.delete_rows(r, 1)
+            ws = self.sheet_names.get(sheet_title)
+            if ws is None:
+                self._log(f"⚠️ 找不到分頁「{sheet_title}」，已略過 {len(sheet_pairs)} 組配對。")
+                continue
+
+            rows_to_delete = []
+            for pair in sheet_pairs:
+                if self._pair_still_matches(ws, pair):
+                    rows_to_delete.extend(pair.rows)
+                else:
+                    self._log(f"⚠️ 內容已變動，略過：{pair.describe()}")
+
+            deleted = delete_rows_compact(ws, rows_to_delete)
+            if deleted:
+                self.session.note_rows_deleted(ws, rows_to_delete)
+                self.session.subject_index.invalidate(ws)
+                self.session.row_fingerprints.invalidate(ws)
+                self.session.mark_dirty(ws, min(rows_to_delete))
+                self._mark_sheet_provenance_done(sheet_title)
+            total_deleted_rows += deleted
+            self._log(f"🧹 分頁「{sheet_title}」刪除 {deleted} 列沖銷明細。")
+
+        if self.auto_save:
+            self.session.save()
+            self._log("💾 刪除結果已儲存。")
+        else:
+            self._log("🕒 刪除結果暫存於記憶體，待所有模組完成後統一存檔。")
 
-        return len(rows_to_delete)
+        summary_msg = f"✅ 沖銷明細刪除完成。共處理 {len(rows_by_sheet)} 個分頁，刪除 {total_deleted_rows} 列。"
+        self._log(summary_msg)
+        return summary_msg
+
+    def _pair_still_matches(self, ws, pair: OffsetPair) -> bool:
+        """確認配對的兩列目前仍是「借方 == 貸方 == 配對金額」"""
+        debit = to_cents(self.book.value(ws.cell(row=pair.debit_row, column=6)))
+        credit = to_cents(self.book.value(ws.cell(row=pair.credit_row, column=7)))
+        return debit == pair.amount and credit == pair.amount
+
+    def _mark_sheet_provenance_done(self, sheet_title: str):
+        """分頁列已位移：所有更新清單中指向此分頁的插入列紀錄一律標記為已刪除"""
+        for ws_summary in self.wb.worksheets:
+            if not ws_summary.title.startswith("更新清單_"):
+                continue
+            for row in ws_summary.iter_rows(min_row=2, max_col=5):
+                title = (str(row[3].value).strip() if row[3].value else "") or (
+                    str(row[0].value).strip() if row[0].value else "")
+                if title == sheet_title and row[4].value:
+                    ws_summary.cell(row=row[0].row, column=7, value=DELETE_DONE)
+
+    def _read_remark_columns(self, ws):
+        """整張分頁一次讀取 E/F/G 欄：回傳 (列號, 摘要, F, G) 四個欄清單"""
+        rows, remarks, f_vals, g_vals = [], [], [], []
+        for r, (remark, f_val, g_val) in self.book.iter_values(ws, min_row=2, min_col=5, max_col=7):
+            rows.append(r)
+            remarks.append(remark)
+            f_vals.append(f_val)
+            g_vals.append(g_val)
+        return rows, remarks, f_vals, g_vals
+
+    def _read_affected_groups(self, ws, inserted_rows):
+        """
+        只讀取本次插入列所屬的摘要群組：
+        先讀 E 欄找出插入列的摘要，再只取這些摘要所在列的 F/G 計算值。
+        """
+        row_numbers, remarks = [], []
+        for r, (remark,) in self.book.iter_values(ws, min_row=2, min_col=5, max_col=5):
+            row_numbers.append(r)
+            remarks.append(self._remark_key(remark))
+
+        inserted = set(inserted_rows)
+        affected = {key for r, key in zip(row_numbers, remarks) if r in inserted and key}
+        self._log(f"🎯 依更新清單僅檢查本次插入涉及的 {len(affected)} 個摘要群組。")
+
+        rows, keys, f_vals, g_vals = [], [], [], []
+        for r, key in zip(row_numbers, remarks):
+            if key in affected:
+                rows.append(r)
+                keys.append(key)
+                f_vals.append(self.book.value(ws.cell(row=r, column=6)))
+                g_vals.append(self.book.value(ws.cell(row=r, column=7)))
+        return rows, keys, f_vals, g_vals
+
+    @staticmethod
+    def _remark_key(value) -> str:
+        """摘要分組鍵：去除前後空白；空白摘要為 "" (不參與刪除判斷)"""
+        return str(value).strip() if value is not None else ""
@@ -0,0 +1,38 @@
+# core/services/append_paste.py
+import math
+from numbers import Number
+
+import numpy as np
+
+
+def _cell_key(value):
+    """
+    儲存格值 → 比對用的正規化值：
+    - None / NaN → None (pandas 讀到的空白儲存格為 NaN)
+    - 數字一律轉 float (存檔後 100.0 會讀回 100)
+    - 其他 (字串、日期) 原樣保留
+    """
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, Number):
+        number = float(value)
+        return None if math.isnan(number) else number
+    return value
+
+
+def row_hashes(rows, width: int) -> np.ndarray:
+    """每一列 (補齊 / 截斷到 width 欄) 的雜湊值，回傳 int64 陣列"""
+    hashes = np.empty(len(rows), dtype=np.int64)
+    for i, row in enumerate(rows):
+        row = list(row[:width]) + [None] * (width - len(row))
+        hashes[i] = hash(tuple(_cell_key(v) for v in row))
+    return hashes
+
+
+def matching_prefix(existing: np.ndarray, source: np.ndarray) -> int:
+    """兩串列雜湊從頭開始連續相同的列數"""
+    n = min(len(existing), len(source))
+    mismatch = np.flatnonzero(existing[:n] != source[:n])
+    return int(mismatch[0]) if len(mismatch) else n
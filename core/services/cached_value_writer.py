@@ -0,0 +1,129 @@
+# core/services/cached_value_writer.py
+"""
+openpyxl 存檔時公式儲存格只寫公式、不寫計算值 (<v />)，
+下一個步驟若以 data_only 讀檔，所有公式都會變成 None，過去只能先用 Excel 開檔重存。
+
+本模組在 wb.save() 之後以 zipfile 重寫存好的 xlsx：
+把 DualViewWorkbook 內的計算值填回各工作表 XML 的 <v>，不必經過 Excel。
+含計算值的工作表 XML 解碼修改後寫回，其餘成員原樣 (沿用原本的壓縮方式) 寫入新檔；
+超過 4GB 的成員由 zipfile 自動改用 ZIP64。
+"""
+import copy
+import math
+import os
+import re
+import shutil
+import tempfile
+import zipfile
+from datetime import date, datetime, time
+from xml.etree import ElementTree
+
+from openpyxl.utils.datetime import to_excel
+from openpyxl.xml.constants import PKG_REL_NS, REL_NS, SHEET_MAIN_NS
+
+_ERROR_CODES = {"#NULL!", "#DIV/0!", "#VALUE!", "#REF!", "#NAME?", "#NUM!", "#N/A"}
+
+# 儲存格 <c ...>...</c> (自我結束的空白儲存格 <c r="A1"/> 不在此列)
+_CELL_RE = re.compile(r"<c\b(?P<attrs>[^>]*?)(?<!/)>(?P<body>.*?)</c>", re.S)
+_REF_RE = re.compile(r'\sr="(?P<ref>[A-Z]+\d+)"')
+_TYPE_RE = re.compile(r'\st="[^"]*"')
+_FORMULA_RE = re.compile(r"<f\b[^>]*/>|<f\b[^>]*>.*?</f>", re.S)
+_VALUE_RE = re.compile(r"<v\b[^>]*/>|<v\b[^>]*>.*?</v>", re.S)
+
+
+def _escape(text: str) -> str:
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def _encode(value):
+    """計算值 → (t 屬性, <v> 內容)；無法表示時回傳 None (該儲存格維持不寫計算值)"""
+    if isinstance(value, bool):
+        return "b", "1" if value else "0"
+    if isinstance(value, float):
+        # inf / nan 不是合法的 <v> 內容，Excel 會判定檔案毀損
+        return (None, repr(value)) if math.isfinite(value) else None
+    if isinstance(value, int):
+        return None, str(value)
+    if isinstance(value, (datetime, date, time)):
+        return None, repr(float(to_excel(value)))
+    if isinstance(value, str):
+        return ("e" if value in _ERROR_CODES else "str"), _escape(value)
+    return None
+
+
+def _sheet_parts(archive: zipfile.ZipFile) -> dict:
+    """工作表名稱 → 壓縮檔內的 XML 路徑"""
+    workbook = ElementTree.fromstring(archive.read("xl/workbook.xml"))
+    rels = ElementTree.fromstring(archive.read("xl/_rels/workbook.xml.rels"))
+    targets = {}
+    for rel in rels.iter(f"{{{PKG_REL_NS}}}Relationship"):
+        target = rel.get("Target")
+        target = target.lstrip("/") if target.startswith("/") else "xl/" + target
+        targets[rel.get("Id")] = target
+
+    parts = {}
+    for sheet in workbook.iter(f"{{{SHEET_MAIN_NS}}}sheet"):
+        target = targets.get(sheet.get(f"{{{REL_NS}}}id"))
+        if target:
+            parts[sheet.get("name")] = target
+    return parts
+
+
+def _fill_sheet(xml: str, values: dict):
+    """回傳 (新 XML, 填入的儲存格數)；只處理含 <f> 的儲存格，既有的 <v> 一律以計算值取代"""
+    filled = 0
+
+    def replace(m):
+        nonlocal filled
+        attrs, body = m.group("attrs"), m.group("body")
+        ref = _REF_RE.search(attrs)
+        formula = _FORMULA_RE.search(body)
+        if ref is None or formula is None:
+            return m.group(0)
+        encoded = _encode(values.get(ref.group("ref")))
+        if encoded is None:
+            return m.group(0)
+        data_type, text = encoded
+        attrs = _TYPE_RE.sub("", attrs) + (f' t="{data_type}"' if data_type else "")
+        filled += 1
+        return f"<c{attrs}>{formula.group(0)}<v>{text}</v></c>"
+
+    return _CELL_RE.sub(replace, xml), filled
+
+
+def write_cached_values(xlsx_path: str, values_by_sheet: dict) -> int:
+    """
+    將計算值寫回已存檔的 xlsx。
+    values_by_sheet：{工作表名稱: {"A2": 計算值, ...}}；回傳實際填入的儲存格數
+    """
+    values_by_sheet = {title: values for title, values in values_by_sheet.items() if values}
+    if not values_by_sheet:
+        return 0
+
+    with zipfile.ZipFile(xlsx_path) as source:
+        parts = _sheet_parts(source)
+        targets = {parts[title]: values for title, values in values_by_sheet.items() if title in parts}
+        if not targets:
+            return 0
+
+        total = 0
+        fd, tmp_path = tempfile.mkstemp(suffix=".xlsx", dir=os.path.dirname(os.path.abspath(xlsx_path)))
+        os.close(fd)
+        try:
+            with zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_DEFLATED, allowZip64=True) as out:
+                for info in source.infolist():
+                    # 寫入時 zipfile 會改寫 ZipInfo 的位移與大小，另複製一份，來源的 ZipInfo 保持不變
+                    out_info = copy.copy(info)
+                    if info.filename not in targets:
+                        with source.open(info) as src, out.open(out_info, "w") as dst:
+                            shutil.copyfileobj(src, dst, 1 << 20)
+                        continue
+                    xml, filled = _fill_sheet(source.read(info).decode("utf-8"), targets[info.filename])
+                    out.writestr(out_info, xml.encode("utf-8"))
+                    total += filled
+        except Exception:
+            os.remove(tmp_path)
+            raise
+
+    os.replace(tmp_path, xlsx_path)
+    return total
@@ -17,6 +17,20 @@ class DateService:
             raise ValueError(f"{label} 的月份需介於 01~12")
         return datetime(year, month, 1)
 
+    @staticmethod
+    def months_between(latest: str, make: str) -> list:
+        """
+        最新科餘月 (不含) 到製作科餘月 (含) 之間的每個民國年月，
+        例如 ("11311", "11402") → ["11312", "11401", "11402"]
+        """
+        year, month = int(latest[:3]), int(latest[3:])
+        end = (int(make[:3]), int(make[3:]))
+        months = []
+        while (year, month) < end:
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+            months.append(f"{year:03d}{month:02d}")
+        return months
+
     @classmethod
     def validate(cls, latest: str, make: str, latest_label="最新科餘時間", make_label="製作科餘時間") -> bool:
         """
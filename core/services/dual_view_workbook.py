@@ -0,0 +1,163 @@
+# core/services/dual_view_workbook.py
+import threading
+
+import openpyxl.reader.excel as excel_reader
+from openpyxl.cell.cell import Cell
+from openpyxl.reader.excel import ExcelReader
+from openpyxl.worksheet._reader import WorksheetReader, WorkSheetParser
+
+
+class _DualViewSheetParser(WorkSheetParser):
+    """
+    工作表 XML 解析器：公式儲存格同時取出「公式」與 Excel 存下的「計算值」。
+    計算值的轉型規則與 data_only=True 完全相同 (數字 / 日期 / 字串 / 布林)。
+    """
+
+    def parse_cell(self, element):
+        cell = super().parse_cell(element)
+        if cell["data_type"] == "f":
+            # 以 data_only 模式再解讀同一個 element (不會重新讀檔)
+            col_counter = self.col_counter
+            self.data_only = True
+            try:
+                cell["cached"] = super().parse_cell(element)["value"]
+            finally:
+                self.data_only = False
+                self.col_counter = col_counter
+        return cell
+
+
+class _DualViewSheetReader(WorksheetReader):
+    """建立儲存格時，順便把公式儲存格的計算值登記到共用的 cell store"""
+
+    def __init__(self, ws, xml_source, shared_strings, data_only, rich_text, cached_values=None):
+        super().__init__(ws, xml_source, shared_strings, data_only, rich_text)
+        self.parser = _DualViewSheetParser(
+            xml_source, shared_strings, data_only, ws.parent.epoch,
+            ws.parent._date_formats, ws.parent._timedelta_formats, rich_text
+        )
+        self.cached_values = cached_values
+
+    def bind_cells(self):
+        for idx, row in self.parser.parse():
+            for cell in row:
+                style = self.ws.parent._cell_styles[cell['style_id']]
+                c = Cell(self.ws, row=cell['row'], column=cell['column'], style_array=style)
+                c._value = cell['value']
+                c.data_type = cell['data_type']
+                self.ws._cells[(cell['row'], cell['column'])] = c
+                if c.data_type == "f":
+                    self.cached_values[c] = cell.get("cached")
+
+        if self.ws._cells:
+            self.ws._current_row = self.ws.max_row
+
+
+# openpyxl 的 ExcelReader 直接引用模組層級的 WorksheetReader，載入期間需暫時替換
+_READER_LOCK = threading.Lock()
+
+
+class DualViewWorkbook:
+    """
+    單次解析的雙視圖 workbook (共用 cell store)：
+    - wb          : 活體 workbook，儲存格內容為公式 (所有寫入都在這份)
+    - value(cell) : 該儲存格的「計算值」；公式儲存格回傳 Excel 快取的計算結果，
+                    其他儲存格直接回傳目前內容 (因此前一個模組的寫入會立即反映)
+
+    取代過去 data_only=True / data_only=False 各載入一次的作法。
+    計算值以「儲存格物件」為 key，插入 / 刪除列造成的位移不影響對應關係。
+    """
+
+    def __init__(self, wb, cached_values: dict):
+        self.wb = wb
+        self._cached = cached_values
+
+    @classmethod
+    def load(cls, file_path: str) -> "DualViewWorkbook":
+        """解析 xlsx 一次，同時取得公式與計算值"""
+        cached = {}
+
+        def reader_factory(ws, xml_source, shared_strings, data_only, rich_text):
+            return _DualViewSheetReader(ws, xml_source, shared_strings, data_only, rich_text,
+                                        cached_values=cached)
+
+        with _READER_LOCK:
+            original = excel_reader.WorksheetReader
+            excel_reader.WorksheetReader = reader_factory
+            try:
+                reader = ExcelReader(file_path, read_only=False, keep_vba=False,
+                                     data_only=False, keep_links=True)
+                reader.read()
+            finally:
+                excel_reader.WorksheetReader = original
+
+        return cls(reader.wb, cached)
+
+    # ---------- 工作表 ----------
+
+    def __getitem__(self, name):
+        return self.wb[name]
+
+    def __contains__(self, name):
+        return name in self.wb.sheetnames
+
+    @property
+    def sheetnames(self):
+        return self.wb.sheetnames
+
+    @property
+    def worksheets(self):
+        return self.wb.worksheets
+
+    # ---------- 儲存格 ----------
+
+    def value(self, cell):
+        """儲存格的計算值 (公式 → 快取計算結果；其他 → 目前內容)"""
+        if cell.data_type == "f":
+            return self._cached.get(cell)
+        return cell.value
+
+    def formula(self, cell):
+        """儲存格的公式字串；非公式儲存格回傳 None"""
+        return cell.value if cell.data_type == "f" else None
+
+    def set_cached_value(self, cell, value):
+        """登記 (或更新) 公式儲存格的計算值"""
+        self._cached[cell] = value
+
+    def cached_values_by_sheet(self, skip=()) -> dict:
+        """
+        存檔用：{工作表名稱: {座標: 計算值}}。
+        只包含仍在工作表上、內容仍是公式且有計算值的儲存格 (已被刪除或覆寫的略過)；
+        skip 中的儲存格 (計算值已過期) 也略過。
+        """
+        result = {}
+        for cell, value in self._cached.items():
+            if value is None or cell.data_type != "f" or cell in skip:
+                continue
+            ws = cell.parent
+            if ws._cells.get((cell.row, cell.column)) is not cell:
+                continue
+            result.setdefault(ws.title, {})[cell.coordinate] = value
+        return result
+
+    def iter_values(self, ws, min_row=1, max_row=None, min_col=1, max_col=None):
+        """
+        逐列回傳 (列號, 計算值 tuple)，取代 data_only workbook 的 iter_rows。
+        ws 可傳入工作表名稱或 Worksheet。
+        """
+        if isinstance(ws, str):
+            ws = self.wb[ws]
+        value = self.value
+        for row in ws.iter_rows(min_row=min_row, max_row=max_row, min_col=min_col, max_col=max_col):
+            if not row:
+                continue
+            yield row[0].row, tuple(value(c) for c in row)
+
+    def iter_rows(self, ws, min_row=1, max_row=None, min_col=1, max_col=None):
+        """逐列回傳 (活體儲存格 tuple, 計算值 tuple)，需要同時讀樣式與數值時使用"""
+        if isinstance(ws, str):
+            ws = self.wb[ws]
+        value = self.value
+        for row in ws.iter_rows(min_row=min_row, max_row=max_row, min_col=min_col, max_col=max_col):
+            yield row, tuple(value(c) for c in row)
@@ -0,0 +1,523 @@
+# core/services/formula_evaluator.py
+"""
+內建的簡易公式計算器 (不需要 Excel 開檔重算)：
+
+支援的公式形式
+- 數字常數、儲存格參照 (A1、$A$1、'工作表'!A1、工作表!A1)
+- 一元 / 二元 + -、括號
+- SUM(...)：參數可為範圍 (A1:B20) 或上述任意運算式，以逗號分隔
+
+不支援的公式 (其他函數、* / 、整欄範圍…) 一律不重算，保留載入時的快取值；
+但若它讀取的儲存格有異動 (或位於循環參照中)，快取值已過期，存檔時不寫回 (stale)，
+交給 Excel 開檔時重算。
+
+重算範圍以「儲存格」為單位：相依圖每個工作階段只建立一次，
+只有讀取到異動列 (遞移地) 的公式會依拓撲順序重新計算，其他公式直接沿用快取值。
+"""
+import re
+from bisect import bisect_left, bisect_right
+from collections import deque
+from datetime import datetime
+
+from openpyxl.utils.cell import column_index_from_string
+
+from core.services.formula_refs import MAX_ROW, formula_references, shift_formula_rows
+
+
+class _Unsupported(Exception):
+    """公式形式不在支援範圍內"""
+
+
+class _NotNumeric(Exception):
+    """運算元無法轉成數字 (Excel 會顯示 #VALUE!)"""
+
+
+_TOKEN_RE = re.compile(
+    r"""\s*(?:
+        (?P<ref>(?:(?:'(?P<qsheet>(?:[^']|'')+)'|(?P<sheet>[^\s'!:(),+\-*/&=<>^"]+))!)?
+                \$?(?P<c1>[A-Za-z]{1,3})\$?(?P<r1>\d+)
+                (?::\$?(?P<c2>[A-Za-z]{1,3})\$?(?P<r2>\d+))?)(?![\w(])
+      | (?P<num>\d+(?:\.\d*)?(?:[eE][+-]?\d+)?|\.\d+(?:[eE][+-]?\d+)?)
+      | (?P<func>[A-Za-z_][A-Za-z0-9_.]*)\s*\(
+      | (?P<op>[-+(),])
+    )""",
+    re.VERBOSE,
+)
+
+
+def _tokenize(text):
+    tokens = []
+    pos = 0
+    text = text.rstrip()
+    while pos < len(text):
+        m = _TOKEN_RE.match(text, pos)
+        if not m or m.end() == pos:
+            raise _Unsupported(text)
+        pos = m.end()
+        if m.group("ref"):
+            sheet = m.group("qsheet")
+            sheet = sheet.replace("''", "'") if sheet is not None else m.group("sheet")
+            r1, c1 = int(m.group("r1")), column_index_from_string(m.group("c1").upper())
+            if m.group("c2"):
+                r2, c2 = int(m.group("r2")), column_index_from_string(m.group("c2").upper())
+                tokens.append(("range", sheet, min(r1, r2), min(c1, c2), max(r1, r2), max(c1, c2)))
+            else:
+                tokens.append(("ref", sheet, r1, c1))
+        elif m.group("num"):
+            tokens.append(("num", float(m.group("num"))))
+        elif m.group("func"):
+            if m.group("func").upper() != "SUM":
+                raise _Unsupported(text)
+            tokens.append(("sum",))
+        else:
+            tokens.append(("op", m.group("op")))
+    return tokens
+
+
+class _Parser:
+    """
+    遞迴下降解析，產生巢狀 tuple 的運算樹：
+    expr := unary (('+'|'-') unary)*
+    unary := ('+'|'-') unary | primary
+    primary := num | ref | '(' expr ')' | SUM '(' arg (',' arg)* ')'
+    """
+
+    def __init__(self, tokens, sheet):
+        self.tokens = tokens
+        self.pos = 0
+        self.sheet = sheet
+
+    def _peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def _take(self):
+        token = self._peek()
+        if token is None:
+            raise _Unsupported()
+        self.pos += 1
+        return token
+
+    def _expect(self, op):
+        if self._take() != ("op", op):
+            raise _Unsupported()
+
+    def parse(self):
+        node = self._expr()
+        if self._peek() is not None:
+            raise _Unsupported()
+        return node
+
+    def _expr(self):
+        node = self._unary()
+        while self._peek() in (("op", "+"), ("op", "-")):
+            op = self._take()[1]
+            node = ("add" if op == "+" else "sub", node, self._unary())
+        return node
+
+    def _unary(self):
+        token = self._peek()
+        if token == ("op", "-"):
+            self._take()
+            return ("neg", self._unary())
+        if token == ("op", "+"):
+            self._take()
+            return self._unary()
+        return self._primary()
+
+    def _primary(self):
+        token = self._take()
+        kind = token[0]
+        if kind == "num":
+            return token
+        if kind == "ref":
+            return ("ref", token[1] or self.sheet, token[2], token[3])
+        if kind == "op" and token[1] == "(":
+            node = self._expr()
+            self._expect(")")
+            return node
+        if kind == "sum":
+            args = [self._sum_arg()]
+            while self._peek() == ("op", ","):
+                self._take()
+                args.append(self._sum_arg())
+            self._expect(")")
+            return ("sum", args)
+        raise _Unsupported()
+
+    def _sum_arg(self):
+        token = self._peek()
+        if token is not None and token[0] == "range":
+            self._take()
+            return ("range", token[1] or self.sheet) + token[2:]
+        return self._expr()
+
+
+def parse_formula(formula: str, sheet_title: str):
+    """
+    公式字串 ("=A1+SUM(B1:B3)") → 運算樹；不支援的形式回傳 None。
+    未指定工作表的參照一律視為 sheet_title 上的儲存格。
+    """
+    if not isinstance(formula, str) or not formula.startswith("="):
+        return None
+    try:
+        return _Parser(_tokenize(formula[1:]), sheet_title).parse()
+    except _Unsupported:
+        return None
+
+
+def _cells_in_range(cells, r1, c1, r2, c2):
+    """範圍內已存在的儲存格；範圍比分頁實際儲存格數還大時改掃描整個 _cells"""
+    if (r2 - r1 + 1) * (c2 - c1 + 1) > len(cells):
+        return [cell for (r, c), cell in cells.items() if r1 <= r <= r2 and c1 <= c <= c2]
+    found = (cells.get((r, c)) for r in range(r1, r2 + 1) for c in range(c1, c2 + 1))
+    return [cell for cell in found if cell is not None]
+
+
+def _round_excel(value: float):
+    """Excel 以 15 位有效數字儲存數值；整數結果存成 int"""
+    value = float(f"{value:.15g}")
+    return int(value) if value.is_integer() else value
+
+
+class _Formula:
+    """相依圖中的一個公式儲存格"""
+
+    def __init__(self, cell, host: str):
+        self.cell = cell
+        self.host = host  # 所在分頁名稱
+        self.text = cell.value
+        self.tree = parse_formula(cell.value, host)  # 不支援的形式為 None
+        self.boxes = formula_references(cell.value, host)  # [(工作表, 起列, 起欄, 迄列, 迄欄), ...]
+
+    def reads_rows(self, sheet, min_row, max_row) -> bool:
+        return any(s == sheet and r1 <= max_row and min_row <= r2 for s, r1, _, r2, _ in self.boxes)
+
+
+class _SpanIndex:
+    """
+    一個分頁上的範圍參照索引：欄 → 起列 → 依迄列排序的公式 Cell。
+    查詢 (列, 欄) 時只看該欄起列 <= 列號的群組，群組內以 bisect 取出迄列 >= 列號的公式，
+    不必逐一比對分頁上所有範圍參照 (SUM(F$2:F2)、SUM(F$2:F3)… 這類累計公式原本是平方級)。
+    排序結果在新增 / 移除後才重建 (延遲到下一次查詢)。
+    """
+
+    _WIDE = 64  # 跨欄超過此數的範圍 (例如整列) 不逐欄登記，查詢時直接比對
+
+    def __init__(self):
+        self._columns = {}  # 欄 → {起列: {(Cell, 迄列): 次數}}
+        self._sorted = {}  # 欄 → (排序後的起列, {起列: (排序後的迄列, 對應的 Cell)})
+        self._wide = {}  # Cell → [(起列, 起欄, 迄列, 迄欄), ...]
+
+    def add(self, cell, r1, c1, r2, c2):
+        if c2 - c1 >= self._WIDE:
+            self._wide.setdefault(cell, []).append((r1, c1, r2, c2))
+            return
+        for col in range(c1, c2 + 1):
+            group = self._columns.setdefault(col, {}).setdefault(r1, {})
+            group[(cell, r2)] = group.get((cell, r2), 0) + 1
+            self._sorted.pop(col, None)
+
+    def remove(self, cell, r1, c1, r2, c2):
+        if c2 - c1 >= self._WIDE:
+            self._wide.pop(cell, None)
+            return
+        for col in range(c1, c2 + 1):
+            starts = self._columns[col]
+            group = starts[r1]
+            group[(cell, r2)] -= 1
+            if not group[(cell, r2)]:
+                del group[(cell, r2)]
+                if not group:
+                    del starts[r1]
+            self._sorted.pop(col, None)
+
+    def _column(self, col):
+        index = self._sorted.get(col)
+        if index is None:
+            groups = {}
+            for r1, group in self._columns.get(col, {}).items():
+                spans = sorted((r2, id(cell), cell) for cell, r2 in group)
+                groups[r1] = ([r2 for r2, _, _ in spans], [cell for _, _, cell in spans])
+            index = self._sorted[col] = (sorted(groups), groups)
+        return index
+
+    def readers(self, row, col) -> set:
+        starts, groups = self._column(col)
+        found = set()
+        for r1 in starts[:bisect_right(starts, row)]:
+            ends, cells = groups[r1]
+            found.update(cells[bisect_left(ends, row):])
+        found.update(
+            cell for cell, boxes in self._wide.items()
+            if any(r1 <= row <= r2 and c1 <= col <= c2 for r1, c1, r2, c2 in boxes)
+        )
+        return found
+
+
+class FormulaEvaluator:
+    """
+    針對 DualViewWorkbook 的公式重算器 (每個 WorkbookSession 一個)：
+    - 第一次重算時掃描整本 workbook 一次，建立儲存格層級的相依圖：
+      公式儲存格 → 它參照的範圍；反向索引「某個儲存格被哪些公式讀取」
+    - 之後只重新掃描有異動的分頁 (mark_dirty) 來同步公式的新增 / 刪除 / 改寫
+    - 重算只從異動列範圍出發：讀取這些列的公式 (及位於其中的公式) 為起點，
+      沿反向索引找出所有下游公式，依拓撲順序計算；其他公式直接沿用快取值
+    - 分頁插入 / 刪除列後由 shift_rows 調整參照該分頁的公式列號 (openpyxl 不會調整)
+    計算結果寫回 book 的計算值 (set_cached_value)，只有數值真的改變時才寫。
+    無法計算的下游公式記在 stale，存檔時不寫回計算值。
+    """
+
+    def __init__(self, book):
+        self.book = book
+        self._formulas = None  # Cell → _Formula；None 表示尚未建立
+        self._by_host = {}  # 分頁名稱 → {公式 Cell}
+        self._readers = {}  # 被參照的分頁名稱 → {參照它的公式 Cell}
+        self._cell_readers = {}  # (分頁, 列, 欄) → {以單一儲存格參照它的公式 Cell}
+        self._range_readers = {}  # 分頁名稱 → _SpanIndex (以範圍參照它的公式)
+        self._stale_hosts = set()  # 自上次同步後內容有異動、需重新掃描公式的分頁
+        self._dirty = []  # [(分頁名稱, 起列, 迄列)]；迄列 None 表示到最後一列
+        self._shifted = set()  # 參照列號被改寫、需重新計算的公式 Cell
+        self.stale = set()  # 輸入已異動但無法重算的公式 Cell (快取值已過期)
+
+    # ---------- 相依圖維護 ----------
+
+    def mark_dirty(self, title: str, min_row: int = 1, max_row: int = None):
+        """登記分頁 title 的 min_row~max_row 列內容有異動 (max_row 為 None 表示到最後一列)"""
+        self._dirty.append((title, min_row or 1, max_row))
+        self._stale_hosts.add(title)
+
+    def _add(self, cell, host: str):
+        formula = _Formula(cell, host)
+        self._formulas[cell] = formula
+        self._by_host.setdefault(host, set()).add(cell)
+        for sheet, r1, c1, r2, c2 in formula.boxes:
+            self._readers.setdefault(sheet, set()).add(cell)
+            if r1 == r2 and c1 == c2:
+                self._cell_readers.setdefault((sheet, r1, c1), set()).add(cell)
+            else:
+                self._range_readers.setdefault(sheet, _SpanIndex()).add(cell, r1, c1, r2, c2)
+
+    def _remove(self, cell):
+        formula = self._formulas.pop(cell)
+        self._by_host[formula.host].discard(cell)
+        for sheet, r1, c1, r2, c2 in formula.boxes:
+            self._readers[sheet].discard(cell)
+            if r1 == r2 and c1 == c2:
+                self._cell_readers[(sheet, r1, c1)].discard(cell)
+            else:
+                self._range_readers[sheet].remove(cell, r1, c1, r2, c2)
+
+    def _scan_host(self, ws):
+        """同步單一分頁的公式：新增 / 內容改變的重新解析，已不是公式的移除"""
+        current = {cell for cell in ws._cells.values() if cell.data_type == "f"}
+        for cell in self._by_host.get(ws.title, set()) - current:
+            self._remove(cell)
+        for cell in current:
+            formula = self._formulas.get(cell)
+            if formula is not None and formula.text == cell.value and formula.host == ws.title:
+                continue
+            if formula is not None:
+                self._remove(cell)
+            self._add(cell, ws.title)
+
+    def _sync(self):
+        """第一次呼叫時建立整本 workbook 的相依圖，之後只重新掃描有異動的分頁"""
+        if self._formulas is None:
+            self._formulas = {}
+            hosts = self.book.wb.worksheets
+        else:
+            for title in [t for t in self._by_host if t not in self.book]:
+                for cell in list(self._by_host[title]):
+                    self._remove(cell)
+                del self._by_host[title]
+            hosts = [self.book.wb[t] for t in self._stale_hosts if t in self.book]
+        for ws in hosts:
+            self._scan_host(ws)
+        self._stale_hosts.clear()
+
+    def _live(self, cell) -> bool:
+        """公式儲存格仍在原分頁上 (沒有被刪除列移除)"""
+        formula = self._formulas.get(cell)
+        if formula is None or formula.host not in self.book:
+            return False
+        return self.book.wb[formula.host]._cells.get((cell.row, cell.column)) is cell
+
+    def shift_rows(self, title: str, shift) -> int:
+        """
+        分頁 title 插入 / 刪除列之後 (儲存格已位移) 呼叫，shift 為 RowInsert / RowDelete：
+        改寫所有參照該分頁的公式 (任何分頁上的) 列號並更新相依圖，回傳改寫的公式數。
+        """
+        self._sync()  # 先同步異動前寫入的公式，它們也要跟著位移
+        for cell in [c for c in self._by_host.get(title, ()) if not self._live(c)]:
+            self._remove(cell)  # 所在列已被刪除
+
+        rewritten = 0
+        for cell in list(self._readers.get(title, ())):
+            formula = self._formulas[cell]
+            if not self._live(cell):
+                self._remove(cell)
+                continue
+            text = shift_formula_rows(formula.text, formula.host, title, shift)
+            if text == formula.text:
+                continue
+            cell.value = text
+            self._remove(cell)
+            self._add(cell, formula.host)
+            self._shifted.add(cell)
+            rewritten += 1
+
+        # 尚未重算的異動範圍也已位移：保守地延伸到最後一列
+        self._dirty = [
+            (t, min(a, shift.first_row), None) if t == title and (b is None or b >= shift.first_row) else (t, a, b)
+            for t, a, b in self._dirty
+        ]
+        return rewritten
+
+    def _readers_of(self, cell):
+        """讀取 cell 這個位置的公式 Cell (單一儲存格參照 + 範圍參照)"""
+        host = self._formulas[cell].host
+        found = set(self._cell_readers.get((host, cell.row, cell.column), ()))
+        spans = self._range_readers.get(host)
+        if spans is not None:
+            found.update(spans.readers(cell.row, cell.column))
+        return found
+
+    # ---------- 重算 ----------
+
+    def recalculate(self) -> int:
+        """重算異動列範圍的下游公式，回傳計算值有變動的儲存格數"""
+        if not self._dirty and not self._shifted:
+            return 0
+        self._sync()
+
+        # 起點：讀取異動列的公式、位於異動列上的公式 (新寫入或被位移)、參照列號被改寫的公式
+        seeds = set(self._shifted)
+        self._shifted.clear()
+        for title, min_row, max_row in self._dirty:
+            max_row = max_row or MAX_ROW
+            seeds.update(
+                cell for cell in self._readers.get(title, ())
+                if self._formulas[cell].reads_rows(title, min_row, max_row)
+            )
+            seeds.update(cell for cell in self._by_host.get(title, ()) if min_row <= cell.row <= max_row)
+        self._dirty.clear()
+
+        # 下游：沿反向索引擴散，同時記錄範圍內的邊
+        scope = set()
+        downstream = {}
+        queue = deque(cell for cell in seeds if self._live(cell))
+        while queue:
+            cell = queue.popleft()
+            if cell in scope:
+                continue
+            scope.add(cell)
+            readers = [reader for reader in self._readers_of(cell) if self._live(reader)]
+            downstream[cell] = readers
+            queue.extend(readers)
+
+        return self._evaluate_scope(scope, downstream)
+
+    def _evaluate_scope(self, scope, downstream) -> int:
+        # Kahn 演算法：只在範圍內的公式之間建立邊 (範圍外的公式直接讀快取)
+        pending = dict.fromkeys(scope, 0)
+        upstream = {}
+        for source, readers in downstream.items():
+            for reader in readers:
+                pending[reader] += 1  # 自我參照也計入：循環，不計算
+                upstream.setdefault(reader, []).append(source)
+
+        ready = deque(cell for cell, count in pending.items() if count == 0)
+        changed = 0
+        while ready:
+            cell = ready.popleft()
+            tree = self._formulas[cell].tree
+            value = None
+            if tree is not None and not any(source in self.stale for source in upstream.get(cell, ())):
+                value = self._evaluate(tree)
+            if value is None:
+                # 不支援的公式、#VALUE!、或讀到過期的公式：保留記憶體中的值，存檔時不寫回
+                self.stale.add(cell)
+            else:
+                self.stale.discard(cell)
+                if self.book.value(cell) != value:
+                    self.book.set_cached_value(cell, value)
+                    changed += 1
+            for target in downstream.get(cell, ()):
+                if target is cell:
+                    continue
+                pending[target] -= 1
+                if pending[target] == 0:
+                    ready.append(target)
+
+        # 仍有未歸零的公式 → 循環參照，無法計算
+        self.stale.update(cell for cell, count in pending.items() if count > 0)
+        return changed
+
+    # ---------- 數值 ----------
+
+    def _evaluate(self, tree):
+        try:
+            return _round_excel(self._eval(tree))
+        except _NotNumeric:
+            return None
+
+    def _cell_value(self, sheet, row, col):
+        if sheet not in self.book:
+            raise _NotNumeric()
+        cell = self.book.wb[sheet]._cells.get((row, col))
+        return self.book.value(cell) if cell is not None else None
+
+    def _eval(self, node):
+        kind = node[0]
+        if kind == "num":
+            return node[1]
+        if kind == "ref":
+            return self._as_number(self._cell_value(*node[1:]))
+        if kind == "neg":
+            return -self._eval(node[1])
+        if kind == "add":
+            return self._eval(node[1]) + self._eval(node[2])
+        if kind == "sub":
+            return self._eval(node[1]) - self._eval(node[2])
+        if kind == "sum":
+            return sum(self._sum_arg(arg) for arg in node[1])
+        raise _NotNumeric()
+
+    def _sum_arg(self, node):
+        """SUM 參數：範圍 / 直接參照中的文字、布林、空白都忽略 (與 Excel 相同)"""
+        if node[0] == "range":
+            _, sheet, r1, c1, r2, c2 = node
+            if sheet not in self.book:
+                raise _NotNumeric()
+            cells = _cells_in_range(self.book.wb[sheet]._cells, r1, c1, r2, c2)
+            return sum(self._range_number(self.book.value(cell)) for cell in cells)
+        if node[0] == "ref":
+            return self._range_number(self._cell_value(*node[1:]))
+        return self._eval(node)
+
+    @staticmethod
+    def _range_number(value):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return 0
+        return value
+
+    @staticmethod
+    def _as_number(value):
+        """+ - 運算元：空白視為 0、布林視為 0/1、數字字串可轉換，其餘為 #VALUE!"""
+        if value is None:
+            return 0
+        if isinstance(value, bool):
+            return int(value)
+        if isinstance(value, (int, float)):
+            return value
+        if isinstance(value, datetime):
+            raise _NotNumeric()
+        if isinstance(value, str):
+            text = value.strip()
+            if text == "":
+                raise _NotNumeric()
+            try:
+                return float(text)
+            except ValueError:
+                raise _NotNumeric()
+        raise _NotNumeric()
@@ -0,0 +1,173 @@
+# core/services/formula_refs.py
+"""
+公式中的儲存格參照 (以 openpyxl 的 Tokenizer 切出運算元，任何函數都適用)：
+
+- formula_references：公式參照到的範圍 [(工作表, 起列, 起欄, 迄列, 迄欄), ...]
+- shift_formula_rows：分頁插入 / 刪除列之後，調整公式中指向該分頁的列號
+
+openpyxl 的 insert_rows / delete_rows 只移動儲存格，不會調整任何公式：
+例如 =SUM(F2:F20) 在第 12 列插入 10 列後仍是 F2:F20 (Excel 會變成 F2:F30)。
+調整規則與 Excel 相同：
+- 插入：插入位置 (含) 以下的列號往下移；範圍跨過插入位置時範圍跟著擴大
+- 刪除：被刪列以下的列號往上移；範圍內的列被刪時範圍縮小，整段都被刪 (或單一儲存格被刪) 變成 #REF!
+只處理儲存格內的公式；定義名稱、條件式格式、資料驗證不調整。
+"""
+import re
+from bisect import bisect_left
+
+from openpyxl.formula.tokenizer import Tokenizer
+from openpyxl.utils.cell import column_index_from_string
+
+MAX_ROW = 1048576
+MAX_COLUMN = 16384
+
+# 運算元：[工作表!]參照；工作表可加單引號 ('It''s')
+_OPERAND_RE = re.compile(r"^(?:(?P<prefix>(?:'(?P<qsheet>(?:[^']|'')+)'|(?P<sheet>[^'!:]+))!))?(?P<body>[^!']+)$")
+# 參照的一端：儲存格 ($A$1)、整欄 ($A)、整列 ($1)
+_PART_RE = re.compile(r"^(?P<col>\$?[A-Za-z]{1,3})?(?P<dollar>\$?)(?P<row>\d+)?$")
+
+
+def _parse_operand(value: str):
+    """
+    RANGE 運算元 → (工作表前綴文字, 工作表名稱 或 None, [(欄文字, 列的 $, 列號 或 None), ...])；
+    不是儲存格參照 (定義名稱、結構化參照…) 回傳 None
+    """
+    m = _OPERAND_RE.match(value)
+    if not m:
+        return None
+    pieces = m.group("body").split(":")
+    if len(pieces) > 2:
+        return None
+
+    parts = []
+    for piece in pieces:
+        pm = _PART_RE.match(piece)
+        if not pm or not (pm.group("col") or pm.group("row")):
+            return None
+        row = int(pm.group("row")) if pm.group("row") else None
+        parts.append((pm.group("col") or "", pm.group("dollar"), row))
+
+    kinds = {(bool(col), row is not None) for col, _, row in parts}
+    if len(kinds) != 1 or (len(parts) == 1 and kinds != {(True, True)}):
+        return None
+
+    sheet = m.group("qsheet")
+    sheet = sheet.replace("''", "'") if sheet is not None else m.group("sheet")
+    return m.group("prefix") or "", sheet, parts
+
+
+def _operands(formula: str):
+    """公式中的 RANGE 運算元 token；無法切分的公式回傳空清單"""
+    if not isinstance(formula, str) or not formula.startswith("="):
+        return None, []
+    try:
+        tokenizer = Tokenizer(formula)
+    except Exception:
+        return None, []
+    return tokenizer, [t for t in tokenizer.items if t.type == "OPERAND" and t.subtype == "RANGE"]
+
+
+def formula_references(formula: str, host_title: str):
+    """
+    公式參照到的範圍：[(工作表, 起列, 起欄, 迄列, 迄欄), ...]；
+    未指定工作表時為 host_title。整欄 / 整列參照展開到工作表邊界。
+    """
+    _, tokens = _operands(formula)
+    refs = []
+    for token in tokens:
+        parsed = _parse_operand(token.value)
+        if parsed is None:
+            continue
+        _, sheet, parts = parsed
+        rows = [row for _, _, row in parts]
+        cols = [column_index_from_string(col.lstrip("$").upper()) for col, _, _ in parts if col]
+        r1, r2 = (min(rows), max(rows)) if rows[0] is not None else (1, MAX_ROW)
+        c1, c2 = (min(cols), max(cols)) if cols else (1, MAX_COLUMN)
+        refs.append((sheet or host_title, r1, c1, r2, c2))
+    return refs
+
+
+class RowInsert:
+    """在 index 列之前插入 amount 列 (同 ws.insert_rows(index, amount))"""
+
+    def __init__(self, index: int, amount: int):
+        self.index = index
+        self.amount = amount
+        self.first_row = index  # 受影響的第一列
+
+    def single(self, row):
+        return row + self.amount if row >= self.index else row
+
+    start = end = single
+
+    def __repr__(self):
+        return f"RowInsert({self.index}, {self.amount})"
+
+
+class RowDelete:
+    """刪除 rows 中的所有列 (同 delete_rows_compact(ws, rows))"""
+
+    def __init__(self, rows):
+        self.rows = sorted(set(rows))
+        self._deleted = set(self.rows)
+        self.first_row = self.rows[0] if self.rows else MAX_ROW + 1  # 受影響的第一列
+
+    def _mapped(self, row):
+        return row - bisect_left(self.rows, row)
+
+    def single(self, row):
+        """單一儲存格：被刪除時回傳 None"""
+        return None if row in self._deleted else self._mapped(row)
+
+    def start(self, row):
+        """範圍起列：被刪除時移到下方第一個保留列"""
+        return self._mapped(row)
+
+    def end(self, row):
+        """範圍迄列：被刪除時移到上方最後一個保留列"""
+        return self._mapped(row) - 1 if row in self._deleted else self._mapped(row)
+
+    def __repr__(self):
+        return f"RowDelete({self.rows})"
+
+
+def _render_part(col, dollar, row):
+    return f"{col}{dollar}{row}" if row is not None else col
+
+
+def _shift_operand(value: str, host_title: str, target_title: str, shift):
+    parsed = _parse_operand(value)
+    if parsed is None:
+        return value
+    prefix, sheet, parts = parsed
+    if (sheet or host_title) != target_title or parts[0][2] is None:
+        return value  # 其他工作表、整欄參照不受列異動影響
+
+    if len(parts) == 1:
+        col, dollar, row = parts[0]
+        new_row = shift.single(row)
+        return f"{prefix}#REF!" if new_row is None else prefix + _render_part(col, dollar, new_row)
+
+    (col1, dollar1, row1), (col2, dollar2, row2) = parts
+    if row1 > row2:
+        (col1, dollar1, row1), (col2, dollar2, row2) = (col2, dollar2, row2), (col1, dollar1, row1)
+    new_row1, new_row2 = shift.start(row1), shift.end(row2)
+    if new_row1 > new_row2:
+        return f"{prefix}#REF!"
+    return f"{prefix}{_render_part(col1, dollar1, new_row1)}:{_render_part(col2, dollar2, new_row2)}"
+
+
+def shift_formula_rows(formula: str, host_title: str, target_title: str, shift) -> str:
+    """
+    target_title 分頁發生列異動 (shift 為 RowInsert / RowDelete) 後，
+    回傳調整過列號的公式；沒有參照到 target_title 的公式原樣回傳。
+    host_title 為公式所在的分頁 (未指定工作表的參照屬於它)。
+    """
+    tokenizer, tokens = _operands(formula)
+    changed = False
+    for token in tokens:
+        new_value = _shift_operand(token.value, host_title, target_title, shift)
+        if new_value != token.value:
+            token.value = new_value
+            changed = True
+    return tokenizer.render() if changed else formula
@@ -0,0 +1,87 @@
+# core/services/insert_provenance.py
+from core.services.row_compactor import merge_runs
+
+# 更新清單_XXXX 工作表的欄位配置 (A~C 為既有欄位，D 起為插入來源紀錄)
+SUMMARY_HEADERS = (
+    "科目代號（分頁名稱）",
+    "製作科餘月",
+    "最新科餘月",
+    "實際分頁",
+    "本次插入列",
+    "分類帳來源列",
+    "刪除狀態",
+)
+DELETE_DONE = "已刪除"
+
+
+def format_rows(rows) -> str:
+    """列號清單 → 區段字串，例如 [15, 16, 17, 30] → "15-17,30" """
+    return ",".join(
+        str(start) if start == end else f"{start}-{end}"
+        for start, end in merge_runs(rows)
+    )
+
+
+def parse_rows(text):
+    """
+    區段字串 → 列號清單 (format_rows 的反向)。
+    空白回傳 []；格式不正確回傳 None，呼叫端應改用整張分頁掃描。
+    """
+    text = str(text).strip() if text is not None else ""
+    if not text:
+        return []
+    rows = []
+    try:
+        for part in text.split(","):
+            start, _, end = part.strip().partition("-")
+            start = int(start)
+            end = int(end) if end else start
+            if start < 1 or end < start:
+                return None
+            rows.extend(range(start, end + 1))
+    except ValueError:
+        return None
+    return rows
+
+
+class InsertProvenance:
+    """
+    科目更新時每個分頁「這次插入了哪些列、來自分類帳哪些列」的紀錄。
+    寫進更新清單後，刪除模組只需檢查這些列牽涉到的摘要群組。
+    """
+
+    def __init__(self):
+        # 科目代號 → {"sheet": 實際分頁名稱, "rows": [插入列...], "ledger_rows": [分類帳列...]}
+        self._entries = {}
+
+    def record(self, subject_code: str, sheet_title: str, insert_row: int, ledger_rows):
+        entry = self._entries.setdefault(subject_code, {"sheet": sheet_title, "rows": [], "ledger_rows": []})
+        entry["rows"].extend(range(insert_row, insert_row + len(ledger_rows)))
+        entry["ledger_rows"].extend(ledger_rows)
+
+    def split(self, month_of):
+        """
+        依分類帳來源列的月份拆成多份紀錄 (多月補帳：每個月一張更新清單)。
+        month_of：分類帳列號 → 民國年月字串；回傳 {月份: InsertProvenance}
+        """
+        parts = {}
+        for subject_code, entry in self._entries.items():
+            for row, ledger_row in zip(entry["rows"], entry["ledger_rows"]):
+                part = parts.setdefault(month_of[ledger_row], InsertProvenance())
+                target = part._entries.setdefault(
+                    subject_code, {"sheet": entry["sheet"], "rows": [], "ledger_rows": []})
+                target["rows"].append(row)
+                target["ledger_rows"].append(ledger_row)
+        return parts
+
+    def get(self, subject_code: str):
+        return self._entries.get(subject_code)
+
+    def __contains__(self, subject_code):
+        return subject_code in self._entries
+
+    def __bool__(self):
+        return bool(self._entries)
+
+    def subjects(self):
+        return list(self._entries)
@@ -0,0 +1,147 @@
+# core/services/ledger_frame.py
+import re
+
+import numpy as np
+import pandas as pd
+
+from core.services.money import to_cents_array
+
+# 分類帳 A 欄日期 → 民國年月，例如 114-08-05 / 114/08 / 11408 → 11408 (模組載入時編譯一次)
+MONTH_RE = re.compile(r"^(1\d{2})[-/.]?(0[1-9]|1[0-2])")
+CARRY_FORWARD = "上期結轉"
+
+
+def _clean(value) -> str:
+    return str(value).strip() if value else ""
+
+
+def _parse_month(date_text: str) -> int:
+    m = MONTH_RE.match(date_text)
+    return int(m.group(1) + m.group(2)) if m else -1
+
+
+class LedgerScan:
+    """
+    LedgerFrame.scan 的結果：同一份分類帳資料一次產生兩張表
+      check_rows  : <= latest_month 的有效餘額列 (餘額比對用)
+      latest_rows : check_rows 中每個科目名稱的最後一列 (依科目首次出現順序)
+      window_rows : (latest_month, make_month] 區間內的明細列 (貼入科目分頁用)
+    """
+
+    def __init__(self, check_rows, latest_rows, window_rows):
+        self.check_rows = check_rows
+        self.latest_rows = latest_rows
+        self.window_rows = window_rows
+
+
+class LedgerFrame:
+    """
+    分類帳的欄式模型 (每次執行只建立一次)：
+    - 逐列讀取「分類帳」一次，把 A/C/D/I 欄整理成陣列
+    - 之後的篩選一律用向量化遮罩 (mask)，不再重複 iter_rows
+
+    欄位 (df)：
+      row      : 分類帳原始列號
+      date     : A 欄文字 (已去空白)
+      month    : A 欄解析出的民國年月 (int，無法解析為 -1)
+      is_carry : A 欄是否為「上期結轉」
+      code     : C 欄科目代號 (已去空白)
+      name     : D 欄科目名稱 (已去空白)
+      balance  : I 欄餘額 (int64，單位為「分」；無法轉數字為 0)
+      has_balance : I 欄是否可轉成數字
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+
+    @classmethod
+    def from_sheet(cls, book, ws) -> "LedgerFrame":
+        """
+        從雙視圖 workbook 的分類帳工作表建立 (只讀 A~I 欄計算值)。
+        單次串流：每列只轉字串 / 去空白 / 解析月份一次。
+        """
+        rows, dates, months, codes, names, balances = [], [], [], [], [], []
+        for row_number, values in book.iter_values(ws, min_row=2, max_col=9):
+            date_text = _clean(values[0])
+            rows.append(row_number)
+            dates.append(date_text)
+            months.append(_parse_month(date_text))
+            codes.append(_clean(values[2]))
+            names.append(_clean(values[3]))
+            balances.append(values[8])
+        return cls._build(rows, dates, months, codes, names, balances)
+
+    @classmethod
+    def from_columns(cls, rows, a_col, c_col, d_col, i_col) -> "LedgerFrame":
+        """由 A / C / D / I 欄原始值建立 (欄位順序與分類帳相同)"""
+        dates = [_clean(v) for v in a_col]
+        return cls._build(rows, dates, [_parse_month(d) for d in dates],
+                          [_clean(v) for v in c_col], [_clean(v) for v in d_col], i_col)
+
+    @classmethod
+    def _build(cls, rows, dates, months, codes, names, balances) -> "LedgerFrame":
+        date = pd.Series(dates, dtype=object)
+        balance, has_balance = to_cents_array(balances)
+        df = pd.DataFrame({
+            "row": np.asarray(rows, dtype=np.int64),
+            "date": date,
+            "month": np.asarray(months, dtype=np.int64),
+            "is_carry": (date == CARRY_FORWARD).to_numpy(),
+            "code": pd.Series(codes, dtype=object),
+            "name": pd.Series(names, dtype=object),
+            "balance": balance,
+            "has_balance": has_balance,
+        })
+        return cls(df)
+
+    def __len__(self):
+        return len(self.df)
+
+    # ---------- 遮罩 ----------
+
+    def month_upto_mask(self, target_int: int) -> np.ndarray:
+        """A 欄為 <= target 月份的日期，或為「上期結轉」"""
+        month = self.df["month"].to_numpy()
+        return ((month >= 0) & (month <= target_int)) | self.df["is_carry"].to_numpy()
+
+    def month_window_mask(self, start_int: int, end_int: int) -> np.ndarray:
+        """A 欄日期落在 (start, end] 區間"""
+        month = self.df["month"].to_numpy()
+        return (month > start_int) & (month <= end_int)
+
+    def balance_subject_mask(self) -> np.ndarray:
+        """資產負債類科目 (代號 1 / 2 開頭)、有名稱、且 I 欄可轉成數字"""
+        df = self.df
+        code_ok = df["code"].str[:1].isin(["1", "2"]).to_numpy()
+        return code_ok & (df["name"] != "").to_numpy() & df["has_balance"].to_numpy()
+
+    def select(self, mask) -> pd.DataFrame:
+        """依遮罩取出子表 (保持分類帳原始列序)"""
+        return self.df[mask]
+
+    def months_of(self, rows) -> dict:
+        """分類帳列號 → 民國年月字串 (多月補帳拆分更新清單用)"""
+        month_by_row = dict(zip(self.df["row"].tolist(), self.df["month"].tolist()))
+        return {row: str(month_by_row[row]) for row in rows}
+
+    # ---------- 合併掃描 ----------
+
+    def scan(self, latest_int: int, make_int: int = None) -> LedgerScan:
+        """
+        一次產生餘額比對與明細擷取所需的兩張表 (共用同一份解析結果)：
+        - latest_rows : 每個科目 <= latest_month 的最後一列
+        - window_rows : (latest_month, make_month] 的明細列；未給 make_int 時為空表
+        """
+        check_rows = self.select(self.month_upto_mask(latest_int) & self.balance_subject_mask())
+
+        # 每個科目取最後一列，並維持科目在分類帳中首次出現的順序
+        first_seen = check_rows["name"].drop_duplicates()
+        latest_rows = (check_rows.drop_duplicates("name", keep="last")
+                       .set_index("name", drop=False).loc[first_seen.tolist()])
+
+        if make_int is None:
+            window_rows = self.df.iloc[0:0]
+        else:
+            window_rows = self.select(self.month_window_mask(latest_int, make_int))
+
+        return LedgerScan(check_rows, latest_rows.reset_index(drop=True), window_rows)
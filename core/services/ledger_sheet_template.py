@@ -0,0 +1,45 @@
+# core/services/ledger_sheet_template.py
+from copy import copy
+
+
+def clone_style(src_cell, dest_cell):
+    """
+    同一份 workbook 內複製儲存格樣式：直接沿用 src 的樣式 ID (StyleArray)，
+    不再逐一 copy() 字型 / 框線 / 填色 / 數字格式 / 保護 / 對齊 六個物件。
+    src 沒有樣式時不動 dest (與過去逐項複製的行為相同)。
+    """
+    if src_cell.has_style:
+        dest_cell._style = copy(src_cell._style)
+
+
+class LedgerSheetTemplate:
+    """
+    新科目分頁的標頭範本 (每次執行由「分類帳」建立一次)：
+    - 欄寬：分類帳各欄的 column_dimensions 寬度
+    - 標頭：分類帳第 1 列的 (欄號, 值, 樣式 ID)
+
+    之後建立新分頁 (原名或 @科目) 時直接以 stamp() 蓋上，
+    不必每次重新走訪分類帳標頭並複製樣式物件。
+    """
+
+    def __init__(self, widths, header):
+        self.widths = widths  # {欄字母: 寬度}
+        self.header = header  # [(欄號, 值, StyleArray 或 None)]
+
+    @classmethod
+    def from_sheet(cls, ledger_ws) -> "LedgerSheetTemplate":
+        widths = {col: dim.width for col, dim in ledger_ws.column_dimensions.items()}
+        header = [
+            (col_idx, cell.value, copy(cell._style) if cell.has_style else None)
+            for col_idx, cell in enumerate(ledger_ws[1], start=1)
+        ]
+        return cls(widths, header)
+
+    def stamp(self, ws):
+        """把欄寬與標頭列 (含樣式) 套到新分頁"""
+        for col, width in self.widths.items():
+            ws.column_dimensions[col].width = width
+        for col_idx, value, style in self.header:
+            cell = ws.cell(row=1, column=col_idx, value=value)
+            if style is not None:
+                cell._style = copy(style)
@@ -0,0 +1,96 @@
+# core/services/money.py
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+import numpy as np
+import pandas as pd
+
+# 金額一律以「分」(1/100 元) 的整數運算，避免浮點誤差造成假性不符
+CENTS_PER_UNIT = 100
+_INT64_LIMIT = 2 ** 63
+
+
+def to_cents(value):
+    """
+    單一儲存格值 → 整數「分」；None、空字串或無法轉數字回傳 None。
+    以 Decimal 四捨五入，不受二進位浮點表示法影響。
+    """
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        value = int(value)  # 與 float(True) == 1.0 相同
+    if isinstance(value, str):
+        value = value.strip()
+        if not value:
+            return None
+    try:
+        amount = Decimal(str(value))
+    except (InvalidOperation, ValueError):
+        return None
+    if not amount.is_finite():
+        return None
+    return int((amount * CENTS_PER_UNIT).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def to_cents_array(values):
+    """
+    一整欄的值一次轉成 int64「分」陣列 (向量化)。
+    回傳 (cents, valid)：無法轉數字的位置 cents 為 0、valid 為 False。
+
+    結果與逐一呼叫 to_cents 完全相同：
+    - int / float 以浮點數一次乘 100 四捨五入；乘積太接近 .5 (浮點誤差可能讓進位方向不同) 的少數值
+      改用 to_cents 的 Decimal 運算
+    - 文字、布林、Decimal 等其他型別直接交給 to_cents
+    唯一的例外：超出 int64 範圍的金額 (約 9.2e16 元) 無法放進陣列，視為無法轉換。
+    """
+    series = pd.Series(values, dtype=object)
+    cents = np.zeros(len(series), dtype=np.int64)
+    valid = np.zeros(len(series), dtype=bool)
+    if series.empty:
+        return cents, valid
+
+    if pd.api.types.infer_dtype(series, skipna=True) in ("floating", "integer", "mixed-integer-float", "empty"):
+        is_number = series.notna().to_numpy()  # 整欄都是數字或空白 (常見情況)：不必逐一判斷型別
+    else:
+        is_number = series.map(_is_plain_number).to_numpy(dtype=bool)
+    numbers = series[is_number].to_numpy(dtype=np.float64)
+    finite = np.isfinite(numbers)
+
+    scaled = np.abs(numbers[finite] * CENTS_PER_UNIT)
+    whole = np.floor(scaled + 0.5)
+    # 乘積與 .5 的距離小於浮點誤差範圍 → 進位方向不確定
+    near_half = np.abs(scaled - np.floor(scaled) - 0.5) <= 1e-9 + scaled * 1e-12
+    huge = whole >= _INT64_LIMIT
+    whole[huge] = 0
+
+    positions = np.flatnonzero(is_number)[finite]
+    cents[positions] = (np.sign(numbers[finite]) * whole).astype(np.int64)
+    valid[positions] = True
+
+    # 非一般數字的值、以及接近 .5 的值：逐一以 Decimal 計算
+    exact = np.concatenate([np.flatnonzero(~is_number), positions[near_half | huge]])
+    for position in exact:
+        amount = to_cents(series.iat[position])
+        ok = amount is not None and abs(amount) < _INT64_LIMIT
+        valid[position] = ok
+        cents[position] = amount if ok else 0
+    return cents, valid
+
+
+def _is_plain_number(value) -> bool:
+    """int / float (含 numpy 數值)，不含 bool"""
+    return isinstance(value, (int, float, np.integer, np.floating)) and not isinstance(value, (bool, np.bool_))
+
+
+def format_cents(cents: int) -> str:
+    """整數「分」→ 顯示用的兩位小數字串"""
+    sign = "-" if cents < 0 else ""
+    units, rest = divmod(abs(int(cents)), CENTS_PER_UNIT)
+    return f"{sign}{units}.{rest:02d}"
+
+
+def from_cents(cents: int):
+    """整數「分」→ 寫回儲存格的數值 (整數元回傳 int，其餘回傳兩位小數的 float)"""
+    cents = int(cents)
+    if cents % CENTS_PER_UNIT == 0:
+        return cents // CENTS_PER_UNIT
+    return round(cents / CENTS_PER_UNIT, 2)
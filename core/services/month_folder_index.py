@@ -0,0 +1,46 @@
+# core/services/month_folder_index.py
+import os
+
+
+class MonthFolderIndex:
+    """
+    月份資料夾的檔名索引 (每次執行每個資料夾只 scandir 一次)：
+    取代每個模組各跑一次 glob 的作法 (網路磁碟上每次列目錄都很慢)。
+
+    比對規則與原本的 glob 搜尋相同：
+    - 一般：檔名主檔名 == 模組名稱，或以「模組名稱_」開頭
+    - 備援：檔名以「廠商代號_模組名稱」開頭
+    - 一律排除 Excel 暫存鎖定檔 (~$ 開頭) 與隱藏檔 (. 開頭，glob 也不會列出)
+    Windows 上不分大小寫 (os.path.normcase)，與 glob 行為一致。
+    """
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        self._entries = []  # [(正規化檔名, 完整路徑), ...]，依 scandir 順序
+        self._by_stem = {}  # 正規化主檔名及其每個「_」前綴 → [完整路徑, ...]
+
+        with os.scandir(folder) as it:
+            for entry in it:
+                name = entry.name
+                if name.startswith(("~$", ".")):
+                    continue
+                normalized = os.path.normcase(name)
+                self._entries.append((normalized, entry.path))
+
+                stem, _ = os.path.splitext(normalized)
+                keys = [stem]
+                pos = stem.find("_")
+                while pos != -1:
+                    keys.append(stem[:pos])
+                    pos = stem.find("_", pos + 1)
+                for key in dict.fromkeys(keys):
+                    self._by_stem.setdefault(key, []).append(entry.path)
+
+    def candidates(self, module_name: str):
+        """主檔名 == module_name 或以 module_name + "_" 開頭的檔案"""
+        return list(self._by_stem.get(os.path.normcase(module_name), []))
+
+    def vendor_candidates(self, vendor_id: str, module_name: str):
+        """檔名以 "{vendor_id}_{module_name}" 開頭的檔案 (備援搜尋)"""
+        prefix = os.path.normcase(f"{vendor_id}_{module_name}")
+        return [path for name, path in self._entries if name.startswith(prefix)]
@@ -0,0 +1,77 @@
+# core/services/offset_matcher.py
+from collections import deque
+
+from core.services.money import format_cents, to_cents_array
+
+
+class OffsetPair:
+    """
+    一組互相沖銷的借貸明細 (同一科目分頁內)：
+    debit_row 的 F 欄金額 == credit_row 的 G 欄金額
+    """
+
+    def __init__(self, sheet_title, debit_row, credit_row, amount, debit_remark, credit_remark):
+        self.sheet_title = sheet_title
+        self.debit_row = debit_row
+        self.credit_row = credit_row
+        self.amount = amount  # 整數「分」
+        self.debit_remark = debit_remark
+        self.credit_remark = credit_remark
+
+    @property
+    def rows(self):
+        return self.debit_row, self.credit_row
+
+    def describe(self) -> str:
+        """給使用者審閱的一行說明"""
+        return (
+            f"分頁「{self.sheet_title}」第 {self.debit_row} 列 借 {format_cents(self.amount)}"
+            f"（{self.debit_remark}） ↔ 第 {self.credit_row} 列 貸 {format_cents(self.amount)}"
+            f"（{self.credit_remark}）"
+        )
+
+    def __repr__(self):
+        return f"OffsetPair({self.sheet_title!r}, {self.debit_row}, {self.credit_row}, {self.amount})"
+
+
+def _remark(value) -> str:
+    return str(value).strip() if value is not None else ""
+
+
+def match_offsetting_rows(sheet_title, rows, remarks, f_vals, g_vals, same_remark=False):
+    """
+    逐筆配對借貸相同金額的明細 (線性時間)：
+    - F/G 整欄一次轉成整數「分」，以 (金額) 或 (摘要, 金額) 當雜湊桶
+    - 依列序掃描：借方列找同桶內尚未配對的貸方列，反之亦然 (先進先出)
+    - 只有借方或只有貸方、且金額不為 0 的列才參與；同列借貸皆有值者略過
+    回傳 [OffsetPair, ...]，依配對完成的順序排列。
+    """
+    f_cents, f_ok = to_cents_array(f_vals)
+    g_cents, g_ok = to_cents_array(g_vals)
+    f_has = (f_ok & (f_cents != 0)).tolist()
+    g_has = (g_ok & (g_cents != 0)).tolist()
+
+    open_debits = {}  # 桶 → deque[(列號, 摘要)]
+    open_credits = {}
+    pairs = []
+
+    for r, remark, f, g, is_debit, is_credit in zip(rows, remarks, f_cents.tolist(), g_cents.tolist(),
+                                                     f_has, g_has):
+        if is_debit == is_credit:
+            continue
+        remark = _remark(remark)
+        amount = f if is_debit else g
+        key = (remark, amount) if same_remark else amount
+
+        waiting, pending = (open_credits, open_debits) if is_debit else (open_debits, open_credits)
+        bucket = waiting.get(key)
+        if bucket:
+            other_row, other_remark = bucket.popleft()
+            if is_debit:
+                pairs.append(OffsetPair(sheet_title, r, other_row, amount, remark, other_remark))
+            else:
+                pairs.append(OffsetPair(sheet_title, other_row, r, amount, other_remark, remark))
+        else:
+            pending.setdefault(key, deque()).append((r, remark))
+
+    return pairs
@@ -0,0 +1,223 @@
+# core/services/parallel_analysis.py
+"""
+科目分頁的「純計算」分析，可分散到多個 process 執行：
+
+- 主程式 (唯一的寫入者) 先把每個分頁要用的欄位讀出來，
+  字串欄 (摘要) 先 factorize 成整數代碼、金額欄轉成整數「分」，
+  全部打包進同一塊 multiprocessing.shared_memory (int64)
+- worker 只拿到共享記憶體名稱與各分頁的位移，直接在共享陣列上計算，
+  回傳「決策」(要刪的列、要標色的列)，不回傳資料本身
+- 主程式再依決策修改 workbook
+
+資料量小於門檻時直接在目前的 process 計算 (同一份函式)，不啟動 process pool。
+預設不啟用 process pool (parallel_workers = 1)：讀取儲存格、factorize、轉「分」都在主程式，
+worker 端的 argsort / reduceat 即使 50 萬列也只需數十毫秒，
+而 Windows (spawn) 每個 worker 都要重新載入 pandas，啟動成本約 1.5 秒，平行只會變慢。
+本模組只依賴 numpy / pandas，讓 worker 啟動時不必載入 GUI 或 openpyxl。
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from core.services.money import to_cents_array
+
+
+# =========================================================================
+# 共享記憶體打包
+# =========================================================================
+
+class _PackedColumns:
+    """
+    多個分頁、每頁固定欄數的 int64 陣列，串接成一整塊連續記憶體。
+    layout[i] = (起點, 列數)；第 i 頁的第 k 欄位於 [起點 + k*列數, 起點 + (k+1)*列數)
+    """
+
+    def __init__(self, sheets_columns):
+        self.layout = []
+        total = 0
+        for columns in sheets_columns:
+            n = len(columns[0])
+            self.layout.append((total, n))
+            total += n * len(columns)
+        self.size = total
+        self.sheets_columns = sheets_columns
+
+    def fill(self, buffer: np.ndarray):
+        for (start, n), columns in zip(self.layout, self.sheets_columns):
+            for k, col in enumerate(columns):
+                buffer[start + k * n:start + (k + 1) * n] = col
+
+
+def _columns_view(buffer, start, n, count):
+    return [buffer[start + k * n:start + (k + 1) * n] for k in range(count)]
+
+
+# =========================================================================
+# 分析函式 (worker 與單一 process 共用)
+# =========================================================================
+
+def _balanced_groups(rows, codes, f_cents, g_cents):
+    """
+    摘要群組借貸相等判斷 (codes 為摘要整數代碼，-1 表示空白摘要)：
+    回傳 [(代碼, [列號...], F 合計, G 合計), ...]，依代碼 (= 摘要首次出現順序) 排列
+    """
+    valid = codes >= 0
+    if not valid.any():
+        return []
+    codes, rows, f_cents, g_cents = codes[valid], rows[valid], f_cents[valid], g_cents[valid]
+
+    order = np.argsort(codes, kind="stable")
+    sorted_codes = codes[order]
+    starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+    sum_f = np.add.reduceat(f_cents[order], starts)
+    sum_g = np.add.reduceat(g_cents[order], starts)
+
+    ends = np.r_[starts[1:], len(order)]
+    sorted_rows = rows[order]
+    return [
+        (int(sorted_codes[s]), sorted_rows[s:e].tolist(), int(sf), int(sg))
+        for s, e, sf, sg in zip(starts, ends, sum_f, sum_g)
+        if sf == sg
+    ]
+
+
+def _color_marks(e_codes, e_truthy, f_cents, f_ok, g_cents, g_ok):
+    """
+    標色決策 (索引皆為 0 起算的資料列位置)：
+    - duplicated：E 欄有值且重複出現
+    - offset    ：F 值出現在 G 欄 (或 G 值出現在 F 欄)，0 不算
+    """
+    f_ok = f_ok.astype(bool)
+    g_ok = g_ok.astype(bool)
+    counts = np.bincount(e_codes[e_codes >= 0]) if (e_codes >= 0).any() else np.zeros(0, dtype=np.int64)
+    repeated = np.zeros(len(e_codes), dtype=bool)
+    has_code = e_codes >= 0
+    repeated[has_code] = counts[e_codes[has_code]] > 1
+    duplicated = repeated & e_truthy.astype(bool)
+
+    f_set = f_cents[f_ok]
+    g_set = g_cents[g_ok]
+    offset = (f_ok & (f_cents != 0) & np.isin(f_cents, g_set)) | (g_ok & (g_cents != 0) & np.isin(g_cents, f_set))
+    return np.flatnonzero(duplicated).tolist(), np.flatnonzero(offset).tolist()
+
+
+_TASKS = {
+    "balanced_groups": (_balanced_groups, 4),
+    "color_marks": (_color_marks, 6),
+}
+
+
+def _run_on_shared(shm_name, total, task, layouts):
+    """worker 進入點：附掛共享記憶體，對分配到的分頁逐一計算並回傳決策"""
+    func, column_count = _TASKS[task]
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        buffer = np.ndarray((total,), dtype=np.int64, buffer=shm.buf)
+        decisions = [func(*_columns_view(buffer, start, n, column_count)) for start, n in layouts]
+        del buffer  # 先釋放對共享記憶體的參照，才能 close
+        return decisions
+    finally:
+        shm.close()
+
+
+def _run(task, sheets_columns, max_workers, min_rows):
+    """依資料量決定在目前 process 計算，或打包進共享記憶體交給 process pool"""
+    func, _ = _TASKS[task]
+    total_rows = sum(len(columns[0]) for columns in sheets_columns)
+    workers = min(max_workers or os.cpu_count() or 1, len(sheets_columns))
+
+    if workers <= 1 or total_rows < min_rows:
+        return [func(*columns) for columns in sheets_columns]
+
+    packed = _PackedColumns(sheets_columns)
+    shm = shared_memory.SharedMemory(create=True, size=max(packed.size, 1) * 8)
+    try:
+        buffer = np.ndarray((packed.size,), dtype=np.int64, buffer=shm.buf)
+        packed.fill(buffer)
+        del buffer
+
+        # 分頁依序輪流分給各 worker，每個 worker 一次處理一批
+        chunks = [list(range(i, len(packed.layout), workers)) for i in range(workers)]
+        results = [None] * len(packed.layout)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                (chunk, pool.submit(_run_on_shared, shm.name, packed.size, task,
+                                    [packed.layout[i] for i in chunk]))
+                for chunk in chunks if chunk
+            ]
+            for chunk, future in futures:
+                for i, decision in zip(chunk, future.result()):
+                    results[i] = decision
+        return results
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def _factorize(values, blank_is_missing=True):
+    """字串欄 → int64 代碼 (依首次出現順序)；空白 / None 為 -1。回傳 (代碼, 原值表)"""
+    series = pd.Series(values, dtype=object)
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    codes = codes.astype(np.int64)
+    if blank_is_missing:
+        codes[(series == "").to_numpy()] = -1
+    return codes, uniques
+
+
+# =========================================================================
+# 對外介面
+# =========================================================================
+
+def parallel_options(config) -> dict:
+    """
+    由設定檔取得平行分析參數 (呼叫端傳入 CONFIG，本模組不直接載入設定檔)：
+    - performance.parallel_workers  ：process 數，1 (預設) 表示不啟用 process pool，0 表示依 CPU 核心數
+    - performance.parallel_min_rows ：總列數低於此值時不啟動 process pool
+    """
+    workers = config.get("performance.parallel_workers", default=1)
+    return {
+        "max_workers": None if workers == 0 else workers,
+        "min_rows": config.get("performance.parallel_min_rows", default=20000),
+    }
+
+
+def find_balanced_groups_many(sheets, max_workers=None, min_rows=20000):
+    """
+    多個分頁一次判斷「F 總額 == G 總額」的摘要群組。
+    sheets：[(列號清單, 摘要清單, F 值清單, G 值清單), ...]
+    回傳：每頁一份 [(摘要, [列號...], F 合計, G 合計), ...]
+    """
+    prepared, uniques_list = [], []
+    for rows, remarks, f_vals, g_vals in sheets:
+        keys = [str(v).strip() if v is not None else "" for v in remarks]
+        codes, uniques = _factorize(keys)
+        f_cents, _ = to_cents_array(f_vals)
+        g_cents, _ = to_cents_array(g_vals)
+        prepared.append((np.asarray(rows, dtype=np.int64), codes, f_cents, g_cents))
+        uniques_list.append(uniques)
+
+    decisions = _run("balanced_groups", prepared, max_workers, min_rows)
+    return [
+        [(uniques[code], group_rows, sum_f, sum_g) for code, group_rows, sum_f, sum_g in groups]
+        for uniques, groups in zip(uniques_list, decisions)
+    ]
+
+
+def find_color_marks_many(sheets, max_workers=None, min_rows=20000):
+    """
+    多個分頁一次計算標色決策。
+    sheets：[(E 值清單, F 值清單, G 值清單), ...]
+    回傳：每頁一份 (重複摘要的資料列位置, 借貸對沖的資料列位置)
+    """
+    prepared = []
+    for e_vals, f_vals, g_vals in sheets:
+        e_codes, _ = _factorize(e_vals, blank_is_missing=False)
+        e_truthy = np.fromiter((bool(v) for v in e_vals), dtype=np.int64, count=len(e_vals))
+        f_cents, f_ok = to_cents_array(f_vals)
+        g_cents, g_ok = to_cents_array(g_vals)
+        prepared.append((e_codes, e_truthy, f_cents, f_ok.astype(np.int64), g_cents, g_ok.astype(np.int64)))
+
+    return _run("color_marks", prepared, max_workers, min_rows)
@@ -0,0 +1,61 @@
+# core/services/paste_manifest.py
+import json
+from datetime import datetime
+
+# 科餘主檔內記錄「每個貼入目標上次用哪一份來源、哪種裁剪方式」的隱藏工作表
+MANIFEST_SHEET = "貼入紀錄"
+MANIFEST_HEADERS = ("貼入目標", "來源模組", "來源檔名", "來源內容雜湊", "裁剪設定", "貼入時間")
+
+
+def target_key(task: dict) -> str:
+    """貼入目標識別：分頁名稱 + 貼入起點，例如 "綜合損益表-月份比較!R1C26" """
+    return f"{task['sheet']}!R{task['dest_row_start']}C{task['dest_col_start']}"
+
+
+def crop_spec(task: dict) -> str:
+    """裁剪設定的固定字串表示 (任一項改變都視為不同的貼入內容)"""
+    spec = {key: task.get(key) for key in ("module", "src_col_end", "src_indices", "append")}
+    return json.dumps(spec, ensure_ascii=False, sort_keys=True)
+
+
+class PasteManifest:
+    """
+    貼入紀錄 (存在科餘主檔的隱藏工作表)：
+    來源檔內容雜湊與裁剪設定都和上次貼入相同的目標，重新執行時可直接略過。
+    """
+
+    def __init__(self, sheet_names):
+        self.sheet_names = sheet_names
+        self._entries = {}  # 貼入目標 → (來源模組, 來源檔名, 內容雜湊, 裁剪設定, 貼入時間)
+        self._changed = False
+
+        ws = sheet_names.get(MANIFEST_SHEET)
+        if ws is not None:
+            for row in ws.iter_rows(min_row=2, max_col=len(MANIFEST_HEADERS), values_only=True):
+                if row and row[0]:
+                    self._entries[str(row[0])] = tuple(row[1:])
+
+    def is_current(self, task: dict, digest: str) -> bool:
+        entry = self._entries.get(target_key(task))
+        return entry is not None and entry[2] == digest and entry[3] == crop_spec(task)
+
+    def record(self, task: dict, file_name: str, digest: str):
+        self._entries[target_key(task)] = (
+            task["module"], file_name, digest, crop_spec(task), datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        )
+        self._changed = True
+
+    def write(self):
+        """有新紀錄時重建隱藏工作表；沒有變動則不動作"""
+        if not self._changed:
+            return False
+
+        self.sheet_names.remove_sheet(MANIFEST_SHEET)
+        ws = self.sheet_names.create_sheet(MANIFEST_SHEET)
+        ws.append(MANIFEST_HEADERS)
+        for key in sorted(self._entries):
+            ws.append((key,) + tuple(self._entries[key]))
+        ws.sheet_state = "hidden"
+
+        self._changed = False
+        return True
@@ -0,0 +1,141 @@
+# core/services/paste_plan.py
+"""
+報表貼入計畫：每個任務描述「哪個來源模組、裁剪方式、貼到哪個分頁的哪個位置」。
+
+任務欄位
+- module         : 來源模組名稱 (依 find_module_file 的規則尋找檔案)
+- sheet          : 目標分頁名稱
+- src_col_end    : 裁剪方式；整數 = 取前 N 欄 (並限制寫入寬度)、None = 全貼、
+                   "DYNAMIC_CROP_2" = 去掉末兩欄、"SIDE_CROP_2" = 只取末兩欄
+- src_indices    : 以欄位索引 (可為負數) 挑選欄位，設定時優先於 src_col_end
+- dest_row_start / dest_col_start : 貼入起點 (1 起算)
+- check          : 讀檔後的內容檢查，目前支援 "LEDGER_DATE" (分類帳未來日期)
+- append         : True 時只寫入與目標現有內容不同的尾段
+
+設定檔可用 "paste_plan": [任務, ...] 取代預設計畫。
+PastePlan 依來源模組分組：同一個來源檔案只讀取一次，檢查、裁剪、寫入都共用這一份。
+"""
+import pandas as pd
+
+DEFAULT_PASTE_PLAN = [
+    # 1. 資產負債表 (A:F, 貼入 A1)
+    {"module": "資產負債表", "sheet": "資產負債表", "src_col_end": 6, "dest_row_start": 1, "dest_col_start": 1,
+     "check": None},
+
+    # 2. 綜合損益表 (A:G, 貼入 A1)
+    {"module": "綜合損益表", "sheet": "綜合損益表", "src_col_end": 7, "dest_row_start": 1, "dest_col_start": 1,
+     "check": None},
+
+    # 3. 分類帳 (全貼, 貼入 A1, 需檢查日期；append：只寫入與現有內容不同的尾段)
+    {"module": "分類帳", "sheet": "分類帳", "src_col_end": None, "dest_row_start": 1, "dest_col_start": 1,
+     "check": "LEDGER_DATE", "append": True},
+
+    # 4. 財產目錄 (全貼, 貼入 A1)
+    {"module": "財產目錄", "sheet": "財產目錄", "src_col_end": None, "dest_row_start": 1, "dest_col_start": 1,
+     "check": None},
+
+    # 5. 綜合損益期別表 (動態裁剪末兩欄, 貼入 A1)
+    {"module": "綜合損益期別表", "sheet": "綜合損益表-月份比較", "src_col_end": "DYNAMIC_CROP_2",
+     "dest_row_start": 1, "dest_col_start": 1, "check": None},
+
+    # 綜合損益表邊欄 (末兩欄, 貼入 Z1)
+    {"module": "綜合損益期別表", "sheet": "綜合損益表-月份比較", "src_col_end": "SIDE_CROP_2",
+     "dest_row_start": 1, "dest_col_start": 26, "check": None},
+
+    # 6. 期別表負向索引邊欄 (貼入 AD/AE 欄)
+    {"module": "綜合損益期別表", "sheet": "綜合損益表-月份比較", "src_indices": [-6, -4],
+     "dest_row_start": 1, "dest_col_start": 30, "check": None},
+]
+
+_CROP_MODES = ("DYNAMIC_CROP_2", "SIDE_CROP_2")
+_CHECKS = (None, "LEDGER_DATE")
+
+
+def _normalize_task(task, index: int) -> dict:
+    if not isinstance(task, dict):
+        raise ValueError(f"貼入計畫第 {index} 項格式錯誤：必須是物件")
+    for key in ("module", "sheet"):
+        if not task.get(key):
+            raise ValueError(f"貼入計畫第 {index} 項缺少「{key}」")
+
+    task = {
+        "src_col_end": None,
+        "src_indices": None,
+        "dest_row_start": 1,
+        "dest_col_start": 1,
+        "check": None,
+        "append": False,
+        **task,
+    }
+    crop = task["src_col_end"]
+    if not (crop is None or crop in _CROP_MODES or (isinstance(crop, int) and crop > 0)):
+        raise ValueError(f"貼入計畫第 {index} 項的 src_col_end 無法辨識：{crop}")
+    if task["check"] not in _CHECKS:
+        raise ValueError(f"貼入計畫第 {index} 項的 check 無法辨識：{task['check']}")
+    return task
+
+
+def crop_source(df: pd.DataFrame, task: dict) -> pd.DataFrame:
+    """
+    依任務設定從來源 DataFrame (header=None 讀入，第 1 列即 Excel 第 1 列) 裁剪出要貼入的部分。
+    """
+    module_name = task["module"]
+    if task.get("src_indices") is not None:
+        # 負向索引邊欄：表頭 (Excel 第 1 列) 與資料一起貼入
+        try:
+            return df.iloc[:, task["src_indices"]].reset_index(drop=True)
+        except IndexError:
+            raise ValueError(f"[{module_name}] 欄位不足，無法取出第 {task['src_indices']} 欄。")
+
+    src_col_end = task["src_col_end"]
+    if src_col_end == "DYNAMIC_CROP_2":
+        # 保留所有列，只排除最後兩欄
+        if df.shape[1] < 3:
+            raise ValueError(f"[{module_name}] 欄位不足，無法裁剪末兩欄。")
+        return df.iloc[:, :-2]
+    if src_col_end == "SIDE_CROP_2":
+        # 只取末兩欄
+        if df.shape[1] < 2:
+            raise ValueError(f"[{module_name}] 欄位不足，無法複製末兩欄。")
+        return df.iloc[:, -2:]
+    if isinstance(src_col_end, int):
+        # 標準報表：切前 N 欄
+        return df.iloc[:, :src_col_end]
+    # 分類帳 / 財產目錄：全貼
+    return df
+
+
+class PastePlan:
+    """
+    編譯後的貼入計畫：
+    - tasks   : 依原順序排列的任務 (寫入順序)
+    - modules : 不重複的來源模組 (依首次出現順序)，每個模組只找檔、讀檔一次
+    """
+
+    def __init__(self, tasks):
+        if not tasks:
+            raise ValueError("貼入計畫沒有任何任務")
+        self.tasks = [_normalize_task(task, i) for i, task in enumerate(tasks, start=1)]
+        self._checks = {}
+        for task in self.tasks:
+            checks = self._checks.setdefault(task["module"], [])
+            if task["check"] and task["check"] not in checks:
+                checks.append(task["check"])
+
+    @classmethod
+    def from_config(cls, config) -> "PastePlan":
+        """設定檔有 paste_plan 時使用設定檔的計畫，否則使用 DEFAULT_PASTE_PLAN"""
+        return cls(config.get("paste_plan", default=None) or DEFAULT_PASTE_PLAN)
+
+    @property
+    def modules(self):
+        return list(self._checks)
+
+    @property
+    def sheets(self):
+        """所有目標分頁名稱 (不重複，依首次出現順序)"""
+        return list(dict.fromkeys(task["sheet"] for task in self.tasks))
+
+    def checks_for(self, module_name: str):
+        """該來源讀檔後要執行的內容檢查"""
+        return self._checks.get(module_name, [])
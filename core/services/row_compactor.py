@@ -0,0 +1,116 @@
+# core/services/row_compactor.py
+from bisect import bisect_right
+
+from openpyxl.cell.cell import Cell, MergedCell
+from openpyxl.utils import get_column_letter
+from openpyxl.worksheet.cell_range import MultiCellRange
+from openpyxl.worksheet.merge import MergedCellRange
+
+
+def merge_runs(rows):
+    """把列號整理成連續區段：[3, 4, 5, 9] → [(3, 5), (9, 9)]"""
+    runs = []
+    for r in sorted(set(rows)):
+        if runs and r == runs[-1][1] + 1:
+            runs[-1] = (runs[-1][0], r)
+        else:
+            runs.append((r, r))
+    return runs
+
+
+def delete_rows_compact(ws, rows) -> int:
+    """
+    一次刪除工作表中的多列 (取代由下往上逐列 ws.delete_rows(r, 1))：
+    - 只走訪 ws._cells 一次：刪除列上的儲存格丟棄，其餘儲存格依
+      「上方被刪列數」整段上移，儲存格物件本身 (含樣式) 原封不動
+    - 列高 / 隱藏等列屬性 (row_dimensions) 跟著所屬列一起上移
+    - 合併儲存格與 Excel 相同：範圍內的列被刪時範圍縮小，整段被刪或只剩一格時取消合併
+    - 第一個刪除列之上的內容完全不動
+    回傳實際刪除的列數 (重複列號只算一次)。
+    """
+    runs = merge_runs(rows)
+    if not runs:
+        return 0
+
+    # 各區段起點與「到該區段為止累計刪除列數」，用來二分查找每列的位移量
+    starts = [start for start, _ in runs]
+    removed_before = []
+    total = 0
+    for start, end in runs:
+        removed_before.append(total)
+        total += end - start + 1
+    first = starts[0]
+
+    def new_row_of(r):
+        """r 不在刪除區段內時的新列號；在刪除區段內回傳 None"""
+        k = bisect_right(starts, r) - 1  # 最後一個 start <= r 的區段
+        if k < 0:
+            return r
+        start, end = runs[k]
+        if r <= end:
+            return None
+        return r - removed_before[k] - (end - start + 1)
+
+    # ------ 儲存格：單次重建 (row, col) → Cell 對照 ------
+    cells = {}
+    for (r, c), cell in ws._cells.items():
+        if r < first:
+            cells[(r, c)] = cell
+            continue
+        new_r = new_row_of(r)
+        if new_r is None:
+            continue
+        cell.row = new_r
+        cells[(new_r, c)] = cell
+    ws._cells = cells
+
+    # ------ 列屬性 (列高、隱藏、大綱層級) ------
+    moved = []
+    for idx in [i for i in ws.row_dimensions if i >= first]:
+        dim = ws.row_dimensions.pop(idx)
+        new_idx = new_row_of(idx)
+        if new_idx is not None:
+            dim.index = new_idx
+            moved.append((new_idx, dim))
+    for new_idx, dim in moved:
+        ws.row_dimensions[new_idx] = dim
+
+    # ------ 合併儲存格 ------
+    if ws.merged_cells.ranges:
+        ws.merged_cells = MultiCellRange(_compact_merged_ranges(ws, runs, first))
+
+    ws._current_row = ws.max_row if ws._cells else 0
+    return total
+
+
+def _removed_between(runs, low, high):
+    """low ~ high (含) 之間被刪除的列數"""
+    return sum(max(0, min(end, high) - max(start, low) + 1) for start, end in runs)
+
+
+def _compact_merged_ranges(ws, runs, first):
+    """
+    刪除列之後的合併範圍 (儲存格已經上移)：
+    起列 = 原起列 - 上方刪除列數，列數扣掉範圍內刪除的列；
+    全部被刪或縮成單一儲存格的範圍取消合併。
+    左上角所在列被刪時，新的左上角原本是 MergedCell，換成一般儲存格 (原本的值隨被刪列消失，同 Excel)。
+    """
+    merged = []
+    for mcr in ws.merged_cells.ranges:
+        if mcr.max_row < first:
+            merged.append(mcr)
+            continue
+        kept = mcr.max_row - mcr.min_row + 1 - _removed_between(runs, mcr.min_row, mcr.max_row)
+        if kept <= 0:
+            continue
+        min_row = mcr.min_row - _removed_between(runs, 1, mcr.min_row - 1)
+        max_row = min_row + kept - 1
+
+        key = (min_row, mcr.min_col)
+        if isinstance(ws._cells.get(key), MergedCell):
+            ws._cells[key] = Cell(ws, row=min_row, column=mcr.min_col)
+        if min_row == max_row and mcr.min_col == mcr.max_col:
+            continue
+        merged.append(MergedCellRange(ws, f"{get_column_letter(mcr.min_col)}{min_row}:"
+                                          f"{get_column_letter(mcr.max_col)}{max_row}"))
+    return merged
@@ -0,0 +1,79 @@
+# core/services/row_fingerprint.py
+from collections import Counter
+
+from core.services.money import to_cents, to_cents_array
+
+
+def _text(value) -> str:
+    return str(value).strip() if value is not None else ""
+
+
+def row_fingerprint(values):
+    """
+    明細列指紋 (values 為 A~G 欄計算值)：
+    (A 日期, C 科目代號, E 摘要, F 借方「分」, G 貸方「分」)
+    """
+    return (_text(values[0]), _text(values[2]), _text(values[4]), to_cents(values[5]), to_cents(values[6]))
+
+
+class RowFingerprintIndex:
+    """
+    科目分頁的明細列指紋索引 (每份 workbook 建一次)：
+    每個分頁一個 Counter (多重集合)，記錄已存在的列指紋與次數，
+    讓重複執行科目更新時只寫入真正新增的列。
+
+    - 第一次查詢某分頁時才掃描該分頁一次 (F/G 整欄一次轉成「分」)
+    - 插入列後由呼叫端 note_insert() 更新
+    - 分頁被刪除列後呼叫 invalidate() 讓下次重新掃描
+    """
+
+    def __init__(self, book):
+        self.book = book
+        # 分頁名稱 → Counter{指紋: 次數}
+        self._counters = {}
+
+    def _scan(self, ws) -> Counter:
+        rows = [values for _, values in self.book.iter_values(ws, min_row=2, max_col=7)]
+        if not rows:
+            return Counter()
+        f_cents, f_ok = to_cents_array([v[5] for v in rows])
+        g_cents, g_ok = to_cents_array([v[6] for v in rows])
+        counter = Counter()
+        for values, f, f_valid, g, g_valid in zip(rows, f_cents.tolist(), f_ok.tolist(),
+                                                  g_cents.tolist(), g_ok.tolist()):
+            counter[(_text(values[0]), _text(values[2]), _text(values[4]),
+                     f if f_valid else None, g if g_valid else None)] += 1
+        return counter
+
+    def get(self, ws) -> Counter:
+        counter = self._counters.get(ws.title)
+        if counter is None:
+            counter = self._scan(ws)
+            self._counters[ws.title] = counter
+        return counter
+
+    def filter_new(self, ws, rows_values):
+        """
+        回傳 rows_values 中「分頁裡還沒有」的索引 (依原順序)。
+        以次數比對：分頁已有 1 筆相同指紋、本次要寫 2 筆 → 只保留第 2 筆。
+        """
+        remaining = Counter(self.get(ws))
+        keep = []
+        for idx, values in enumerate(rows_values):
+            fp = row_fingerprint(values)
+            if remaining[fp] > 0:
+                remaining[fp] -= 1
+            else:
+                keep.append(idx)
+        return keep
+
+    def note_insert(self, ws, rows_values):
+        """登記新寫入的列"""
+        self.get(ws).update(row_fingerprint(values) for values in rows_values)
+
+    def invalidate(self, ws=None):
+        """捨棄指定分頁 (未指定則全部) 的指紋，下次查詢時重新掃描"""
+        if ws is None:
+            self._counters.clear()
+        else:
+            self._counters.pop(ws.title, None)
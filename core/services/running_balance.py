@@ -0,0 +1,90 @@
+# core/services/running_balance.py
+import numpy as np
+
+from core.services.money import from_cents, to_cents, to_cents_array
+
+BALANCE_COLUMN = 9  # I 欄
+
+
+def _filled(value) -> bool:
+    return value is not None and str(value).strip() != ""
+
+
+def balance_sign(subject_code) -> int:
+    """
+    餘額方向 (依科目代號首碼)：
+    1 開頭 (資產) 餘額 = 前期 + 借 − 貸 → 1
+    2 開頭 (負債) 餘額 = 前期 − 借 + 貸 → -1
+    其他代號不重算 → 0
+    僅為預設方向：備抵科目 (例如 1 開頭的累計折舊) 方向相反，寫入前需以 balance_votes 核對
+    """
+    code = str(subject_code or "").strip()
+    if code.startswith("1"):
+        return 1
+    if code.startswith("2"):
+        return -1
+    return 0
+
+
+def _detail_columns(book, ws, min_row: int):
+    """A、C、D 欄皆有值的明細列：回傳 (I 欄儲存格, F, G, I) 四個清單"""
+    cells, f_vals, g_vals, i_vals = [], [], [], []
+    for row_cells, values in book.iter_rows(ws, min_row=min_row, max_col=BALANCE_COLUMN):
+        if len(values) < BALANCE_COLUMN:
+            continue
+        if not (_filled(values[0]) and _filled(values[2]) and _filled(values[3])):
+            continue
+        cells.append(row_cells[BALANCE_COLUMN - 1])
+        f_vals.append(values[5])
+        g_vals.append(values[6])
+        i_vals.append(values[8])
+    return cells, f_vals, g_vals, i_vals
+
+
+def balance_votes(book, ws):
+    """
+    由分頁現有的 I 欄 (既有明細 + 剛插入的分類帳餘額) 推斷餘額方向：
+    相鄰兩筆明細的餘額差 == 借 − 貸 → 借方方向一票；== 貸 − 借 → 貸方方向一票
+    (借貸相抵或 I 欄無法轉數字的列不投票)。回傳 (借方票數, 貸方票數)
+    """
+    _, f_vals, g_vals, i_vals = _detail_columns(book, ws, min_row=2)
+    if len(i_vals) < 2:
+        return 0, 0
+
+    f_cents, f_ok = to_cents_array(f_vals)
+    g_cents, g_ok = to_cents_array(g_vals)
+    i_cents, i_ok = to_cents_array(i_vals)
+    net = (np.where(f_ok, f_cents, 0) - np.where(g_ok, g_cents, 0))[1:]
+    step = np.diff(i_cents)
+    usable = i_ok[1:] & i_ok[:-1] & (net != 0)
+    return int(np.count_nonzero(usable & (step == net))), int(np.count_nonzero(usable & (step == -net)))
+
+
+def recompute_running_balance(book, ws, sign: int, anchor_row: int, anchor_balance) -> int:
+    """
+    自 anchor_row (最後一筆已核對的明細列，餘額為 anchor_balance) 之後，以 F/G 欄重算 I 欄累計餘額：
+    - A、C、D 欄皆有值的列才算明細列，其餘列 (合計、空白列) 不參與也不寫入
+    - F/G 整段一次轉成整數「分」，以一次 cumsum 得到每列餘額
+    - 只寫回數值不同的 I 欄儲存格；I 欄是公式的儲存格交給公式計算器，不覆寫
+    回傳實際寫入的儲存格數
+    """
+    cells, f_vals, g_vals, i_vals = _detail_columns(book, ws, min_row=anchor_row + 1)
+    if not cells:
+        return 0
+
+    f_cents, f_ok = to_cents_array(f_vals)
+    g_cents, g_ok = to_cents_array(g_vals)
+    deltas = sign * (np.where(f_ok, f_cents, 0) - np.where(g_ok, g_cents, 0))
+    balances = to_cents(anchor_balance) + np.cumsum(deltas)
+
+    current, current_ok = to_cents_array(i_vals)
+    changed = np.flatnonzero(~current_ok | (current != balances))
+
+    written = 0
+    for idx in changed.tolist():
+        cell = cells[idx]
+        if cell.data_type == "f":
+            continue
+        cell.value = from_cents(balances[idx])
+        written += 1
+    return written
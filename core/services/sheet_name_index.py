@@ -0,0 +1,103 @@
+# core/services/sheet_name_index.py
+
+
+class SheetNameIndex:
+    """
+    整份 workbook 共用的分頁名稱索引 (忽略全形／半形空白)：
+    - 去空白名稱 → 實際工作表 (同名時依活頁簿順序保留全部)
+    - 可見 / 隱藏狀態於查詢當下讀取 ws.sheet_state，隱藏後不必重建
+    - 「@科目」影子分頁 (原分頁已隱藏時建立) 可直接以 shadow() 查詢
+    - 透過 create_sheet / remove_sheet 新增、刪除分頁時同步更新索引
+
+    所有查詢皆為 O(1)，取代各處每次重新組出 {去空白名稱: 分頁} 的作法。
+    """
+
+    SHADOW_PREFIX = "@"
+
+    def __init__(self, wb):
+        self.wb = wb
+        self._by_title = {}
+        self._by_normalized = {}
+        self._sheet_count = 0
+        self.rebuild()
+
+    @staticmethod
+    def normalize(name) -> str:
+        """移除所有空白 (半形、全形皆同)"""
+        return "".join(str(name).split())
+
+    # ---------- 維護 ----------
+
+    def rebuild(self):
+        """依目前活頁簿內容重建索引"""
+        self._by_title = {}
+        self._by_normalized = {}
+        for ws in self.wb.worksheets:
+            self._add(ws)
+        self._sheet_count = len(self.wb._sheets)
+
+    def _add(self, ws):
+        self._by_title[ws.title] = ws
+        self._by_normalized.setdefault(self.normalize(ws.title), []).append(ws)
+
+    def _ensure_current(self):
+        # 若有人繞過索引直接新增 / 刪除分頁，張數會對不上 → 重建一次
+        if len(self.wb._sheets) != self._sheet_count:
+            self.rebuild()
+
+    def create_sheet(self, title: str):
+        """建立新分頁並加入索引"""
+        ws = self.wb.create_sheet(title)
+        self._add(ws)
+        self._sheet_count += 1
+        return ws
+
+    def remove_sheet(self, title: str):
+        """刪除分頁 (依實際名稱) 並更新索引；分頁不存在時不動作"""
+        self._ensure_current()
+        ws = self._by_title.pop(title, None)
+        if ws is None:
+            return
+        key = self.normalize(title)
+        remaining = [s for s in self._by_normalized.get(key, []) if s is not ws]
+        if remaining:
+            self._by_normalized[key] = remaining
+        else:
+            self._by_normalized.pop(key, None)
+        self.wb.remove(ws)
+        self._sheet_count -= 1
+
+    # ---------- 查詢 ----------
+
+    def get(self, title: str):
+        """依實際名稱取得分頁 (不做空白正規化)；不存在回傳 None"""
+        self._ensure_current()
+        return self._by_title.get(title)
+
+    def __contains__(self, title: str) -> bool:
+        return self.get(title) is not None
+
+    def find(self, name: str, state: str = None):
+        """
+        依去空白名稱找分頁；state 可指定 "visible" / "hidden"。
+        同名多張時回傳活頁簿中的第一張；找不到回傳 None。
+        """
+        self._ensure_current()
+        for ws in self._by_normalized.get(self.normalize(name), ()):
+            if state is None or ws.sheet_state == state:
+                return ws
+        return None
+
+    def find_visible(self, name: str):
+        return self.find(name, "visible")
+
+    def find_hidden(self, name: str):
+        return self.find(name, "hidden")
+
+    def shadow(self, name: str):
+        """取得「@名稱」影子分頁 (不存在回傳 None)"""
+        return self.get(f"{self.SHADOW_PREFIX}{name}")
+
+    def titles(self, state: str = None):
+        """依活頁簿順序列出分頁名稱 (可指定狀態)"""
+        return [ws.title for ws in self.wb.worksheets if state is None or ws.sheet_state == state]
@@ -0,0 +1,173 @@
+# core/services/source_cache.py
+"""
+來源報表的解析結果快取 (存在本機磁碟，跨執行保留)：
+
+- 重複執行「報表貼入科目」時，未變動的來源 xlsx 不必再用 pd.read_excel 解析
+- 以「路徑 + 大小 + 修改時間 + 內容雜湊」判斷是否為同一份檔案：
+  路徑、大小、修改時間都相同 → 直接命中；
+  大小或修改時間不同 → 重新計算內容雜湊，內容相同 (例如重新複製過) 仍算命中
+- DataFrame 以 pandas pickle 存檔 (保留欄位型別，載入速度遠快於解析 xlsx)
+- 快取總大小超過上限時，依最後使用時間淘汰最久未用的項目 (LRU)
+"""
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+
+# 解析參數或存檔格式改變時遞增，讓舊快取自動失效
+CACHE_FORMAT = 1
+
+_INDEX_FILE = "index.json"
+
+
+def read_with_hash(file_path: str):
+    """一次讀入整個檔案，回傳 (內容位元組, 內容雜湊 blake2b)；解析與雜湊共用同一次讀取"""
+    with open(file_path, "rb") as f:
+        data = f.read()
+    return data, hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def _path_key(file_path: str) -> str:
+    normalized = os.path.normcase(os.path.abspath(file_path))
+    return hashlib.sha1(f"{CACHE_FORMAT}|{normalized}".encode("utf-8")).hexdigest()
+
+
+class SourceCache:
+    """
+    解析結果快取。一個實例可同時給多個 thread 使用 (索引的讀寫以 lock 保護)。
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._index = None  # key → {"path", "size", "mtime_ns", "hash", "bytes", "last_used"}
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        由設定檔建立快取；performance.source_cache_mb 為 0 時停用 (回傳 None)
+        - performance.source_cache_dir ：快取資料夾 (預設 cache/paste_sources)
+        - performance.source_cache_mb  ：快取大小上限 (MB)
+        """
+        max_mb = config.get("performance.source_cache_mb", default=512)
+        if not max_mb:
+            return None
+        cache_dir = config.get("performance.source_cache_dir", default="cache/paste_sources")
+        return cls(cache_dir, int(max_mb * 1024 * 1024))
+
+    # ---------- 索引 ----------
+
+    def _index_path(self):
+        return os.path.join(self.cache_dir, _INDEX_FILE)
+
+    def _data_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def _load_index(self) -> dict:
+        if self._index is None:
+            try:
+                with open(self._index_path(), "r", encoding="utf-8") as f:
+                    index = json.load(f)
+                self._index = index if index.get("format") == CACHE_FORMAT else {"format": CACHE_FORMAT}
+            except (OSError, ValueError):
+                self._index = {"format": CACHE_FORMAT}
+            self._index.setdefault("entries", {})
+        return self._index["entries"]
+
+    def _save_index(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = self._index_path() + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._index, f, ensure_ascii=False)
+        os.replace(tmp_path, self._index_path())
+
+    def _drop(self, entries, key):
+        entries.pop(key, None)
+        try:
+            os.remove(self._data_path(key))
+        except OSError:
+            pass
+
+    def _evict(self, entries):
+        """超過大小上限時，從最久未使用的項目開始刪除"""
+        total = sum(entry["bytes"] for entry in entries.values())
+        for key in sorted(entries, key=lambda k: entries[k]["last_used"]):
+            if total <= self.max_bytes:
+                break
+            total -= entries[key]["bytes"]
+            self._drop(entries, key)
+
+    # ---------- 讀取 ----------
+
+    def load(self, file_path: str, parse):
+        """
+        取得 file_path 的解析結果：命中快取直接載入，否則呼叫 parse(來源) 並存入快取。
+        未命中時檔案只讀一次：parse 收到的是檔案內容的 BytesIO，內容雜湊由同一份位元組計算。
+        回傳 (DataFrame, 內容雜湊, 是否命中快取)
+        """
+        stat = os.stat(file_path)
+        key = _path_key(file_path)
+
+        with self._lock:
+            entry = dict(self._load_index().get(key) or {})
+
+        data = digest = None
+        if entry and (entry["size"], entry["mtime_ns"]) != (stat.st_size, stat.st_mtime_ns):
+            data, digest = read_with_hash(file_path)
+            if digest != entry["hash"]:
+                entry = {}
+
+        if entry:
+            try:
+                df = pd.read_pickle(self._data_path(key))
+            except Exception:
+                df = None
+            if df is not None:
+                with self._lock:
+                    entries = self._load_index()
+                    if key in entries:
+                        entries[key].update(size=stat.st_size, mtime_ns=stat.st_mtime_ns, last_used=time.time())
+                        try:
+                            self._save_index()
+                        except OSError:
+                            pass  # 只影響 LRU 排序，不影響本次讀取
+                return df, digest or entry["hash"], True
+
+        if data is None:
+            data, digest = read_with_hash(file_path)
+        df = parse(io.BytesIO(data))
+        self._store(key, file_path, stat, digest, df)
+        return df, digest, False
+
+    def _store(self, key, file_path, stat, digest, df):
+        data_path = self._data_path(key)
+        tmp_path = f"{data_path}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            df.to_pickle(tmp_path)
+            size = os.path.getsize(tmp_path)
+            if size > self.max_bytes:
+                os.remove(tmp_path)
+                return
+            with self._lock:
+                os.replace(tmp_path, data_path)
+                entries = self._load_index()
+                entries[key] = {
+                    "path": os.path.abspath(file_path),
+                    "size": stat.st_size,
+                    "mtime_ns": stat.st_mtime_ns,
+                    "hash": digest,
+                    "bytes": size,
+                    "last_used": time.time(),
+                }
+                self._evict(entries)
+                self._save_index()
+        except Exception:
+            # 快取寫入失敗 (磁碟已滿、權限不足…) 不影響貼入本身
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
@@ -1,10 +1,23 @@
+import io
 import os
-import glob
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
-from openpyxl import load_workbook
 from openpyxl.utils.dataframe import dataframe_to_rows
-from typing import List, Tuple, Optional, Any, Dict
+from typing import List, Optional, Any, Dict
+
+from config.ConfigManager import CONFIG
+from core.services.append_paste import matching_prefix, row_hashes
+from core.services.month_folder_index import MonthFolderIndex
+from core.services.paste_manifest import PasteManifest
+from core.services.paste_plan import PastePlan, crop_source
+from core.services.source_cache import SourceCache, read_with_hash
+from core.services.workbook_session import WorkbookSession
+
+
+# 分類帳日期 114-08-05 → (年, 月, 日)；模組載入時編譯一次，避免逐列重新查表
+LEDGER_DATE_RE = re.compile(r"(\d{3})-(\d{1,2})-(\d{1,2})")
 
 
 class SubjectPasteService:
@@ -19,6 +32,14 @@ class SubjectPasteService:
         """
         self.logger = logger
         self.app = app
+        # 目前作業中的工作階段與分頁名稱索引 (execute_paste_task 開始時設定)
+        self.session = None
+        self.sheet_names = None
+        # 來源報表解析結果的本機快取 (設定 performance.source_cache_mb = 0 時停用)
+        self.source_cache = SourceCache.from_config(CONFIG)
+        # 月份資料夾 → 檔名索引 (每次 execute_paste_task 重新建立)
+        self._folder_indexes = {}
+        self._folder_lock = threading.Lock()
 
     def _get_month_str(self, make_month: str) -> str:
         """
@@ -44,38 +65,34 @@ class SubjectPasteService:
     # 1. 檔案搜尋與檢核工具
     # ==========================================
 
+    def _month_folder_index(self, input_folder: str, month_folder: str) -> MonthFolderIndex:
+        """取得月份資料夾的檔名索引 (每次執行每個資料夾只列目錄一次；多個 thread 共用)"""
+        with self._folder_lock:
+            index = self._folder_indexes.get(month_folder)
+            if index is None:
+                if not input_folder or not os.path.exists(input_folder):
+                    raise FileNotFoundError(f"輸入資料夾不存在：{input_folder}")
+                if not os.path.exists(month_folder):
+                    raise FileNotFoundError(f"找不到月份資料夾：{month_folder}\n搜尋路徑：{month_folder}")
+                index = MonthFolderIndex(month_folder)
+                self._folder_indexes[month_folder] = index
+            return index
+
     def find_module_file(self, input_folder: str, make_month: str, vendor_id: str, module_name: str) -> str:
-        """通用檔案搜尋器 (含 ID 備援與唯一性檢查)"""
-        if not input_folder or not os.path.exists(input_folder):
+        """通用檔案搜尋器 (含 ID 備援與唯一性檢查)；檔名比對皆由月份資料夾索引提供"""
+        if not input_folder:
             raise FileNotFoundError(f"輸入資料夾不存在：{input_folder}")
 
         month_str = self._get_month_str(make_month)
         month_folder = os.path.join(input_folder, month_str)
+        index = self._month_folder_index(input_folder, month_folder)
 
-        if not os.path.exists(month_folder):
-            raise FileNotFoundError(f"找不到月份資料夾：{month_folder}\n搜尋路徑：{month_folder}")
-
-        # 搜尋規則：優先找 {module_name}* (無 ID)
-        pattern = os.path.join(month_folder, f"{module_name}*")
-        all_candidates = glob.glob(pattern)
-
-        # 過濾邏輯 (只接受完全一致 或 帶有 _ 後綴的)
-        target_stem = module_name
-        valid_files = []
-
-        for path in all_candidates:
-            filename = os.path.basename(path)
-            if filename.startswith("~$"): continue
-
-            name_stem, _ = os.path.splitext(filename)
-            # 完全一致 或 接底線
-            if name_stem == target_stem or name_stem.startswith(target_stem + "_"):
-                valid_files.append(path)
+        # 搜尋規則：優先找 {module_name}* (無 ID)，只接受完全一致 或 帶有 _ 後綴的 (已排除 ~$ 暫存檔)
+        valid_files = index.candidates(module_name)
 
         # 備援搜尋 (找帶 vendor_id 的)
         if not valid_files:
-            fallback = glob.glob(os.path.join(month_folder, f"{vendor_id}_{module_name}*"))
-            valid_files = [f for f in fallback if not os.path.basename(f).startswith("~$")]
+            valid_files = index.vendor_candidates(vendor_id, module_name)
 
         if not valid_files:
             raise FileNotFoundError(f"❌ 找不到模組檔案：[{module_name}]")
@@ -86,25 +103,31 @@ class SubjectPasteService:
 
         return valid_files[0]
 
-    def check_ledger_date_limit(self, file_path: str, make_month: str):
-        """分類帳專用的日期檢查"""
+    def check_ledger_date_limit(self, file_path: str, make_month: str, df: Optional[pd.DataFrame] = None):
+        """
+        分類帳專用的日期檢查。
+        df：已讀入的分類帳 (header=None)；提供時直接檢查 A 欄，不再讀檔。
+        """
         self.logger(f"正在檢查分類帳日期：{os.path.basename(file_path)}")
         try:
             target_year = int(make_month[:3])
             target_month = int(make_month[3:])
-            df = pd.read_excel(file_path, usecols="A", dtype=str)
+            if df is None:
+                df = pd.read_excel(file_path, header=None)
+            # 第 1 列為表頭；其餘 A 欄以字串比對
+            dates = df.iloc[1:, 0] if df.shape[1] else pd.Series(dtype=object)
         except Exception as e:
             raise ValueError(f"無法讀取分類帳日期：{e}")
 
         error_list = []
-        for row in df.itertuples():
-            date_str = str(row[1]).strip()
-            match = re.match(r"(\d{3})-(\d{1,2})-(\d{1,2})", date_str)
+        for index, value in dates.items():
+            date_str = str(value).strip()
+            match = LEDGER_DATE_RE.match(date_str)
             if not match: continue
 
             y, m = int(match.group(1)), int(match.group(2))
             if (y > target_year) or (y == target_year and m > target_month):
-                error_list.append(f"行 {row.Index + 2}: {date_str}")
+                error_list.append(f"行 {index + 1}: {date_str}")
 
         if error_list:
             msg = "\n".join(error_list[:5])
@@ -116,28 +139,59 @@ class SubjectPasteService:
     # 2. 兩階段執行入口 (Orchestrator)
     # ==========================================
 
-    def _validate_all_sources(self, input_folder: str, make_month: str, vendor_id: str,
-                              required_tasks: List[Dict[str, Any]]):
-        """
-        階段一：檢查所有必要的來源檔案是否存在，並執行分類帳的內容驗證。
-        """
-        self.logger("🔍 開始進行貼入前的【所有檔案與內容】完整性檢查...")
-        missing_files = []
+    def _load_source(self, input_folder: str, make_month: str, vendor_id: str, plan: PastePlan, module_name: str):
+        """找檔 → 讀檔 (header=None，全貼) → 內容檢查；回傳 (檔案路徑, DataFrame, 內容雜湊)"""
+        file_path = self.find_module_file(input_folder, make_month, vendor_id, module_name)
+        try:
+            df, digest = self._read_source(file_path)
+        except Exception as e:
+            raise ValueError(f"讀取 {module_name} 失敗：{e}")
 
-        for config in required_tasks:
-            module_name = config['module']  # ⭐️ 從字典中取值
+        for check in plan.checks_for(module_name):
+            if check == "LEDGER_DATE":
+                self.check_ledger_date_limit(file_path, make_month, df=df)
+        return file_path, df, digest
 
-            try:
-                file_path = self.find_module_file(input_folder, make_month, vendor_id, module_name)
+    def _read_source(self, file_path: str):
+        """
+        解析來源 xlsx (header=None)，回傳 (DataFrame, 內容雜湊)；
+        檔案未變動時直接取用本機快取
+        """
+        if self.source_cache is None:
+            data, digest = read_with_hash(file_path)
+            return pd.read_excel(io.BytesIO(data), header=None), digest
 
-                # 關鍵邏輯：執行分類帳日期檢查 (只有在 check flag 存在時)
-                if config['check'] == "LEDGER_DATE":
-                    self.check_ledger_date_limit(file_path, make_month)
+        df, digest, hit = self.source_cache.load(file_path, lambda source: pd.read_excel(source, header=None))
+        if hit:
+            self.logger(f"⚡ 來源檔未變動，使用快取：{os.path.basename(file_path)}")
+        return df, digest
 
-            except (FileNotFoundError, ValueError, RuntimeError) as e:
-                # 捕捉到檔案找不到 OR 分類帳日期錯誤
-                missing_files.append(str(e))
-                continue  # 繼續檢查下一個檔案
+    def _validate_all_sources(self, input_folder: str, make_month: str, vendor_id: str, plan: PastePlan):
+        """
+        階段一：每個來源模組找檔、讀檔、執行內容檢查各一次 (分類帳日期檢查直接使用讀入的資料)。
+        各來源檔 (多半在網路磁碟上) 以有上限的 thread pool 同時讀取，
+        全部完成後才回到主流程寫入 workbook (workbook 只在單一 thread 寫入)。
+        回傳 {模組名稱: (檔案路徑, DataFrame, 內容雜湊)}，後續裁剪與寫入都共用這一份。
+        """
+        self.logger("🔍 開始進行貼入前的【所有檔案與內容】完整性檢查...")
+        missing_files = []
+        sources = {}
+
+        modules = plan.modules
+        max_workers = max(1, min(len(modules), CONFIG.get('performance.io_workers', default=4) or 1))
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="paste-source") as pool:
+            futures = [
+                (module_name, pool.submit(self._load_source, input_folder, make_month, vendor_id, plan, module_name))
+                for module_name in modules
+            ]
+            # 依計畫順序收集結果，錯誤訊息的順序與逐一讀取時相同
+            for module_name, future in futures:
+                try:
+                    sources[module_name] = future.result()
+                except (FileNotFoundError, ValueError, RuntimeError) as e:
+                    # 捕捉到檔案找不到 OR 讀檔失敗 OR 分類帳日期錯誤
+                    missing_files.append(str(e))
+                    continue  # 繼續檢查下一個檔案
 
         if missing_files:
             error_msg = "\n".join(missing_files)
@@ -146,73 +200,59 @@ class SubjectPasteService:
             )
 
         self.logger("✅ 檔案與內容完整性檢查通過。")
+        return sources
 
-    def execute_paste_task(self, input_folder: str, make_month: str, vendor_id: str, master_file_path: str):
+    def execute_paste_task(self, input_folder: str, make_month: str, vendor_id: str, master_file_path: str,
+                           session: Optional[WorkbookSession] = None, auto_save: Optional[bool] = None,
+                           plan: Optional[PastePlan] = None):
         """
         主程式：執行三階段貼入作業 (檔案檢查 -> 分頁檢查 -> 執行)
+        session: 共用工作階段 (由 controller 傳入時不自行存檔，除非 auto_save=True)
+        plan: 貼入計畫 (未指定時由設定檔 paste_plan 或預設計畫編譯)
         """
-        # 1. 定義最終標準配置表
-        REQUIRED_CONFIGS = [
-            # 1. 資產負債表 (A:F, 貼入 A1)
-            {"module": "資產負債表", "sheet": "資產負債表", "src_col_end": 6, "dest_row_start": 1, "dest_col_start": 1,
-             "check": None},
-
-            # 2. 綜合損益表 (A:G, 貼入 A1)
-            {"module": "綜合損益表", "sheet": "綜合損益表", "src_col_end": 7, "dest_row_start": 1, "dest_col_start": 1,
-             "check": None},
-
-            # 3. 分類帳 (全貼, 貼入 A1, 需檢查日期)
-            {"module": "分類帳", "sheet": "分類帳", "src_col_end": None, "dest_row_start": 1, "dest_col_start": 1,
-             "check": "LEDGER_DATE"},
-
-            # 4. 財產目錄 (全貼, 貼入 A1)
-            {"module": "財產目錄", "sheet": "財產目錄", "src_col_end": None, "dest_row_start": 1, "dest_col_start": 1,
-             "check": None},
-
-            # 5. 綜合損益期別表 (動態裁剪末兩欄, 貼入 A1)
-            {"module": "綜合損益期別表", "sheet": "綜合損益表-月份比較", "src_col_end": "DYNAMIC_CROP_2",
-             "dest_row_start": 1, "dest_col_start": 1, "check": None},
-
-            # ⭐️ 新增任務：綜合損益表邊欄 (末兩欄, 貼入 Z1) ⭐️
-            {"module": "綜合損益期別表", "sheet": "綜合損益表-月份比較", "src_col_end": "SIDE_CROP_2",
-             "dest_row_start": 1,
-             "dest_col_start": 26, "check": None},
-
-            # ⭐️ 6. 新任務：期別表負向索引邊欄 (貼入 AD/AE 欄) ⭐️
-            {"module": "綜合損益期別表", "sheet": "綜合損益表-月份比較", "src_indices": [-6, -4], "dest_row_start": 1,
-             "dest_col_start": 30, "check": None},
-        ]
+        # 1. 編譯貼入計畫 (同一個來源模組只讀一次)；月份資料夾本次執行重新列目錄一次
+        plan = plan or PastePlan.from_config(CONFIG)
+        self._folder_indexes = {}
 
-        # 2. 階段一：批次驗證檔案 (如果失敗，立即停止)
-        self._validate_all_sources(input_folder, make_month, vendor_id, REQUIRED_CONFIGS)
+        # 2. 階段一：批次驗證並讀入來源檔案 (如果失敗，立即停止)
+        sources = self._validate_all_sources(input_folder, make_month, vendor_id, plan)
 
         # 3. 階段二：開啟檔案與分頁檢查
         if not os.path.exists(master_file_path):
             raise FileNotFoundError(f"找不到科餘主檔：{master_file_path}")
 
+        if auto_save is None:
+            auto_save = session is None
+
         self.logger(f"📂 開始開啟科餘檔：{os.path.basename(master_file_path)} ...")
 
         try:
-            wb = load_workbook(master_file_path)
+            session = session or WorkbookSession(master_file_path, logger=self.logger)
+            wb = session.wb
+            self.session = session
+            self.sheet_names = session.sheet_names
 
             # ⭐️ 關鍵步驟：分頁預檢 ⭐️
-            self._check_all_destination_sheets(wb, REQUIRED_CONFIGS)
+            self._check_all_destination_sheets(wb, plan.tasks)
 
             # 4. 階段三：執行貼入 (分頁已被確認存在，保證貼入不會失敗於找不到分頁)
-            for config in REQUIRED_CONFIGS:
-                # ⭐️ 檢查特殊處理邏輯 ⭐️
-                if config.get("src_indices") is not None:
-                    # 呼叫負向索引貼入專用方法
-                    self._process_comparative_side_data(wb, input_folder, make_month, vendor_id, config)
-                else:
-                    # 其他所有標準和動態裁剪任務
-                    self._process_task_unit(
-                        wb, input_folder, make_month, vendor_id, config
-                    )
-
-            # 5. 存檔
-            self.logger("💾 正在儲存檔案...")
-            wb.save(master_file_path)
+            #    來源內容與裁剪設定都和上次貼入相同的目標直接略過
+            manifest = PasteManifest(self.sheet_names)
+            for config in plan.tasks:
+                file_path, df_source, digest = sources[config['module']]
+                if manifest.is_current(config, digest):
+                    self.logger(f"   ⏭️ [{config['module']}] → [{config['sheet']}] 來源未變動，已是最新 (up to date)")
+                    continue
+                self._process_task_unit(wb, df_source, config)
+                manifest.record(config, os.path.basename(file_path), digest)
+            manifest.write()
+
+            # 5. 存檔 (共用工作階段時由 controller 統一存檔)
+            if auto_save:
+                self.logger("💾 正在儲存檔案...")
+                session.save(master_file_path)
+            else:
+                self.logger("🕒 貼入結果暫存於記憶體，待所有模組完成後統一存檔。")
             self.logger("✅ 所有報表貼入作業完成！")
 
         except Exception as e:
@@ -223,117 +263,23 @@ class SubjectPasteService:
     # 3. 核心統一執行邏輯 (單一任務處理器)
     # ==========================================
 
-    def _process_task_unit(self, wb, input_folder, make_month, vendor_id, config: Dict[str, Any]):
+    def _process_task_unit(self, wb, df_source: pd.DataFrame, config: Dict[str, Any]):
         """
-        通用流程：根據配置字典處理單一模組的所有 Find/Check/Paste 邏輯。
+        通用流程：以已讀入的來源資料，依配置字典裁剪並貼入單一任務。
         """
-        module_name = config['module']
-        sheet_name = config['sheet']
+        # 1. 裁剪 (來源只在階段一讀取一次)
+        df_final = crop_source(df_source, config)
         src_col_end = config['src_col_end']
-        dest_row_start = config['dest_row_start']
-        dest_col_start = config['dest_col_start']
-
-        # 1. 找檔案 (略)
-        try:
-            file_path = self.find_module_file(input_folder, make_month, vendor_id, module_name)
-        except FileNotFoundError:
-            self.logger(f"   ⚠️ 警告：檔案 [{module_name}] 消失或無法讀取，跳過此模組。")
-            return
-
-        # 2. 讀取與裁剪
-        try:
-            # 讀取邏輯：使用 header=None 讀取所有數據，稍後手動切片
-            df = pd.read_excel(file_path, header=None)
-        except Exception as e:
-            raise ValueError(f"讀取 {module_name} 失敗：{e}")
-
-            # 根據配置執行裁剪
-        if src_col_end == "DYNAMIC_CROP_2":
-            # ⭐️ 修正：不再切除第一列，只裁剪末兩欄 ⭐️
 
-            if df.shape[1] < 3:
-                raise ValueError(f"[{module_name}] 欄位不足，無法裁剪末兩欄。")
-
-            # 這是唯一需要的邏輯：保留所有行，只排除最後兩欄
-            df_final = df.iloc[:, :-2]
-
-        elif src_col_end == "SIDE_CROP_2":
-            # 綜合損益表邊欄：只取末兩欄
-            if df.shape[1] < 2:
-                raise ValueError(f"[{module_name}] 欄位不足，無法複製末兩欄。")
-
-            df_final = df.iloc[:, -2:]  # 裁剪：只保留末兩欄
-
-        elif isinstance(src_col_end, int):
-            # 標準報表的邏輯 (貼入 A1)：讀取 header=0，然後切前 N 欄
-            df_final = df.iloc[:, :src_col_end]
-
-            # 修正：由於標準報表是貼 A1，需要重新讀取確保 header=0
-            # 避免 header=None 污染標準報表邏輯
-            df_final = pd.read_excel(file_path, header=None).iloc[:, :src_col_end]
-
-        else:
-            # 分類帳/財產目錄的邏輯：全貼
-            df_final = df
-
-        # 3. 執行貼上
-        self._write_sheet_data_from_df(
+        # 2. 執行貼上 (append 任務只寫入與現有內容不同的尾段)
+        writer = self._append_sheet_data_from_df if config.get("append") else self._write_sheet_data_from_df
+        writer(
             wb,
             df_final,
-            sheet_name,
-            dest_row_start=dest_row_start,
-            dest_col_start=dest_col_start,
-            max_col_limit=src_col_end if isinstance(src_col_end, int) else None
-        )
-
-    def _process_comparative_side_data(self, wb, input_folder, make_month, vendor_id, config: Dict[str, Any]):
-        """
-        專門處理綜合損益期別表的負向索引邊欄數據貼入 (AD/AE)。
-        修正：使用 List 串接法，穩定地將表頭作為數據第一行寫入。
-        """
-        module_name = config['module']
-        sheet_name = config['sheet']
-
-        # 1. 找檔案 (Find file)
-        try:
-            file_path = self.find_module_file(input_folder, make_month, vendor_id, module_name)
-        except FileNotFoundError:
-            self.logger(f"   ⚠️ 警告：邊欄貼入跳過，找不到 [{module_name}] 來源檔案。")
-            return
-
-        # 2. 讀取與裁剪 (Read and Crop Last Two Columns)
-        try:
-            # 使用 header=0 讀取，將 Row 1 轉為 Column Names
-            df = pd.read_excel(file_path, header=0)
-
-            # 裁剪：選取特定的負向索引欄位
-            df_side_data = df.iloc[:, config['src_indices']]
-
-            # ⭐️ 關鍵修正：使用 List 串接，將表頭注入數據體 ⭐️
-
-            # 1. 獲取表頭列表 (Excel Row 1 的內容)
-            header_list = [df_side_data.columns.tolist()]
-
-            # 2. 獲取數據主體 (Excel Row 2 onwards)
-            data_list = df_side_data.values.tolist()
-
-            # 3. 合併：將表頭作為數據的第一行
-            full_list = header_list + data_list
-
-            # 4. 創建最終 DataFrame (欄位名稱為 0, 1, 2... 但內容是正確的)
-            df_final = pd.DataFrame(full_list)
-
-        except Exception as e:
-            raise ValueError(f"讀取 {module_name} 邊欄失敗：{e}")
-
-        # 3. 執行貼入 (使用統一寫入器)
-        self._write_sheet_data_from_df(
-            wb,
-            df_final,  # ⭐️ 使用已包含表頭的 df_final ⭐️
-            sheet_name,
+            config['sheet'],
             dest_row_start=config['dest_row_start'],
             dest_col_start=config['dest_col_start'],
-            max_col_limit=None
+            max_col_limit=src_col_end if isinstance(src_col_end, int) and config.get("src_indices") is None else None
         )
 
     def _write_sheet_data_from_df(self, wb, df_source, sheet_name, dest_row_start, dest_col_start, max_col_limit=None):
@@ -341,15 +287,8 @@ class SubjectPasteService:
         底層寫入邏輯：處理清除、位移寫入 (基於已裁剪的 DataFrame)。
         """
 
-        # 1. 獲取工作表 (分頁檢查已在 Phase 2 完成)
-        target_name_normalized = "".join(sheet_name.split())
-        original_sheet_name = None
-        for name in wb.sheetnames:
-            if "".join(name.split()) == target_name_normalized:
-                original_sheet_name = name
-                break
-
-        ws = wb[original_sheet_name]
+        # 1. 獲取工作表 (分頁檢查已在 Phase 2 完成；去空白名稱索引查詢)
+        ws = self.sheet_names.find(sheet_name)
 
         # 2. 清除舊資料
         paste_width = df_source.shape[1]
@@ -386,10 +325,64 @@ class SubjectPasteService:
                 ws.cell(row=r_idx, column=col_index_ws, value=value)
                 end_col_ws = col_index_ws
 
-        # 4. Log 訊息
+        # 參照此分頁的公式 (例如分類帳、資產負債表的合計) 於下一步讀取前重算
+        end_row = dest_row_start + len(df_source) - 1
+        self.session.mark_dirty(ws, dest_row_start, max(current_max_row, end_row))
+
+        # 4. Log 訊息 (裁剪後沒有資料時只清除舊資料，沒有寫入範圍)
+        if df_source.empty:
+            self.logger(f"      ⚠️ 來源裁剪後沒有資料，已清除分頁 [{sheet_name}] 原有內容")
+            return
         end_col_letter = chr(ord('A') + end_col_ws - 1)
         self.logger(
-            f"      ✅ 已更新 {len(df_source)} 筆資料 (範圍: {chr(ord('A') + dest_col_start - 1)}{dest_row_start}~{end_col_letter}{r_idx - 1})")
+            f"      ✅ 已更新 {len(df_source)} 筆資料 (範圍: {chr(ord('A') + dest_col_start - 1)}{dest_row_start}~{end_col_letter}{end_row})")
+
+    def _append_sheet_data_from_df(self, wb, df_source, sheet_name, dest_row_start, dest_col_start,
+                                   max_col_limit=None):
+        """
+        追加式寫入 (分類帳每月只多出最新月份的列)：
+        - 來源與目標範圍逐列計算雜湊，找出「從頭開始完全相同」的最長前綴
+        - 前綴內的列不動，只覆寫之後的尾段
+        - 目標原本比來源長的部分 (已不存在的列) 清空
+        最終內容與 _write_sheet_data_from_df 的整段清除重寫相同。
+        """
+        ws = self.sheet_names.find(sheet_name)
+
+        paste_width = df_source.shape[1]
+        if max_col_limit is not None:
+            paste_width = min(paste_width, max_col_limit - dest_col_start + 1)
+        end_col = dest_col_start + paste_width - 1
+
+        source_rows = [row[:paste_width] for row in dataframe_to_rows(df_source, index=False, header=False)]
+        existing_rows = list(ws.iter_rows(min_row=dest_row_start, max_row=max(ws.max_row, dest_row_start),
+                                          min_col=dest_col_start, max_col=end_col, values_only=True))
+        if ws.max_row < dest_row_start:
+            existing_rows = []
+
+        keep = matching_prefix(row_hashes(existing_rows, paste_width), row_hashes(source_rows, paste_width))
+
+        # 1. 覆寫尾段 (None 也要寫入，才能清掉舊值)
+        for r_idx, row in enumerate(source_rows[keep:], dest_row_start + keep):
+            for col_idx, value in enumerate(row, dest_col_start):
+                if value is None and (r_idx, col_idx) not in ws._cells:
+                    continue
+                ws.cell(row=r_idx, column=col_idx).value = value
+
+        # 2. 清除來源已不存在的列
+        first_removed = dest_row_start + len(source_rows)
+        removed = max(0, len(existing_rows) - len(source_rows))
+        if removed:
+            for row in ws.iter_rows(min_row=first_removed, max_row=first_removed + removed - 1,
+                                    min_col=dest_col_start, max_col=end_col):
+                for cell in row:
+                    if cell.value is not None:
+                        cell.value = None
+
+        written = len(source_rows) - keep
+        if written or removed:
+            last_row = dest_row_start + max(len(source_rows), len(existing_rows)) - 1
+            self.session.mark_dirty(ws, dest_row_start + keep, last_row)
+        self.logger(f"      ✅ 已更新 {len(df_source)} 筆資料 (沿用前 {keep} 列，寫入 {written} 列，清除 {removed} 列)")
 
     def _check_all_destination_sheets(self, wb, required_tasks: List[Dict[str, Any]]):
         """
@@ -401,17 +394,8 @@ class SubjectPasteService:
         for config in required_tasks:
             sheet_name = config['sheet']  # ⭐️ 依賴字典結構 ⭐️
 
-            # 複製 _paste_data_to_sheet 裡面的檢查邏輯
-            target_name_normalized = "".join(sheet_name.split())
-            original_sheet_name = None
-
-            for name in wb.sheetnames:
-                sheet_name_normalized = "".join(name.split())
-                if sheet_name_normalized == target_name_normalized:
-                    original_sheet_name = name
-                    break
-
-            if not original_sheet_name:
+            # 與 _write_sheet_data_from_df 相同：以去空白名稱索引查詢
+            if self.sheet_names.find(sheet_name) is None:
                 # 如果找不到，記錄錯誤
                 missing_sheets.append(f"分頁 [{sheet_name}]")
 
@@ -0,0 +1,88 @@
+# core/services/subject_sheet_index.py
+from collections import Counter
+
+from core.services.row_fingerprint import row_fingerprint
+
+
+def _filled(value) -> bool:
+    return value is not None and str(value).strip() != ""
+
+
+def is_valid_detail_row(values) -> bool:
+    """
+    科目分頁的「有效明細列」判斷 (values 為 A~I 欄計算值)：
+    A、C、D 欄必須有值，I 欄必須有值 (可以是 0，但不能是 None 或空字串)
+    """
+    return _filled(values[0]) and _filled(values[2]) and _filled(values[3]) and _filled(values[8])
+
+
+class SubjectSheetIndex:
+    """
+    科目分頁索引 (每份 workbook 建一次)：
+    記錄每個科目分頁的「最後有效列」與「最後餘額 (I 欄)」。
+
+    - 第一次查詢某分頁時才掃描該分頁一次
+    - 插入列後由呼叫端 note_insert() 更新，不必重新掃描
+    - 分頁被大幅異動 (刪除列等) 時呼叫 invalidate() 讓下次重新掃描
+    """
+
+    def __init__(self, book):
+        self.book = book
+        # 分頁名稱 → (最後有效列號, 最後餘額)；無有效列時為 (1, None)
+        self._entries = {}
+
+    def _scan(self, ws):
+        last_row, last_balance = 1, None
+        for row_number, values in self.book.iter_values(ws, min_row=2, max_col=9):
+            if is_valid_detail_row(values):
+                last_row, last_balance = row_number, values[8]
+        return last_row, last_balance
+
+    def get(self, ws):
+        """回傳 (最後有效列號, 最後餘額)；分頁沒有任何有效列時為 (1, None)"""
+        entry = self._entries.get(ws.title)
+        if entry is None:
+            entry = self._scan(ws)
+            self._entries[ws.title] = entry
+        return entry
+
+    def last_before(self, ws, fingerprints):
+        """
+        由下往上找最後一筆「不屬於 fingerprints」的有效列 (fingerprints 為 Counter{列指紋: 次數})：
+        重複執行科目更新時，分頁末端可能已有本次區間的明細，需以這些列之前的餘額比對。
+        回傳 (列號, 餘額, 略過的相符列數)；沒有這種列時為 (1, None, 略過列數)。
+        不使用快取 (只在比對時對有相符明細的分頁呼叫)。
+        """
+        remaining = Counter(fingerprints)
+        matched = 0
+        rows = [(r, values) for r, values in self.book.iter_values(ws, min_row=2, max_col=9)
+                if is_valid_detail_row(values)]
+        for row_number, values in reversed(rows):
+            fp = row_fingerprint(values)
+            if remaining[fp] > 0:
+                remaining[fp] -= 1
+                matched += 1
+                continue
+            return row_number, values[8], matched
+        return 1, None, matched
+
+    def last_row(self, ws) -> int:
+        return self.get(ws)[0]
+
+    def note_insert(self, ws, insert_row: int, rows_values):
+        """
+        在 insert_row 起插入了 len(rows_values) 列 (插入位置須在最後有效列之後)，
+        依插入內容更新最後有效列與最後餘額。
+        """
+        last_row, last_balance = self.get(ws)
+        for offset, values in enumerate(rows_values):
+            if is_valid_detail_row(values):
+                last_row, last_balance = insert_row + offset, values[8]
+        self._entries[ws.title] = (last_row, last_balance)
+
+    def invalidate(self, ws=None):
+        """捨棄指定分頁 (未指定則全部) 的快取，下次查詢時重新掃描"""
+        if ws is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(ws.title, None)
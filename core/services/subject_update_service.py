@@ -1,19 +1,20 @@
-import sys
 from tkinter import messagebox
 
-from openpyxl import load_workbook
 import os
-import re
-from collections import defaultdict
+from collections import Counter, defaultdict
 from typing import Any
-import time
-from openpyxl.utils import get_column_letter
-from openpyxl.worksheet.worksheet import Worksheet
-from copy import copy
 from openpyxl.styles import PatternFill
-import pandas as pd
 
 from config.ConfigManager import CONFIG
+from core.services.date_service import DateService
+from core.services.insert_provenance import SUMMARY_HEADERS, InsertProvenance, format_rows
+from core.services.ledger_frame import LedgerFrame, LedgerScan
+from core.services.ledger_sheet_template import LedgerSheetTemplate, clone_style
+from core.services.money import format_cents, to_cents
+from core.services.parallel_analysis import find_color_marks_many, parallel_options
+from core.services.row_fingerprint import row_fingerprint
+from core.services.running_balance import balance_sign, balance_votes, recompute_running_balance
+from core.services.workbook_session import WorkbookSession
 
 
 class SubjectUpdateService:
@@ -24,20 +25,34 @@ class SubjectUpdateService:
     - 標示異動列
     """
 
-    def __init__(self, file_path: str, logger=None, app=None):
+    def __init__(self, file_path: str, logger=None, app=None, session: WorkbookSession = None, auto_save=None):
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"找不到檔案：{file_path}")
 
         self.file_path = file_path
-        self.wb_values = load_workbook(file_path, data_only=True)
-        self.wb = load_workbook(file_path, data_only=False)
-
         self.logger = logger or (lambda msg: print(msg))
         self.app = app  # ExcelToolApp 實例（可為 None）
 
+        # 共用工作階段：由 controller 傳入時，與其他模組共用同一份 workbook；
+        # 單獨執行時自行建立，並於完成後自行存檔
+        self.session = session or WorkbookSession(file_path, logger=self.logger)
+        self.auto_save = (session is None) if auto_save is None else auto_save
+        # 單次解析的雙視圖：self.wb 為活體 workbook，數值一律透過 self.book.value / iter_values 讀取
+        self.book = self.session.book
+        self.wb = self.book.wb
+        # 分頁名稱索引與科目分頁最後有效列 / 最後餘額索引 (與共用工作階段同生命週期)
+        self.sheet_names = self.session.sheet_names
+        self.sheet_index = self.session.subject_index
+        self.row_fingerprints = self.session.row_fingerprints
+
         # 紀錄分類帳中「含非法符號」的科目名稱
         self.invalid_items = []
 
+        # 分類帳欄式模型 (每次執行只建立一次，見 _get_ledger_frame / _get_ledger_scan)
+        self._ledger_frame = None
+        self._ledger_scans = {}
+        self._sheet_template = None
+
     def _check_cancel(self):
         """隨時可以在迴圈裡呼叫，一旦使用者按了停止就丟 Exception 中斷流程"""
         if self.app is not None and getattr(self.app, "cancel_requested", False):
@@ -57,37 +72,50 @@ class SubjectUpdateService:
         且只處理可見分頁。
         """
 
-        # 遍歷所有工作表物件
-        for sheet in self.wb_values.worksheets:
-            # 1. 排除隱藏分頁
-            if sheet.sheet_state != 'visible':
-                continue
-
-            name = sheet.title
-
-            # 2. 移除所有空白 (無論全形或半形)
-            # 使用 .replace(" ", "").replace("　", "") 移除所有空白
-            normalized = name.replace(" ", "").replace("　", "")
-
-            # ⭐️ 3. 精確比對：必須等於 "分類帳" ⭐️
-            if normalized == "分類帳":
-                # 找到第一個符合條件的可見分頁名稱即回傳
-                return name
+        # 去空白名稱索引：精確比對「分類帳」，找到第一個可見分頁即回傳
+        sheet = self.sheet_names.find_visible("分類帳")
+        if sheet is not None:
+            return sheet.title
 
         # 找不到則丟出錯誤
-        available = "、".join([s.title for s in self.wb_values.worksheets if s.sheet_state == 'visible'])
+        available = "、".join(self.sheet_names.titles("visible"))
         raise ValueError(f"❌ 找不到『分類帳』工作表（目前可見分頁：{available}）")
 
+    def _get_ledger_frame(self) -> LedgerFrame:
+        """讀取「分類帳」並建立欄式模型；同一次執行中重複使用"""
+        if self._ledger_frame is None:
+            sheet = self.wb[self.find_ledger_sheet()]
+            self._ledger_frame = LedgerFrame.from_sheet(self.book, sheet)
+            self._log(f"📒 分類帳共 {len(self._ledger_frame)} 列，已建立欄式索引。")
+        return self._ledger_frame
+
+    def _get_ledger_scan(self, latest_month: str, make_month: str = None) -> LedgerScan:
+        """
+        餘額比對與明細擷取共用的分類帳掃描結果：
+        同一組 (最新科餘月, 製作科餘月) 只計算一次
+        """
+        scan = self._ledger_scans.get((latest_month, make_month))
+        if scan is None and make_month is None:
+            # 單純比對：已有相同最新科餘月的掃描結果 (含區間) 可直接沿用
+            scan = next((v for (latest, _), v in self._ledger_scans.items() if latest == latest_month), None)
+        if scan is None:
+            scan = self._get_ledger_frame().scan(int(latest_month), int(make_month) if make_month else None)
+            self._ledger_scans[(latest_month, make_month)] = scan
+        return scan
+
     # ---------------------------------------------------------
     # 🧭 主函式
     # ---------------------------------------------------------
-    def check_subject_sheet_existence(self, target_month: str):
-        """主函式：綜合執行三個子步驟"""
+    def check_subject_sheet_existence(self, target_month: str, make_month: str = None):
+        """
+        主函式：綜合執行三個子步驟
+        make_month 有給時，分類帳掃描會一併算出後續更新要用的明細 (只掃一次)
+        """
         # 先清空上一輪的紀錄
         self.invalid_items = []
-        sheet = self.wb_values[self.find_ledger_sheet()]
+        scan = self._get_ledger_scan(target_month, make_month)
         self._check_cancel()  # ⭐ 加這行
-        rows = self._filter_valid_rows(sheet, target_month)
+        rows = self._filter_valid_rows(scan)
         self._check_cancel()  # ⭐ 加這行
 
         # ★ 如果有非法字元的科目名稱，直接在這裡用 _compose_message 擋掉
@@ -101,62 +129,58 @@ class SubjectUpdateService:
 
         latest_rows, zero_items_but_kept = self._get_last_rows_by_item(rows)
         self._check_cancel()  # ⭐ 加這行
-        return self._check_sheet_existence_and_print(latest_rows, target_month, zero_items_but_kept)
+
+        # 有給製作科餘月時：本次區間的明細若已寫入分頁 (重複執行)，比對時以這些列之前的餘額為準
+        window_fingerprints = self._window_fingerprints(scan) if make_month else {}
+        return self._check_sheet_existence_and_print(latest_rows, target_month, zero_items_but_kept,
+                                                     window_fingerprints)
 
     # ---------------------------------------------------------
     # 🧩 Step 1️⃣ 篩出符合條件的列
     # ---------------------------------------------------------
-    def _filter_valid_rows(self, sheet, target_month: str):
-        """篩出所有符合條件的列"""
-        month_extract = re.compile(r"^(1\d{2})[-/.]?(0[1-9]|1[0-2])")
-        target_int = int(target_month)
-        valid_rows = []
-
-        for row in sheet.iter_rows(min_row=2):
-            if not self._validate_row(row, target_int, month_extract, debug=False):
-                continue
-
-            a_val = str(row[0].value).strip() if row[0].value else ""
-            d_val_raw = str(row[3].value).strip() if row[3].value else ""
-            c_val = str(row[2].value).strip() if row[2].value else ""
-            row_number = row[0].row
-
-            # 🔴 D 欄科目名稱若含非法字元 → 記錄起來，不讓它進入後續流程
-            if any(ch in d_val_raw for ch in self.INVALID_SHEET_CHARS):
-                # 紀錄成「第X列：名稱」這種可讀格式
-                self.invalid_items.append(f"第{row_number}列：{d_val_raw}")
-                continue
+    def _filter_valid_rows(self, scan: LedgerScan):
+        """
+        篩出所有符合條件的列 (以向量化遮罩取代逐列驗證)，
+        回傳每個項目的最後一筆：[(row_number, a_val, d_val, i_val, c_val), ...]
+        (i_val 為整數「分」)
+        """
+        rows = scan.check_rows
 
-            d_val = d_val_raw
-            i_val = float(row[8].value)
+        # 🔴 D 欄科目名稱若含非法字元 → 記錄起來，不讓它進入後續流程
+        invalid_mask = rows["name"].map(lambda name: any(ch in name for ch in self.INVALID_SHEET_CHARS))
+        for row_number, name in zip(rows["row"][invalid_mask], rows["name"][invalid_mask]):
+            # 紀錄成「第X列：名稱」這種可讀格式
+            self.invalid_items.append(f"第{row_number}列：{name}")
 
-            valid_rows.append((row_number, a_val, d_val, i_val, c_val))
+        latest = scan.latest_rows
+        if self.invalid_items:
+            latest = latest[~latest["name"].isin(set(rows["name"][invalid_mask]))]
 
-        return valid_rows
+        return list(zip(
+            latest["row"].tolist(),
+            latest["date"].tolist(),
+            latest["name"].tolist(),
+            latest["balance"].tolist(),
+            latest["code"].tolist(),
+        ))
 
     # ---------------------------------------------------------
     # 🧩 Step 2️⃣ 同一項目取最後一筆
     # ---------------------------------------------------------
-    def _get_last_rows_by_item(self, valid_rows):
+    def _get_last_rows_by_item(self, last_rows):
         """
-        對同一項目保留最後一筆（行號最大者）；
+        last_rows 已是每個項目的最後一筆（行號最大者，由分類帳掃描產生）；
         若該項目的最後一筆 I 欄為 0：
           - 若該項目不存在於工作表 → 排除
           - 若該項目存在於工作表 → 保留並標記
         """
-        rows_by_item = defaultdict(list)
-        for row_number, a_val, d_val, i_val, c_val in valid_rows:
-            rows_by_item[d_val].append((row_number, a_val, i_val, c_val))
-
         latest_rows = {}
         zero_items_but_kept = []
 
-        for d_val, rows in rows_by_item.items():
+        for row_number, a_val, d_val, i_val, c_val in last_rows:
             self._check_cancel()  # ⭐ 加這行
-            rows.sort(key=lambda x: x[0])
-            row_number, a_val, i_val, c_val = rows[-1]
 
-            if i_val is None or float(i_val) == 0:
+            if i_val == 0:
                 if not self._check_item_in_sheet(d_val):
                     self._log(f"🗑️ 項目【{d_val}】最後餘額為 0 且無對應工作表，已排除。")
                     continue
@@ -196,82 +220,46 @@ class SubjectUpdateService:
         return items
 
     def _check_item_in_sheet(self, item_code: str) -> bool:
-        """檢查指定項目代號是否存在於工作表中。"""
-        sheetnames = [
-            s.title.replace(" ", "").replace("　", "")
-            for s in self.wb_values.worksheets if s.sheet_state == "visible"
-        ]
-        clean_name = item_code.replace(" ", "").replace("　", "")
-        return clean_name in sheetnames
-
-    # ---------------------------------------------------------
-    # 🧩 Step 3️⃣ 驗證單列
-    # ---------------------------------------------------------
-    def _validate_row(self, row, target_int: int, month_extract, debug=False) -> bool:
-        """檢查單列是否符合條件"""
-        row_num = row[0].row
-        a_val = str(row[0].value).strip() if row[0].value else ""
-        c_val = str(row[2].value).strip() if row[2].value else ""
-        d_val = str(row[3].value).strip() if row[3].value else ""
-        i_val = row[8].value
-
-        m = month_extract.match(a_val)
-        if m:
-            a_month_int = int(m.group(1) + m.group(2))
-            if a_month_int > target_int:
-                # 超過 target 月份，可能需要特例
-                if a_val != "上期結轉":
-                    return False
-            # 日期合法，直接通過
-        else:
-            # 無法解析日期 → 只有是「上期結轉」才通過
-            if a_val != "上期結轉":
-                return False
-            a_month_int = target_int  # 可以視為最新月份
-        try:
-            float(i_val)
-        except (TypeError, ValueError):
-            return False
-        if not c_val or c_val[0] not in ("1", "2"):
-            return False
-        if not d_val:
-            return False
-        return True
+        """檢查指定項目代號是否存在於工作表中 (可見分頁，忽略空白)。"""
+        return self.sheet_names.find_visible(item_code) is not None
 
     # ---------------------------------------------------------
     # 🧩 Step 4️⃣ 餘額比對
     # ---------------------------------------------------------
-    def _compare_balance(self, ws, ledger_i, target_month):
-        """比對工作表中的最後一筆 I 欄餘額（A、C、D、I 欄不可為NONE）"""
-        matched_rows = []
-
-        for row in ws.iter_rows(min_row=2):
-
-            a_val = str(row[0].value).strip() if row[0].value else ""
-            c_val = str(row[2].value).strip() if row[2].value else ""
-            d_val = str(row[3].value).strip() if row[3].value else ""
-            i_val = row[8].value
-
-            # A、C、D 欄必須有值（空字串或 None 都算空）
-            if a_val is None or str(a_val).strip() == "":
-                continue
-            if c_val is None or str(c_val).strip() == "":
-                continue
-            if d_val is None or str(d_val).strip() == "":
-                continue
-
-            # I欄必須有值，可以是 0，但不能是 None 或空字串
-            if i_val is None or str(i_val).strip() == "":
-                continue
-
-            matched_rows.append((row[0].row, i_val))
-
-        if not matched_rows:
+    def _window_fingerprints(self, scan: LedgerScan):
+        """
+        (最新科餘月, 製作科餘月] 區間內分類帳明細的列指紋，依科目名稱分組：
+        {科目名稱: Counter{列指紋: 次數}}
+        """
+        sheet = self.wb[self.find_ledger_sheet()]
+        window = scan.window_rows
+        fingerprints = defaultdict(Counter)
+        for row_number, d_val in zip(window["row"].tolist(), window["name"].tolist()):
+            values = tuple(self.book.value(sheet.cell(row=row_number, column=col)) for col in range(1, 8))
+            fingerprints[d_val][row_fingerprint(values)] += 1
+        return fingerprints
+
+    def _compare_balance(self, ws, ledger_i, target_month, fingerprints=None):
+        """
+        比對工作表中的最後一筆 I 欄餘額（A、C、D、I 欄不可為NONE）
+        最後有效列與餘額取自 SubjectSheetIndex，每個分頁只掃描一次
+        fingerprints 有值時 (本次區間的明細列指紋)，改取「不屬於本次區間明細」的最後一列：
+        重複執行同一個月份時，分頁末端已寫入的明細不參與比對
+        ledger_i 與回傳的 sheet_i 皆為整數「分」，以整數完全相等比對
+        """
+        sheet_row, sheet_value = self.sheet_index.get(ws)
+        if fingerprints and row_fingerprint(self._sheet_row_values(ws, sheet_row)) in fingerprints:
+            sheet_row, sheet_value, matched = self.sheet_index.last_before(ws, fingerprints)
+            self._log(f"ℹ️ 分頁「{ws.title}」末端已有本次區間的 {matched} 筆明細，改以第 {sheet_row} 列餘額比對。")
+        sheet_i = to_cents(sheet_value)
+        if sheet_i is None:
             return None, None, False
 
-        sheet_row, sheet_i = matched_rows[-1]
-        same = abs(ledger_i - sheet_i) < 0.001
-        return sheet_row, sheet_i, same
+        return sheet_row, sheet_i, ledger_i == sheet_i
+
+    def _sheet_row_values(self, ws, row_number):
+        """分頁單列 A~G 欄計算值"""
+        return tuple(self.book.value(ws.cell(row=row_number, column=col)) for col in range(1, 8))
 
     # 🔸 統一管理 Excel 禁用的工作表字元
     INVALID_SHEET_CHARS = (":", "\\", "/", "?", "*", "[", "]")
@@ -330,16 +318,13 @@ class SubjectUpdateService:
         # 🧩 Step 6️⃣ 主比對函式 (修正版)
         # ---------------------------------------------------------
 
-    def _check_sheet_existence_and_print(self, latest_rows, target_month, zero_items_but_kept=None):
-        """比對分頁是否存在並印出結果"""
+    def _check_sheet_existence_and_print(self, latest_rows, target_month, zero_items_but_kept=None,
+                                         window_fingerprints=None):
+        """比對分頁是否存在並印出結果 (window_fingerprints 見 _window_fingerprints)"""
         inconsistent = []
+        window_fingerprints = window_fingerprints or {}
 
-        # 🔴 修改 1：建立 { '去空白名稱': '真正的分頁名稱' } 的對照表
-        # 這樣就算分頁名稱有多餘空白，我們也能透過乾淨的名稱找到它真正的 Key
-        clean_to_real_map = {
-            s.title.replace(" ", "").replace("　", ""): s.title
-            for s in self.wb_values.worksheets if s.sheet_state == "visible"
-        }
+        # 🔴 分頁以去空白名稱索引查詢，就算分頁名稱有多餘空白也能找到真正的工作表
         # 🔴【排除清單】這五個代號將被跳過餘額比對
         EXCLUDED_CODES = ["1191", "1192", "1193", "1197", "1198"]
         if not latest_rows:
@@ -356,24 +341,13 @@ class SubjectUpdateService:
                 self._log(f"ℹ️ 科目代號【{ledger_c}】已設定為排除，跳過餘額比對。")
                 continue
             # 這是分類帳上的科目名稱（已去除前後空白，但中間可能有空白）
-            clean_name = d_val.replace(" ", "").replace("　", "")
-
-            # 🔴 修改 2：改查對照表，而不是查 list
-            if clean_name not in clean_to_real_map:
-                inconsistent.append(d_val)
-                continue
-
-            # 🔴 修改 3：取得「真正的分頁名稱」來開啟 Worksheet
-            real_sheet_name = clean_to_real_map[clean_name]
-
-            try:
-                ws = self.wb_values[real_sheet_name]
-            except KeyError:
-                # 雙重保險：理論上不會發生，但如果發生了就視為找不到
+            ws = self.sheet_names.find_visible(d_val)
+            if ws is None:
                 inconsistent.append(d_val)
                 continue
 
-            sheet_row, sheet_i, same = self._compare_balance(ws, ledger_i, target_month)
+            sheet_row, sheet_i, same = self._compare_balance(ws, ledger_i, target_month,
+                                                             window_fingerprints.get(d_val))
 
             # --- ⭐ 從這裡開始插入除錯程式碼 ⭐ ---
             if sheet_row is None or not same:
@@ -383,10 +357,10 @@ class SubjectUpdateService:
                     self._log(f"🔴 餘額不符報告：科目【{d_val}】")
                     # ⭐ 新增：印出分類帳行號 ⭐
                     self._log(f"  > 🔍 分類帳行號: {ledger_row}")
-                    self._log(f"  > 分類帳最新餘額 (期許值): {ledger_i:.2f}")
-                    self._log(f"  > 分頁最後餘額 (現值): {sheet_i:.2f}")
-                    self._log(f"  > 差異絕對值: {abs(ledger_i - sheet_i):.4f}")
-                    self._log(f"  > (註：容忍值為 0.001)")
+                    self._log(f"  > 分類帳最新餘額 (期許值): {format_cents(ledger_i)}")
+                    self._log(f"  > 分頁最後餘額 (現值): {format_cents(sheet_i)}")
+                    self._log(f"  > 差異絕對值: {format_cents(abs(ledger_i - sheet_i))}")
+                    self._log(f"  > (註：金額以「分」為單位精確比對)")
                 else:
                     self._log(f"🔴 餘額不符報告：科目【{d_val}】找不到任何有效資料列。")
 
@@ -399,36 +373,45 @@ class SubjectUpdateService:
     # ---------------------------------------------------------
     # 🧭 外部呼叫介面
     # ---------------------------------------------------------
-    def run_check(self, latest_month) -> dict:
+    def run_check(self, latest_month, make_month=None) -> dict:
         """
         執行完整檢查：
         - 若有錯誤：回傳 status="error"
         - 若一致：回傳 status="success"
+        make_month：可選，給定時分類帳只掃描一次即可供後續 run_copy_data 使用
         """
-        result = self.check_subject_sheet_existence(latest_month)
+        result = self.check_subject_sheet_existence(latest_month, make_month)
         return result
 
     # ----------------------------------------------------------------
-    def update_subject_sheets(self, make_month: str, latest_month: str):
+    def update_subject_sheets(self, make_month: str, latest_month: str, catch_up: bool = False):
         """
         依據資產負債表與分類帳，自動更新各科目分頁
         make_month: 製作科餘年月（例：11408）
         latest_month: 最新科餘年月（例：11406）
+        catch_up: 多月補帳模式。分類帳同樣只掃描一次、各分頁同樣整批寫入一次，
+                  但 (latest_month, make_month] 的每個月各建立一張「更新清單_月份」
         """
         self._log(f"🧭 開始更新科目分頁：製作科餘月={make_month}，最新科餘月={latest_month}")
+        if catch_up:
+            self._log(f"⏩ 多月補帳模式：{'、'.join(DateService.months_between(latest_month, make_month))}")
+
+        # 貼入模組異動過的分頁先重算公式，分類帳 / 資產負債表才會讀到最新計算值
+        self.session.recalculate()
 
         # 1️⃣ 找出資產負債表工作表
-        balance_sheet = self.wb_values["資產負債表"]
+        balance_sheet = self.wb["資產負債表"]
 
         # 2️⃣ 掃描 A、D 欄，找出代號與對應名稱
         subject_map = self._extract_subjects_from_balance(balance_sheet)
 
         # 3️⃣ 從分類帳取得要複製的資料列
-        ledger_sheet = self.wb_values[self.find_ledger_sheet()]
-        records_to_copy = self._find_records_in_ledger(ledger_sheet, subject_map, make_month, latest_month)
+        ledger_sheet = self.wb[self.find_ledger_sheet()]
+        scan = self._get_ledger_scan(latest_month, make_month)
+        records_to_copy = self._find_records_in_ledger(ledger_sheet, scan, subject_map)
 
         # 4️⃣ 寫入對應的科目分頁
-        self._insert_records_into_sheets(records_to_copy, make_month, latest_month)
+        self._insert_records_into_sheets(records_to_copy, make_month, latest_month, catch_up)
 
         msg = "✅ 科目更新完成。"
         self._log(msg)
@@ -465,11 +448,11 @@ class SubjectUpdateService:
             return text
 
         # 可能要改
-        for row in sheet.iter_rows(min_row=2):
-            a_val = clean(row[0].value)
-            b_val = clean(row[1].value)
-            d_val = clean(row[3].value)
-            e_val = clean(row[4].value)
+        for _, row in self.book.iter_values(sheet, min_row=2, max_col=5):
+            a_val = clean(row[0])
+            b_val = clean(row[1])
+            d_val = clean(row[3])
+            e_val = clean(row[4])
 
             # 🔴 修正：檢查代號是否在排除清單內
             if a_val.startswith(("1", "2")) and b_val:
@@ -484,134 +467,78 @@ class SubjectUpdateService:
         self._log(f"📘 共找到 {len(subjects)} 個項目：{list(subjects.values())[:5]}...")
         return subjects
 
-    def _find_records_in_ledger(self, sheet, subject_map, make_month, latest_month):
-        """找出分類帳中介於最新科餘月 ~ 製作月的明細"""
-        records = []
-        start_int = int(latest_month)
-        end_int = int(make_month)
-
-        for row in sheet.iter_rows(min_row=2):
-            a_val = str(row[0].value).strip() if row[0].value else ""
-            d_val = str(row[3].value).strip() if row[3].value else ""
-            if not a_val or not d_val:
-                continue
+    def _find_records_in_ledger(self, sheet, scan: LedgerScan, subject_map):
+        """找出分類帳中介於最新科餘月 ~ 製作月的明細 (取自分類帳掃描的區間表)"""
+        window = scan.window_rows
+        selected = window[window["name"].isin(subject_map.keys())]
 
-            # 轉換日期 114-08-05 → 11408
-            m = re.match(r"^(1\d{2})[-/.]?(0[1-9]|1[0-2])", a_val)
-            if not m:
-                continue
-            month_int = int(m.group(1) + m.group(2))
-            if not (start_int < month_int <= end_int):
-                continue
-            #
-            if d_val in subject_map:
-                records.append((d_val, row[:9]))
-        self._log(f"找到要貼入的紀錄：{[(d_val, [c.value for c in row[:9]]) for d_val, row in records]}")
+        # 只回頭讀取被選中的列：活體儲存格 (複製樣式用) + 計算值 (寫入用)
+        records = []
+        for row_number, d_val in zip(selected["row"].tolist(), selected["name"].tolist()):
+            cells = tuple(sheet.cell(row=row_number, column=col) for col in range(1, 10))
+            values = tuple(self.book.value(c) for c in cells)
+            records.append((d_val, cells, values))
+        self._log(f"找到要貼入的紀錄：{[(d_val, list(values)) for d_val, _, values in records]}")
 
         self._log(f"📗 找到 {len(records)} 筆新資料。")
         return records
 
-    from openpyxl.utils import get_column_letter
-    from openpyxl.worksheet.worksheet import Worksheet
-
-    def _insert_records_into_sheets(self, records, make_month, latest_month):
+    def _insert_records_into_sheets(self, records, make_month, latest_month, catch_up: bool = False):
         """將分類帳的新資料寫入各自的科目分頁，若無則建立"""
 
-        ledger_ws_src = self.wb["分類帳"]
-        updated_sheets = set()  # ← 新增：記錄本次有更新的分頁名稱
-
-        for subject_code, row_cells in records:
-
-            # ------ 判斷工作表名稱 ------
-            # 先去掉空白比對
-            clean_subject = subject_code.replace(" ", "").replace("　", "")
-
-            # 先找是否有隱藏的同名分頁
-            hidden_sheets = {s.title.replace(" ", "").replace("　", ""): s for s in self.wb.worksheets if
-                             s.sheet_state == "hidden"}
-            visible_sheets = {s.title.replace(" ", "").replace("　", ""): s for s in self.wb.worksheets if
-                              s.sheet_state == "visible"}
-
-            if clean_subject in visible_sheets:
-                # 已存在可見分頁，直接使用
-                ws = visible_sheets[clean_subject]
-            elif clean_subject in hidden_sheets:
-                # 已存在隱藏分頁，加 @ 後建立新的分頁
-                new_name = f"@{subject_code}"
-                if new_name in self.wb.sheetnames:
-                    ws = self.wb[new_name]  # 已有 @ 分頁，直接使用
-                else:
-                    ws = self.wb.create_sheet(new_name)
-                    # 複製欄寬與標頭列
-                    for col in ledger_ws_src.column_dimensions:
-                        ws.column_dimensions[col].width = ledger_ws_src.column_dimensions[col].width
-                    for col_idx, cell in enumerate(ledger_ws_src[1], start=1):
-                        new_cell = ws.cell(row=1, column=col_idx, value=cell.value)
-                        if cell.has_style:
-                            new_cell.font = copy(cell.font)
-                            new_cell.border = copy(cell.border)
-                            new_cell.fill = copy(cell.fill)
-                            new_cell.number_format = copy(cell.number_format)
-                            new_cell.protection = copy(cell.protection)
-                            new_cell.alignment = copy(cell.alignment)
-                    self._log(f"🆕 建立新隱藏分頁並複製完整標頭：{new_name}")
-            else:
-                # 完全不存在，直接建立原名分頁
-                ws = self.wb.create_sheet(subject_code)
-                for col in ledger_ws_src.column_dimensions:
-                    ws.column_dimensions[col].width = ledger_ws_src.column_dimensions[col].width
-                for col_idx, cell in enumerate(ledger_ws_src[1], start=1):
-                    new_cell = ws.cell(row=1, column=col_idx, value=cell.value)
-                    if cell.has_style:
-                        new_cell.font = copy(cell.font)
-                        new_cell.border = copy(cell.border)
-                        new_cell.fill = copy(cell.fill)
-                        new_cell.number_format = copy(cell.number_format)
-                        new_cell.protection = copy(cell.protection)
-                        new_cell.alignment = copy(cell.alignment)
-                self._log(f"🆕 建立新工作表並複製完整標頭：{subject_code}")
-
-            # ------ 找最後一列 ------
-            last_row = 1
-            for r in range(2, ws.max_row + 1):
-                a_val = ws[f"A{r}"].value
-                c_val = ws[f"C{r}"].value
-                d_val = ws[f"D{r}"].value
-                i_val = ws[f"I{r}"].value
-
-                # 檢查 A, C, D 欄位：必須有內容且不是空字串/空白
-                a_is_valid = a_val is not None and str(a_val).strip() != ""
-                c_is_valid = c_val is not None and str(c_val).strip() != ""
-                d_is_valid = d_val is not None and str(d_val).strip() != ""
-
-                # 檢查 I 欄位：必須有值 (is not None)，數值可以是 0 (因為 0 is not None 是 True)
-                i_is_valid = i_val is not None
-
-                if a_is_valid and c_is_valid and d_is_valid and i_is_valid:
-                    last_row = r
-
-            # ------ 插入新資料 ------
+        template = self._get_sheet_template()
+        provenance = InsertProvenance()  # 記錄本次每個分頁插入的列與分類帳來源列
+
+        # ------ 依目標分頁分組 (保持分類帳原始順序) ------
+        records_by_subject = defaultdict(list)
+        for subject_code, row_cells, row_values in records:
+            records_by_subject[subject_code].append((row_cells, row_values))
+
+        touched_sheets = []  # 本次有寫入的工作表 (依序、不重複)
+        balance_anchors = []  # (工作表, C 欄科目代號, 插入前最後有效列, 該列餘額)
+
+        for subject_code, block in records_by_subject.items():
+            self._check_cancel()
+
+            # ------ 判斷工作表名稱 (每個分頁只判斷一次) ------
+            ws = self._resolve_subject_sheet(subject_code, template)
+
+            # ------ 略過分頁中已存在的列 (重複執行時只寫入真正的差異) ------
+            block = self._skip_existing_rows(ws, subject_code, block)
+            if not block:
+                continue
+
+            # ------ 找最後一列 (A、C、D、I 欄皆有值的最後一列，取自分頁索引) ------
+            last_row, last_balance = self.sheet_index.get(ws)
+
+            # ------ 整批插入新資料 ------
             insert_row = last_row + 1
-            ws.insert_rows(insert_row)
-
-            for col_idx, src_cell in enumerate(row_cells, start=1):
-                dest = ws.cell(row=insert_row, column=col_idx, value=src_cell.value)
-                if src_cell.has_style:
-                    dest.font = copy(src_cell.font)
-                    dest.border = copy(src_cell.border)
-                    dest.fill = copy(src_cell.fill)
-                    dest.number_format = copy(src_cell.number_format)
-                    dest.protection = copy(src_cell.protection)
-                    dest.alignment = copy(src_cell.alignment)
-
-            self._mark_sheet_colors(ws)
-            updated_sheets.add(subject_code)
-            self._log(f"📄 已插入 {subject_code} 第 {insert_row} 列")
+            self._write_record_block(ws, insert_row, block)
+            self.sheet_index.note_insert(ws, insert_row, [row_values for _, row_values in block])
+            self.row_fingerprints.note_insert(ws, [row_values for _, row_values in block])
+
+            # 插入列以下的內容都可能位移，公式重算範圍從插入列到最後一列
+            self.session.mark_dirty(ws, insert_row)
+            if ws not in touched_sheets:
+                touched_sheets.append(ws)
+                # 餘額方向依 C 欄科目代號 (records 以分頁名稱分組，不一定是代號)
+                balance_anchors.append((ws, block[0][1][2], last_row, last_balance))
+            provenance.record(subject_code, ws.title, insert_row, [row_cells[0].row for row_cells, _ in block])
+            self._log(f"📄 已插入 {subject_code} 第 {insert_row}~{insert_row + len(block) - 1} 列（共 {len(block)} 筆）")
+
+        # ------ 餘額：插入列的 I 欄沿用分類帳順序的餘額，依分頁自身順序重算 ------
+        self._recompute_balances(balance_anchors)
+
+        # ------ 標色：每個異動分頁只做一次 (判斷一次算完，再逐頁套用) ------
+        self._mark_sheet_colors(touched_sheets)
 
         # ----------------------------------------------------
         # 🔹 呼叫獨立方法建立更新清單工作表
         # ----------------------------------------------------
-        self._create_update_summary_sheet(updated_sheets, make_month, latest_month)
+        if catch_up:
+            self._create_monthly_summary_sheets(provenance, make_month, latest_month)
+        else:
+            self._create_update_summary_sheet(provenance, make_month, latest_month)
         # ------ 儲存 ------
         base, ext = os.path.splitext(self.file_path)
         new_path = base + "_updated" + ext
@@ -620,118 +547,222 @@ class SubjectUpdateService:
         # 預設為 False，較為安全
         should_overwrite = CONFIG.get('file_handling.overwrite', default=False)
 
-        # 2. 判斷並執行對應的儲存動作
+        # 2. 決定存檔路徑 (共用工作階段時，後續模組也會寫到同一個路徑)
+        self.session.save_path = self.file_path if should_overwrite else new_path
+
+        if not self.auto_save:
+            self._log("🕒 更新結果暫存於記憶體，待所有模組完成後統一存檔。")
+            return
+
+        # 3. 判斷並執行對應的儲存動作
         if should_overwrite:
             # 執行覆蓋儲存 (Overwrite)
 
             # 使用 self.file_path (原始路徑)
-            self.wb.save(self.file_path)
+            self.session.save(self.file_path)
             self._log(f"💾 已儲存更新結果：覆蓋原始檔案 ({os.path.basename(self.file_path)})")
 
         else:
             # 執行另存新檔 (Save As)
 
             # 使用 new_path (計算出的新路徑)
-            self.wb.save(new_path)
+            self.session.save(new_path)
             self._log(f"💾 已另存新檔：{new_path}")
 
+    def _skip_existing_rows(self, ws, subject_code, block):
+        """
+        以列指紋 (日期、科目代號、摘要、借貸金額) 比對分頁既有內容，
+        只留下分頁中還沒有的分類帳列；相同指紋依出現次數扣抵。
+        刪除模組已刪掉的列 (借貸相抵的摘要群組) 不在分頁中，重新執行時會再次寫入。
+        """
+        keep = self.row_fingerprints.filter_new(ws, [row_values for _, row_values in block])
+        skipped = len(block) - len(keep)
+        if skipped:
+            if keep:
+                self._log(f"⏭️ {subject_code} 已有 {skipped} 筆相同明細，略過不重複寫入。")
+            else:
+                self._log(f"⏭️ {subject_code} 的 {skipped} 筆明細已全部存在，本次不寫入。")
+        return [block[idx] for idx in keep]
+
+    def _resolve_subject_sheet(self, subject_code, template: LedgerSheetTemplate):
+        """
+        找出科目對應的工作表，必要時建立：
+        - 已存在可見分頁 → 直接使用
+        - 只有隱藏分頁 → 使用 / 建立 @科目 分頁
+        - 完全不存在 → 建立原名分頁
+        """
+        # 去空白比對 (分頁名稱索引)
+        ws = self.sheet_names.find_visible(subject_code)
+        if ws is not None:
+            # 已存在可見分頁，直接使用
+            return ws
+
+        if self.sheet_names.find_hidden(subject_code) is not None:
+            # 已存在隱藏分頁，加 @ 後建立新的分頁
+            shadow = self.sheet_names.shadow(subject_code)
+            if shadow is not None:
+                return shadow  # 已有 @ 分頁，直接使用
+            new_name = f"{self.sheet_names.SHADOW_PREFIX}{subject_code}"
+            ws = self.sheet_names.create_sheet(new_name)
+            template.stamp(ws)
+            self._log(f"🆕 建立新隱藏分頁並複製完整標頭：{new_name}")
+            return ws
+
+        # 完全不存在，直接建立原名分頁
+        ws = self.sheet_names.create_sheet(subject_code)
+        template.stamp(ws)
+        self._log(f"🆕 建立新工作表並複製完整標頭：{subject_code}")
+        return ws
+
+    def _get_sheet_template(self) -> LedgerSheetTemplate:
+        """分類帳標頭範本 (欄寬 + 標頭列樣式)，每次執行只建立一次"""
+        if self._sheet_template is None:
+            self._sheet_template = LedgerSheetTemplate.from_sheet(self.wb[self.find_ledger_sheet()])
+        return self._sheet_template
+
+    def _write_record_block(self, ws, insert_row, block):
+        """
+        將同一分頁的多筆分類帳資料以連續區塊寫入 insert_row 起的位置。
+        - 區塊下方仍有內容 → 一次 insert_rows(amount=筆數)，只位移一次
+        - 區塊落在最後使用列之後 → 直接寫入，不位移任何儲存格
+        """
+        if ws.max_row >= insert_row:
+            ws.insert_rows(insert_row, amount=len(block))
+            self.session.note_rows_inserted(ws, insert_row, len(block))
+
+        for offset, (row_cells, row_values) in enumerate(block):
+            r = insert_row + offset
+            for col_idx, (src_cell, value) in enumerate(zip(row_cells, row_values), start=1):
+                # 沿用分類帳的樣式 ID，不另外複製樣式物件
+                clone_style(src_cell, ws.cell(row=r, column=col_idx, value=value))
+
     # 分頁操作紀錄
-    def _create_update_summary_sheet(self, updated_sheets, make_month, latest_month):
-        """建立本次更新清單工作表，並設為隱藏。"""
+    def _create_update_summary_sheet(self, provenance: InsertProvenance, make_month, latest_month):
+        """
+        建立本次更新清單工作表，並設為隱藏。
+        除科目代號與年月外，另記錄實際分頁、本次插入列與分類帳來源列，
+        刪除模組可據此只檢查本次插入牽涉到的摘要群組。
+        """
 
-        if not updated_sheets:
+        if not provenance:
             self._log(f"ℹ️ 本次沒有任何分頁被更新。")
             return
 
         summary_sheet_name = f"更新清單_{make_month}"
 
         # 若已存在同名分頁 → 先刪除
-        if summary_sheet_name in self.wb.sheetnames:
-            del self.wb[summary_sheet_name]
+        self.sheet_names.remove_sheet(summary_sheet_name)
 
-        ws_summary = self.wb.create_sheet(summary_sheet_name)
+        ws_summary = self.sheet_names.create_sheet(summary_sheet_name)
 
-        ws_summary["A1"] = "科目代號（分頁名稱）"
-        ws_summary["B1"] = "製作科餘月"
-        ws_summary["C1"] = "最新科餘月"
+        ws_summary.append(SUMMARY_HEADERS)
 
-        for idx, name in enumerate(sorted(updated_sheets), start=2):
-            ws_summary[f"A{idx}"] = name
-            ws_summary[f"B{idx}"] = make_month
-            ws_summary[f"C{idx}"] = latest_month
+        for name in sorted(provenance.subjects()):
+            entry = provenance.get(name)
+            ws_summary.append((
+                name, make_month, latest_month,
+                entry["sheet"], format_rows(entry["rows"]), format_rows(entry["ledger_rows"]),
+            ))
 
         # 設為隱藏
         ws_summary.sheet_state = "hidden"
 
         self._log(f"📝 已建立本次更新清單工作表：{summary_sheet_name}")
 
-    def _mark_sheet_colors(self, ws):
-        from openpyxl.styles import PatternFill
+    def _create_monthly_summary_sheets(self, provenance: InsertProvenance, make_month, latest_month):
+        """多月補帳：依分類帳來源列的月份拆分，每個月各建立一張更新清單"""
+        if not provenance:
+            self._log(f"ℹ️ 本次沒有任何分頁被更新。")
+            return
+
+        ledger_rows = [row for name in provenance.subjects() for row in provenance.get(name)["ledger_rows"]]
+        parts = provenance.split(self._get_ledger_frame().months_of(ledger_rows))
+
+        for month in DateService.months_between(latest_month, make_month):
+            if month in parts:
+                self._create_update_summary_sheet(parts[month], month, latest_month)
+            else:
+                self._log(f"ℹ️ {month} 沒有新增明細，不建立更新清單。")
 
-        yellow_fill = PatternFill(start_color="FFF6D6A8", end_color="FFF6D6A8", fill_type="solid")
-        red_fill = PatternFill(start_color="FFE1E5E9", end_color="FFE1E5E9", fill_type="solid")
+    # 🔸 標色規則使用的底色
+    DUPLICATE_REMARK_FILL = PatternFill(start_color="FFF6D6A8", end_color="FFF6D6A8", fill_type="solid")  # 黃
+    OFFSET_AMOUNT_FILL = PatternFill(start_color="FFE1E5E9", end_color="FFE1E5E9", fill_type="solid")  # 紅
 
+    def _recompute_balances(self, anchors):
+        """
+        從插入前最後一筆已核對的餘額起，以 F/G 欄累計重算各異動分頁的 I 欄，
+        只寫回數值有變動的儲存格。
+        新建分頁 (插入前沒有任何有效餘額) 無從核對起點，沿用分類帳的餘額。
+        餘額方向以科目代號首碼為預設，須與分頁 I 欄推得的方向一致才寫入
+        (備抵科目等方向相反、或 I 欄看不出方向時不覆寫，只記錄警告)。
+        """
+        for ws, subject_code, anchor_row, anchor_balance in anchors:
+            self._check_cancel()
+            sign = balance_sign(subject_code)
+            if not sign or to_cents(anchor_balance) is None:
+                continue
+
+            debit_votes, credit_votes = balance_votes(self.book, ws)
+            inferred = 1 if debit_votes and not credit_votes else -1 if credit_votes and not debit_votes else 0
+            if inferred != sign:
+                self._log(
+                    f"⚠️ 分頁「{ws.title}」I 欄推得的餘額方向與科目代號 {subject_code} 不一致"
+                    f"(借方 {debit_votes} 筆、貸方 {credit_votes} 筆)，不重算累計餘額。"
+                )
+                continue
+            written = recompute_running_balance(self.book, ws, sign, anchor_row, anchor_balance)
+            if written:
+                # 最後餘額已改變，下次查詢時重新掃描
+                self.sheet_index.invalidate(ws)
+                self._log(f"🧾 分頁「{ws.title}」重算累計餘額，更新 {written} 格 I 欄")
+
+    def _mark_sheet_colors(self, sheets):
+        """
+        以欄陣列計算標色 (每個異動分頁每次執行只做一次)：
+        - 規則 1：E 欄文字重複 → E 欄黃色
+        - 規則 2：任一列 F == 任一列 G (且不為 0) → 該列 F、G 紅色
+        各分頁的判斷為純計算，資料量大時分散到多個 process；
+        之後只對「底色需要改變」的儲存格寫入 fill。
+        """
         # ------------------------
-        # 第 1 步：一次把 E/F/G 欄資料收集起來
+        # 第 1 步：一次把各分頁 E/F/G 欄資料讀成陣列
         # ------------------------
-        E_vals = {}
-        F_vals = []
-        G_vals = []
-
-        for r in range(2, ws.max_row + 1):
-            E_vals.setdefault(ws[f"E{r}"].value, []).append(r)
-
-            F_vals.append((r, ws[f"F{r}"].value))
-            G_vals.append((r, ws[f"G{r}"].value))
-
-        # E 欄重複的值
-        duplicated_E = {k: rows for k, rows in E_vals.items() if k and len(rows) >= 2}
-
-        # 把所有 F/G 數值變成 set（便於比對）
-        F_set = set()
-        G_set = set()
-        for _, v in F_vals:
-            try:
-                F_set.add(float(v))
-            except:
-                pass
-        for _, v in G_vals:
-            try:
-                G_set.add(float(v))
-            except:
-                pass
+        columns_by_sheet = []
+        for ws in sheets:
+            columns = list(ws.iter_rows(min_row=2, min_col=5, max_col=7, values_only=True))
+            if columns:
+                e_vals, f_vals, g_vals = zip(*columns)
+                columns_by_sheet.append((ws, (list(e_vals), list(f_vals), list(g_vals))))
+
+        self._check_cancel()
+        decisions = find_color_marks_many([columns for _, columns in columns_by_sheet], **parallel_options(CONFIG))
 
         # ------------------------
-        # 第 2 步：開始標色
+        # 第 2 步：只套用有變化的底色
         # ------------------------
-
-        # 規則 1：E 欄文字重複 → 黃色
-        for rows in duplicated_E.values():
-            for r in rows:
-                ws[f"E{r}"].fill = yellow_fill
-
-        # 規則 2：任一列 F == 任一列 G → 紅色
-        for r, v in F_vals:
-            try:
-                fv = float(v)
-                if fv != 0 and fv in G_set:  # 新增 fv != 0
-                    ws[f"F{r}"].fill = red_fill
-                    ws[f"G{r}"].fill = red_fill
-            except:
-                pass
-
-        for r, v in G_vals:
-            try:
-                gv = float(v)
-                if gv != 0 and gv in F_set:  # 新增 gv != 0
-                    ws[f"F{r}"].fill = red_fill
-                    ws[f"G{r}"].fill = red_fill
-            except:
-                pass
-
-    def run_copy_data(self, make_month, latest_month):
-        """執行檢查通過後的下一步：更新科目分頁"""
-        self.update_subject_sheets(make_month, latest_month)
+        yellow_fill = self.DUPLICATE_REMARK_FILL
+        red_fill = self.OFFSET_AMOUNT_FILL
+
+        for (ws, _), (duplicated_idx, offset_idx) in zip(columns_by_sheet, decisions):
+            self._check_cancel()
+            for idx in duplicated_idx:
+                cell = ws.cell(row=idx + 2, column=5)
+                if cell.fill != yellow_fill:
+                    cell.fill = yellow_fill
+
+            for idx in offset_idx:
+                r = idx + 2
+                for col in (6, 7):
+                    cell = ws.cell(row=r, column=col)
+                    if cell.fill != red_fill:
+                        cell.fill = red_fill
+
+    def run_copy_data(self, make_month, latest_month, catch_up: bool = False):
+        """
+        執行檢查通過後的下一步：更新科目分頁
+        catch_up=True 為多月補帳模式 (每個月各建一張更新清單，其餘流程相同)
+        """
+        self.update_subject_sheets(make_month, latest_month, catch_up)
 
     def _popup(self, msg: str):
         """讓 Service 可以安全叫出彈窗（需要 app 才能 after 回主執行緒）"""
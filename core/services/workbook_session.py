@@ -0,0 +1,140 @@
+# core/services/workbook_session.py
+import os
+
+from core.services.cached_value_writer import write_cached_values
+from core.services.dual_view_workbook import DualViewWorkbook
+from core.services.formula_evaluator import FormulaEvaluator
+from core.services.formula_refs import RowDelete, RowInsert
+from core.services.row_fingerprint import RowFingerprintIndex
+from core.services.sheet_name_index import SheetNameIndex
+from core.services.subject_sheet_index import SubjectSheetIndex
+
+
+class WorkbookSession:
+    """
+    科餘主檔的共用工作階段（由 ExcelController 持有）：
+    - 整個流程只從磁碟解析一次主檔
+    - 同一份活體 workbook 依序交給 貼入 / 更新 / 刪除 模組
+    - 全部模組完成後統一存檔一次
+
+    book          : 雙視圖 cell store (公式 + 計算值)，見 DualViewWorkbook
+    wb            : 活體 workbook (= book.wb，所有寫入都在這份)
+    sheet_names   : 去空白分頁名稱索引，見 SheetNameIndex
+    subject_index : 科目分頁最後有效列 / 最後餘額索引，見 SubjectSheetIndex
+    row_fingerprints : 科目分頁明細列指紋 (重複執行時略過已存在的列)，見 RowFingerprintIndex
+
+    formulas      : 公式相依圖與計算器 (整個工作階段共用)，見 FormulaEvaluator
+
+    各模組修改分頁後呼叫 mark_dirty()；recalculate() 以內建公式計算器重算受影響的公式，
+    存檔時再把計算值寫回 xlsx，下一個步驟讀檔前不必再用 Excel 開檔重算。
+    """
+
+    def __init__(self, file_path: str, logger=None):
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"找不到檔案：{file_path}")
+
+        self.file_path = file_path
+        # 存檔路徑：預設覆蓋原檔；更新模組若設定為另存新檔會改寫此值
+        self.save_path = file_path
+        self.logger = logger or (lambda msg: print(msg))
+
+        self._book = None
+        self._sheet_names = None
+        self._subject_index = None
+        self._row_fingerprints = None
+        self._formulas = None
+
+    def _log(self, msg: str):
+        self.logger(msg)
+
+    # ---------- 載入 ----------
+
+    @property
+    def book(self) -> DualViewWorkbook:
+        if self._book is None:
+            self._log(f"📂 載入科餘檔：{os.path.basename(self.file_path)} ...")
+            self._book = DualViewWorkbook.load(self.file_path)
+        return self._book
+
+    @property
+    def wb(self):
+        return self.book.wb
+
+    @property
+    def sheet_names(self) -> SheetNameIndex:
+        if self._sheet_names is None:
+            self._sheet_names = SheetNameIndex(self.wb)
+        return self._sheet_names
+
+    @property
+    def subject_index(self) -> SubjectSheetIndex:
+        if self._subject_index is None:
+            self._subject_index = SubjectSheetIndex(self.book)
+        return self._subject_index
+
+    @property
+    def row_fingerprints(self) -> RowFingerprintIndex:
+        if self._row_fingerprints is None:
+            self._row_fingerprints = RowFingerprintIndex(self.book)
+        return self._row_fingerprints
+
+    @property
+    def formulas(self) -> FormulaEvaluator:
+        if self._formulas is None:
+            self._formulas = FormulaEvaluator(self.book)
+        return self._formulas
+
+    # ---------- 公式重算 ----------
+
+    def mark_dirty(self, ws, min_row: int = 1, max_row: int = None):
+        """
+        登記分頁有異動的列範圍 (可傳入 Worksheet 或分頁名稱)；
+        未指定列範圍時視為整張分頁，max_row 為 None 表示到最後一列
+        """
+        self.formulas.mark_dirty(ws if isinstance(ws, str) else ws.title, min_row, max_row)
+
+    def note_rows_inserted(self, ws, index: int, amount: int):
+        """ws.insert_rows(index, amount) 之後呼叫：調整參照此分頁的公式列號 (openpyxl 不會調整)"""
+        self._shift_rows(ws, RowInsert(index, amount))
+
+    def note_rows_deleted(self, ws, rows):
+        """刪除 rows 這些列之後呼叫 (delete_rows_compact)：調整參照此分頁的公式列號"""
+        self._shift_rows(ws, RowDelete(rows))
+
+    def _shift_rows(self, ws, shift):
+        rewritten = self.formulas.shift_rows(ws.title, shift)
+        if rewritten:
+            self._log(f"🔧 分頁「{ws.title}」列位移，已調整 {rewritten} 個公式的參照列號")
+
+    def recalculate(self) -> int:
+        """重算異動列範圍下游的公式，回傳計算值有變動的儲存格數"""
+        if self._book is None or self._formulas is None:
+            return 0
+        changed = self._formulas.recalculate()
+        if changed:
+            self._log(f"🧮 已重新計算 {changed} 個公式儲存格")
+        return changed
+
+    # ---------- 存檔 ----------
+
+    def save(self, path: str = None):
+        """
+        將目前的活體 workbook 寫回磁碟 (預設寫到 save_path)，回傳實際存檔路徑。
+        存檔前先重算異動的公式，存檔後把公式計算值寫回檔案 (已過期、無法重算的公式除外)。
+        """
+        if self._book is None:
+            return None
+        target = path or self.save_path
+        self.recalculate()
+        self._book.wb.save(target)
+        stale = self._formulas.stale if self._formulas is not None else ()
+        write_cached_values(target, self._book.cached_values_by_sheet(skip=stale))
+        return target
+
+    def close(self):
+        """放棄目前的記憶體內容 (不存檔)"""
+        self._book = None
+        self._sheet_names = None
+        self._subject_index = None
+        self._row_fingerprints = None
+        self._formulas = None
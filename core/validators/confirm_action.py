@@ -3,9 +3,10 @@ from tkinter import messagebox
 import re
 
 # ✅ validators/precheck.py
-def validate_before_action(file_path, tax_id, make_month, latest_month,tasks):
+def validate_before_action(file_path, tax_id, make_month, latest_month,tasks, catch_up=False):
     """
     驗證執行前輸入是否正確。
+    catch_up=True (多月補帳模式) 時允許跨年度的月份區間。
     回傳：
         (True, "通過檢查") 或 (False, "錯誤訊息")
     """
@@ -56,8 +57,8 @@ def validate_before_action(file_path, tax_id, make_month, latest_month,tasks):
         if (make_year < latest_year) or (make_year == latest_year and make_mon <= latest_mon):
             return False, "製表月份必須大於最新月份"
 
-        # 規則 2：如果年份差 1，latest_month 月份必須是 12 月
-        if make_year - latest_year == 1 and latest_mon != 12:
+        # 規則 2：如果年份差 1，latest_month 月份必須是 12 月 (多月補帳模式不限制)
+        if not catch_up and make_year - latest_year == 1 and latest_mon != 12:
             return False, f"最新月份年份小於製表年份 1，最新月份必須為 12 月"
 
 
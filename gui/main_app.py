@@ -113,6 +113,7 @@ class ExcelToolApp(ctk.CTk):
         self.option_insert = ctk.BooleanVar()
         self.option_update = ctk.BooleanVar()
         self.option_delete = ctk.BooleanVar()
+        self.option_catch_up = ctk.BooleanVar()  # 多月補帳模式
 
         checkbox_row = ctk.CTkFrame(tool_frame)
         checkbox_row.pack(anchor="w", padx=20, pady=5)  # ⭐ 讓 frame 填滿水平
@@ -135,6 +136,12 @@ class ExcelToolApp(ctk.CTk):
             text="🗑️ 科目明細刪除",
             variable=self.option_delete,
         ).pack(side="left", padx=10)
+
+        ctk.CTkCheckBox(
+            checkbox_row,
+            text="⏩ 多月補帳",
+            variable=self.option_catch_up,
+        ).pack(side="left", padx=10)
         # 建立水平容器（放執行與停止按鈕）
         button_row = ctk.CTkFrame(tool_frame)
         button_row.pack(pady=(10, 5), fill="x")  # ⭐ 讓 frame 填滿水平
@@ -269,7 +276,8 @@ class ExcelToolApp(ctk.CTk):
             tax_id=self.tax_id_box.get(),
             make_month=self.make_var.get(),
             latest_month=self.latest_var.get(),
-            tasks = [task[0] for task in tasks]  # 只傳任務代號列表
+            tasks = [task[0] for task in tasks],  # 只傳任務代號列表
+            catch_up=self.option_catch_up.get()
         )
         if not ok:
             messagebox.showwarning("錯誤", msg)
@@ -1,8 +1,11 @@
 from gui.main_app import ExcelToolApp
 import customtkinter as ctk
+import multiprocessing
 import os, sys
 
 if __name__ == "__main__":
+    # 打包成 exe 後，平行分析的子 process 需要這行才能正常啟動
+    multiprocessing.freeze_support()
     ctk.set_appearance_mode("dark")
 
 
@@ -0,0 +1,84 @@
+# tests/conftest.py
+import os
+import sys
+
+from openpyxl import Workbook
+
+import pytest
+
+# 讓測試可以直接 import core.* (與 main.py 從專案根目錄執行相同)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.services.workbook_session import WorkbookSession  # noqa: E402
+
+LEDGER_HEADERS = ["日期", "傳票", "科目代號", "科目名稱", "摘要", "借方", "貸方", "備註", "餘額"]
+# 科目代號 1 開頭為借方科目、2 開頭為貸方科目
+SUBJECTS = [("1101", "現金"), ("2102", "應付帳款"), ("1103", "存貨")]
+MONTHS = ("114-06", "114-07", "114-08", "114-09")
+# 每月每科目的明細：(摘要, 借方, 貸方)；「沖銷」一借一貸可互相抵銷
+MONTH_ROWS = [("進貨", 100, None), ("沖銷", 250, None), ("沖銷", None, 250), ("薪資", None, 42), ("單據", 3000.5, None)]
+
+
+def ledger_rows(subjects=SUBJECTS, months=MONTHS, month_rows=MONTH_ROWS):
+    """分類帳明細列 (不含表頭)：每個科目一列上期結轉，之後依月份列出明細並累計餘額"""
+    rows = [["上期結轉", None, code, name, "上期結轉", None, None, None, 0] for code, name in subjects]
+    balances = {code: 0 for code, _ in subjects}
+    for month in months:
+        for code, name in subjects:
+            sign = 1 if code.startswith("1") else -1
+            for k, (memo, debit, credit) in enumerate(month_rows, start=1):
+                balances[code] = round(balances[code] + sign * ((debit or 0) - (credit or 0)), 2)
+                rows.append([f"{month}-{k:02d}", f"V{k}", code, name, memo, debit, credit, None, balances[code]])
+    return rows
+
+
+def build_master(path, subjects=SUBJECTS, months=MONTHS, sheet_through="114-07"):
+    """
+    建立科餘主檔：資產負債表 (科目清單)、分類帳 (全部月份)、各科目分頁 (只到 sheet_through 月)。
+    """
+    wb = Workbook()
+    bs = wb.active
+    bs.title = "資產負債表"
+    bs.append(["代號", "名稱", "金額", "代號", "名稱", "金額"])
+    for code, name in subjects:
+        bs.append([code, name, 0] if code.startswith("1") else [None, None, None, code, name, 0])
+
+    ledger = wb.create_sheet("分類帳")
+    ledger.append(LEDGER_HEADERS)
+    sheets = {}
+    for code, name in subjects:
+        sheets[code] = wb.create_sheet(name)
+        sheets[code].append(LEDGER_HEADERS)
+
+    for row in ledger_rows(subjects, months):
+        ledger.append(row)
+        if row[0] != "上期結轉" and row[0][:6] <= sheet_through:
+            sheets[row[2]].append(row)
+    wb.save(path)
+    return str(path)
+
+
+@pytest.fixture
+def master_file(tmp_path):
+    """114 年 6~9 月的科餘主檔，科目分頁只更新到 7 月"""
+    return build_master(tmp_path / "科餘.xlsx")
+
+
+@pytest.fixture
+def make_session(tmp_path):
+    """
+    依 {分頁名稱: {座標: 值}} 建立 xlsx 並開成 WorkbookSession (log 丟棄)。
+    openpyxl 存出的檔案沒有公式快取值，公式的計算值一開始都是 None。
+    """
+    def _make(sheets: dict) -> WorkbookSession:
+        wb = Workbook()
+        wb.remove(wb.active)
+        for title, cells in sheets.items():
+            ws = wb.create_sheet(title)
+            for coord, value in cells.items():
+                ws[coord] = value
+        path = tmp_path / "科餘.xlsx"
+        wb.save(path)
+        return WorkbookSession(str(path), logger=lambda msg: None)
+
+    return _make
@@ -0,0 +1,45 @@
+# tests/test_append_paste.py
+from datetime import datetime
+
+import numpy as np
+
+from core.services.append_paste import matching_prefix, row_hashes
+
+EXISTING = [
+    ("114-07-01", "1101", "現金", "進貨", 100, None, 100),
+    ("114-07-02", "1101", "現金", "薪資", None, 42.5, 57.5),
+    ("114-07-03", "1101", "現金", "單據", 3000.5, None, 3058),
+]
+
+
+def test_cell_values_are_normalized():
+    # 工作表讀回的列 (None、int) 與 pandas 讀到的列 (NaN、float) 視為相同
+    sheet_rows = [("A", 100, None, datetime(2025, 7, 1)), ("B",)]
+    frame_rows = [("A", 100.0, float("nan"), datetime(2025, 7, 1)), ("B", np.nan, None, None)]
+    assert row_hashes(sheet_rows, 4).tolist() == row_hashes(frame_rows, 4).tolist()
+
+
+def test_width_truncates_and_pads():
+    assert row_hashes([("A", 1, "多出來的欄")], 2).tolist() == row_hashes([("A", 1)], 2).tolist()
+    assert row_hashes([("A",)], 3).tolist() == row_hashes([("A", None, None)], 3).tolist()
+    assert row_hashes([("A", True)], 2).tolist() != row_hashes([("A", "True")], 2).tolist()
+
+
+def test_matching_prefix_with_appended_rows():
+    width = 7
+    source = EXISTING + [("114-08-01", "1101", "現金", "進貨", 100, None, 3158)]
+    assert matching_prefix(row_hashes(EXISTING, width), row_hashes(source, width)) == 3
+    # 來源比工作表短 (例如重新匯出時少了最後幾列)
+    assert matching_prefix(row_hashes(EXISTING, width), row_hashes(EXISTING[:2], width)) == 2
+    assert matching_prefix(row_hashes([], width), row_hashes(source, width)) == 0
+
+
+def test_changed_middle_row_stops_the_prefix():
+    width = 7
+    source = list(EXISTING)
+    source[1] = ("114-07-02", "1101", "現金", "薪資", None, 42.4, 57.6)
+    assert matching_prefix(row_hashes(EXISTING, width), row_hashes(source, width)) == 1
+
+    source = list(EXISTING)
+    source[0] = ("114-06-30", *EXISTING[0][1:])
+    assert matching_prefix(row_hashes(EXISTING, width), row_hashes(source, width)) == 0
@@ -0,0 +1,118 @@
+# tests/test_cached_value_writer.py
+import zipfile
+from datetime import date, datetime
+
+import pytest
+from openpyxl import Workbook, load_workbook
+
+from core.services.cached_value_writer import _fill_sheet, write_cached_values
+
+
+def _formula_book(path, sheets):
+    """sheets：{工作表名稱: 公式儲存格數}；每個公式儲存格 = A 欄同列 + 1"""
+    wb = Workbook()
+    wb.remove(wb.active)
+    for title, count in sheets.items():
+        ws = wb.create_sheet(title)
+        for row in range(1, count + 1):
+            ws.cell(row, 1, row)
+            ws.cell(row, 2, f"=A{row}+1")
+    wb.save(path)
+    return path
+
+
+def _reopen(path):
+    with zipfile.ZipFile(path) as archive:
+        assert archive.testzip() is None
+        names = archive.namelist()
+    return names, load_workbook(path, data_only=True)
+
+
+def test_value_types_round_trip(tmp_path):
+    path = _formula_book(tmp_path / "book.xlsx", {"明細": 8})
+    values = {
+        "B1": 2,
+        "B2": 1234.56,
+        "B3": "現金 & <應付>",
+        "B4": True,
+        "B5": False,
+        "B6": "#DIV/0!",
+        "B7": datetime(2025, 7, 31),
+        "B8": date(2025, 8, 1),
+    }
+    assert write_cached_values(path, {"明細": values}) == 8
+
+    _, wb = _reopen(path)
+    ws = wb["明細"]
+    assert [ws.cell(row, 2).value for row in range(1, 7)] == [2, 1234.56, "現金 & <應付>", True, False, "#DIV/0!"]
+    assert ws["B6"].data_type == "e"
+    # 日期寫成序號，格式沿用儲存格原本的數字格式
+    assert ws["B7"].value == 45869
+    assert ws["B8"].value == 45870
+    # 公式本身不受影響
+    assert load_workbook(path)["明細"]["B3"].value == "=A3+1"
+
+
+@pytest.mark.parametrize("value", [float("inf"), float("-inf"), float("nan"), None, object()])
+def test_unrepresentable_values_are_left_empty(tmp_path, value):
+    path = _formula_book(tmp_path / "book.xlsx", {"明細": 2})
+    assert write_cached_values(path, {"明細": {"B1": value, "B2": 3}}) == 1
+
+    _, wb = _reopen(path)
+    assert wb["明細"]["B1"].value is None
+    assert wb["明細"]["B2"].value == 3
+    with zipfile.ZipFile(path) as archive:
+        xml = archive.read("xl/worksheets/sheet1.xml").decode("utf-8")
+    assert "inf" not in xml and "nan" not in xml
+
+
+def test_large_workbook_round_trip(tmp_path):
+    sheets = {"現金": 20000, "應付帳款": 5000, "未變動": 3000}
+    path = _formula_book(tmp_path / "book.xlsx", sheets)
+    with zipfile.ZipFile(path) as archive:
+        before = {info.filename: (info.compress_type, archive.read(info)) for info in archive.infolist()}
+
+    values = {title: {f"B{row}": row + 1 for row in range(1, count + 1)}
+              for title, count in sheets.items() if title != "未變動"}
+    assert write_cached_values(path, values) == 25000
+
+    names, wb = _reopen(path)
+    assert names == list(before)
+    assert [row[1] for row in wb["現金"].iter_rows(values_only=True)] == list(range(2, 20002))
+    assert wb["應付帳款"]["B5000"].value == 5001
+    assert wb["未變動"]["B1"].value is None
+
+    # 未填值的成員內容與壓縮方式不變
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            if info.filename != "xl/worksheets/sheet1.xml" and info.filename != "xl/worksheets/sheet2.xml":
+                assert (info.compress_type, archive.read(info)) == before[info.filename]
+
+
+def test_nothing_to_write_leaves_file_untouched(tmp_path):
+    path = _formula_book(tmp_path / "book.xlsx", {"明細": 2})
+    original = path.read_bytes()
+    assert write_cached_values(path, {}) == 0
+    assert write_cached_values(path, {"不存在": {"B1": 1}}) == 0
+    assert write_cached_values(path, {"明細": {}}) == 0
+    assert path.read_bytes() == original
+
+
+def test_fill_sheet_accepts_other_cell_forms():
+    xml = (
+        '<sheetData><row r="1">'
+        '<c r="A1"/>'
+        '<c r="B1" s="2" t="str"><f>A1&amp;"x"</f><v>old</v></c>'
+        '<c r="C1"><f t="shared" ref="C1:C2" si="0">A1+1</f></c>'
+        '<c r="D1" t="n"><f t="shared" si="0"/><v xml:space="preserve"> </v></c>'
+        '<c r="E1" t="s"><v>3</v></c>'
+        "</row></sheetData>"
+    )
+    filled, count = _fill_sheet(xml, {"A1": 9, "B1": 5, "C1": "ok", "D1": 1.5, "E1": 7})
+    assert count == 3
+    assert '<c r="A1"/>' in filled
+    assert '<c r="B1" s="2"><f>A1&amp;"x"</f><v>5</v></c>' in filled
+    assert '<c r="C1" t="str"><f t="shared" ref="C1:C2" si="0">A1+1</f><v>ok</v></c>' in filled
+    assert '<c r="D1"><f t="shared" si="0"/><v>1.5</v></c>' in filled
+    # 不是公式的儲存格不動
+    assert '<c r="E1" t="s"><v>3</v></c>' in filled
@@ -0,0 +1,124 @@
+# tests/test_confirm_action.py
+import pytest
+
+from core.actions import confirm_action
+
+TASKS = [("update_subjects", "科目更新"), ("delete_details", "科目明細刪除")]
+
+
+class _Label:
+    def configure(self, **kwargs):
+        pass
+
+
+class _Controller:
+    """記錄工作階段操作的假 controller；failures / cancel_after 控制各工具的結果"""
+
+    def __init__(self, app, failures=(), cancel_after=None):
+        self.app = app
+        self.file_path = "科餘.xlsx"
+        self.session = None
+        self.calls = []
+        self.failures = set(failures)
+        self.cancel_after = cancel_after
+
+    def open_session(self, file_path):
+        self.calls.append("open")
+        self.session = object()
+
+    def commit_session(self):
+        self.calls.append("commit")
+        self.session = None
+
+    def discard_session(self):
+        self.calls.append("discard")
+        self.session = None
+
+    def _run(self, action):
+        self.calls.append(action)
+        if action in self.failures:
+            raise ValueError(f"{action} 失敗")
+        if action == self.cancel_after:
+            self.app.cancel_requested = True
+        return "ok"
+
+    def run_update_subjects(self, file_path):
+        return self._run("update_subjects")
+
+    def run_delete_details(self, file_path):
+        return self._run("delete_details")
+
+
+class _App:
+    def __init__(self, **controller_options):
+        self.status_label = _Label()
+        self.logs = []
+        self.controller = _Controller(self, **controller_options)
+
+    def after(self, delay, func):
+        func()
+
+    def append_log(self, msg):
+        self.logs.append(msg)
+
+
+class _SyncThread:
+    def __init__(self, target, daemon=None):
+        self.target = target
+
+    def start(self):
+        self.target()
+
+
+@pytest.fixture
+def dialogs(monkeypatch):
+    shown = []
+    monkeypatch.setattr(confirm_action.threading, "Thread", _SyncThread)
+    monkeypatch.setattr(confirm_action.messagebox, "showinfo", lambda title, msg: shown.append(("info", msg)))
+    monkeypatch.setattr(confirm_action.messagebox, "showerror", lambda title, msg: shown.append(("error", msg)))
+    return shown
+
+
+def test_all_tools_done_commits_once(dialogs):
+    app = _App()
+    confirm_action.do_actions_sequential(app, TASKS)
+    assert app.controller.calls == ["open", "update_subjects", "delete_details", "commit"]
+    assert dialogs[0][0] == "info"
+
+
+def test_cancel_between_tools_keeps_finished_results(dialogs):
+    app = _App(cancel_after="update_subjects")
+    confirm_action.do_actions_sequential(app, TASKS)
+    assert app.controller.calls == ["open", "update_subjects", "commit"]
+    assert any("已完成的工具結果已儲存：科目更新" in msg for msg in app.logs)
+
+
+def test_cancel_before_any_tool_discards(dialogs):
+    app = _App()
+    app.controller.run_update_subjects = lambda path: pytest.fail("不應執行")
+    original_open = app.controller.open_session
+
+    def open_and_cancel(file_path):
+        original_open(file_path)
+        app.cancel_requested = True
+
+    app.controller.open_session = open_and_cancel
+    confirm_action.do_actions_sequential(app, TASKS)
+    assert app.controller.calls == ["open", "discard"]
+
+
+def test_error_after_finished_tool_says_nothing_was_saved(dialogs):
+    app = _App(failures={"delete_details"})
+    confirm_action.do_actions_sequential(app, TASKS)
+    assert app.controller.calls == ["open", "update_subjects", "delete_details", "discard"]
+    kind, msg = dialogs[0]
+    assert kind == "error"
+    assert "delete_details 失敗" in msg
+    assert "「科目更新」" in msg and "沒有儲存" in msg
+
+
+def test_error_in_single_tool_has_no_session_notice(dialogs):
+    app = _App(failures={"update_subjects"})
+    confirm_action.do_actions_sequential(app, TASKS[:1])
+    assert app.controller.calls == ["update_subjects", "discard"]
+    assert "沒有儲存" not in dialogs[0][1]
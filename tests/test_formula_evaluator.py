@@ -0,0 +1,165 @@
+# tests/test_formula_evaluator.py
+import random
+
+from openpyxl import load_workbook
+
+from core.services.formula_evaluator import _SpanIndex
+from core.services.row_compactor import delete_rows_compact
+
+
+def _values(session, title, *coords):
+    ws = session.wb[title]
+    return [session.book.value(ws[coord]) for coord in coords]
+
+
+def test_sum_chain_recalculates_downstream(make_session):
+    session = make_session({
+        "科目1": {"A1": 10, "A2": 20.5, "A3": 30, "A4": "=SUM(A1:A3)", "B1": "=A4-A1", "B2": "=+B1+(A2-1)"},
+        "彙總": {"A1": "='科目1'!B2", "A2": "=SUM(科目1!A1:A2,5)"},
+    })
+    session.mark_dirty("科目1")
+    session.mark_dirty("彙總")
+    session.recalculate()
+    assert _values(session, "科目1", "A4", "B1", "B2") == [60.5, 50.5, 70]
+    assert _values(session, "彙總", "A1", "A2") == [70, 35.5]
+
+    # 只登記異動列：下游 (含其他分頁) 跟著重算
+    ws = session.wb["科目1"]
+    ws["A2"] = 0.5
+    session.mark_dirty(ws, 2, 2)
+    assert session.recalculate() == 5
+    assert _values(session, "科目1", "A4", "B1", "B2") == [40.5, 30.5, 30]
+    assert _values(session, "彙總", "A1", "A2") == [30, 15.5]
+
+
+def test_rows_outside_dirty_range_are_not_recalculated(make_session):
+    session = make_session({"科目1": {"A1": 1, "A2": 2, "B1": "=A1", "B2": "=A2"}})
+    session.mark_dirty("科目1")
+    session.recalculate()
+
+    ws = session.wb["科目1"]
+    ws["A1"] = 100
+    ws["A2"] = 200
+    session.mark_dirty(ws, 1, 1)
+    session.recalculate()
+    assert _values(session, "科目1", "B1", "B2") == [100, 2]
+
+
+def test_if_is_left_untouched_and_not_saved(make_session):
+    session = make_session({"科目1": {"A1": 5, "A2": "=A1+1", "A3": "=IF(A2>0,A2,0)", "A4": "=A3+1"}})
+    session.mark_dirty("科目1")
+    session.recalculate()
+
+    ws = session.wb["科目1"]
+    assert _values(session, "科目1", "A2", "A3", "A4") == [6, None, None]
+    # 不支援的 IF 與讀取它的公式都視為過期，存檔時不寫計算值，公式原樣保留
+    assert {ws["A3"], ws["A4"]} <= session.formulas.stale
+    assert ws["A2"] not in session.formulas.stale
+
+    path = session.save()
+    saved = load_workbook(path, data_only=True)["科目1"]
+    assert [saved["A2"].value, saved["A3"].value, saved["A4"].value] == [6, None, None]
+    assert load_workbook(path)["科目1"]["A3"].value == "=IF(A2>0,A2,0)"
+
+
+def test_cycle_is_marked_stale(make_session):
+    session = make_session({"科目1": {"A1": 1, "B1": "=B2+A1", "B2": "=B1+1", "C1": "=B1", "D1": "=A1*2"}})
+    session.mark_dirty("科目1")
+    session.recalculate()
+
+    ws = session.wb["科目1"]
+    assert _values(session, "科目1", "B1", "B2", "C1") == [None, None, None]
+    assert {ws["B1"], ws["B2"], ws["C1"], ws["D1"]} <= session.formulas.stale
+
+
+def test_stale_cell_recovers_when_its_input_is_fixed(make_session):
+    session = make_session({"科目1": {"A1": "abc", "B1": "=A1+1"}})
+    session.mark_dirty("科目1")
+    session.recalculate()
+
+    ws = session.wb["科目1"]
+    assert ws["B1"] in session.formulas.stale  # 文字 + 1 → #VALUE!
+
+    ws["A1"] = 41
+    session.mark_dirty(ws, 1, 1)
+    session.recalculate()
+    assert session.book.value(ws["B1"]) == 42
+    assert ws["B1"] not in session.formulas.stale
+
+
+def test_formulas_follow_deleted_rows(make_session):
+    session = make_session({
+        "科目1": {"F2": 1, "F3": 2, "F4": 4, "F5": 8, "F6": 16, "F7": "=SUM(F2:F6)", "G1": "=F4", "G2": "=$F$6-F2"},
+        "彙總": {"A1": "=科目1!F7", "A2": "=SUM('科目1'!F3:F4)"},
+    })
+    ws = session.wb["科目1"]
+    delete_rows_compact(ws, [3, 4])
+    session.note_rows_deleted(ws, [3, 4])
+
+    assert ws["F5"].value == "=SUM(F2:F4)"
+    assert ws["G1"].value == "=#REF!"
+    assert ws["G2"].value == "=$F$4-F2"
+    assert session.wb["彙總"]["A1"].value == "=科目1!F5"
+    assert session.wb["彙總"]["A2"].value == "=SUM('科目1'!#REF!)"
+
+    session.recalculate()
+    assert session.book.value(ws["F5"]) == 25
+    assert session.book.value(session.wb["彙總"]["A1"]) == 25
+    assert ws["G1"] in session.formulas.stale
+
+
+def test_formulas_follow_inserted_rows(make_session):
+    session = make_session({"科目1": {"F2": 1, "F3": 2, "F4": "=SUM(F2:F3)", "G1": "=F3"}})
+    ws = session.wb["科目1"]
+    ws.insert_rows(3, 2)
+    session.note_rows_inserted(ws, 3, 2)
+    ws["F3"] = 10
+    ws["F4"] = 20
+    session.mark_dirty(ws, 3, 4)
+
+    assert ws["F6"].value == "=SUM(F2:F5)"
+    assert ws["G1"].value == "=F5"
+    session.recalculate()
+    assert session.book.value(ws["F6"]) == 33
+
+
+
+
+def test_running_totals(make_session):
+    n = 300
+    cells = {f"F{row}": row for row in range(2, n + 1)}
+    cells.update({f"H{row}": f"=SUM(F$2:F{row})" for row in range(2, n + 1)})
+    cells.update({f"J{row}": f"=H{row}-SUM(F{max(row - 2, 2)}:G{row})" for row in range(2, n + 1)})
+    session = make_session({"科目1": cells})
+    session.mark_dirty("科目1")
+    session.recalculate()
+    ws = session.wb["科目1"]
+    assert session.book.value(ws[f"H{n}"]) == sum(range(2, n + 1))
+
+    # 中間某列異動：它以下的累計 (151 個) 與視窗公式重算；J150~J152 的累計與視窗同減 150，值不變
+    ws["F150"] = 0
+    session.mark_dirty(ws, 150, 150)
+    assert session.recalculate() == 151 + 148
+    assert session.book.value(ws[f"H{n}"]) == sum(range(2, n + 1)) - 150
+    assert session.book.value(ws["J151"]) == session.book.value(ws["H148"])
+
+
+def test_span_index_matches_brute_force():
+    rng = random.Random(7)
+    index = _SpanIndex()
+    boxes = {}
+    for i in range(400):
+        r1, c1 = rng.randint(1, 40), rng.randint(1, 8)
+        box = (r1, c1, r1 + rng.randint(0, 30), c1 + rng.choice([0, 0, 1, 3, 100]))
+        cell = f"公式{i % 150}"  # 同一個公式可有多個範圍
+        index.add(cell, *box)
+        boxes.setdefault(cell, []).append(box)
+    for cell in [f"公式{i}" for i in range(0, 150, 7)]:
+        for box in boxes.pop(cell):
+            index.remove(cell, *box)
+
+    for row in range(1, 75):
+        for col in range(1, 12):
+            expected = {cell for cell, spans in boxes.items()
+                        if any(r1 <= row <= r2 and c1 <= col <= c2 for r1, c1, r2, c2 in spans)}
+            assert index.readers(row, col) == expected
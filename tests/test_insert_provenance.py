@@ -0,0 +1,45 @@
+# tests/test_insert_provenance.py
+import pytest
+
+from core.services.insert_provenance import InsertProvenance, format_rows, parse_rows
+
+
+@pytest.mark.parametrize("rows, text", [
+    ([], ""),
+    ([7], "7"),
+    ([30, 15, 17, 16, 16], "15-17,30"),
+    ([1, 2, 4, 5, 6, 9], "1-2,4-6,9"),
+])
+def test_format_parse_round_trip(rows, text):
+    assert format_rows(rows) == text
+    assert parse_rows(text) == sorted(set(rows))
+    assert format_rows(parse_rows(text)) == text
+
+
+@pytest.mark.parametrize("text", [None, "", "   "])
+def test_parse_blank(text):
+    assert parse_rows(text) == []
+
+
+@pytest.mark.parametrize("text", ["abc", "3-1", "0", "1,,2", "1-x", "-3"])
+def test_parse_invalid_returns_none(text):
+    assert parse_rows(text) is None
+
+
+def test_parse_accepts_spaces_and_numbers():
+    assert parse_rows(" 3 - 4 , 8") == [3, 4, 8]
+    assert parse_rows(12) == [12]
+
+
+def test_split_by_ledger_month():
+    provenance = InsertProvenance()
+    provenance.record("1101", "現金", 20, [5, 6])
+    provenance.record("1101", "現金", 40, [9])
+    provenance.record("2101", "應付", 8, [6])
+
+    parts = provenance.split({5: "11401", 6: "11402", 9: "11402"})
+    assert sorted(parts) == ["11401", "11402"]
+    assert parts["11401"].get("1101") == {"sheet": "現金", "rows": [20], "ledger_rows": [5]}
+    assert parts["11402"].get("1101") == {"sheet": "現金", "rows": [21, 40], "ledger_rows": [6, 9]}
+    assert parts["11402"].subjects() == ["1101", "2101"]
+    assert "2101" not in parts["11401"]
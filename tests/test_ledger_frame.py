@@ -0,0 +1,151 @@
+# tests/test_ledger_frame.py
+import pytest
+
+from conftest import build_master
+from core.services.dual_view_workbook import DualViewWorkbook
+from core.services.ledger_frame import MONTH_RE, LedgerFrame
+
+# (A 日期, C 科目代號, D 科目名稱, I 餘額)
+ROWS = [
+    ("上期結轉", "1101", "現金", 0),
+    ("上期結轉", "2102", "應付帳款", 150),
+    ("114-06-01", "1101", "現金", 100),
+    ("114/06/15", " 2102 ", " 應付帳款 ", "120.5"),
+    ("11407", "1101", "現金", 80.25),
+    ("114-07-31", None, "現金", 70),         # 科目代號空白
+    ("114-07-31", "4101", "營業收入", 900),   # 損益科目
+    ("114-07-31", "1103", "", 5),            # 科目名稱空白
+    ("114-07-31", "1103", "存貨", "abc"),     # 餘額不是數字
+    ("  114-08-01 ", "1101", "現金", 90),
+    ("114-08-31", "2102", "應付帳款", None),
+    ("114-09-01", "1103", "存貨", 1),
+    ("備註", "1101", "現金", 1),              # 日期無法解析
+    (None, None, None, None),
+    ("114-13-01", "1101", "現金", 1),         # 月份不合法
+]
+
+
+def _frame(rows=ROWS):
+    return LedgerFrame.from_columns(
+        list(range(2, len(rows) + 2)),
+        [r[0] for r in rows], [r[1] for r in rows], [r[2] for r in rows], [r[3] for r in rows])
+
+
+def test_columns_are_cleaned_once():
+    df = _frame().df
+    assert df["row"].tolist() == list(range(2, 17))
+    assert df["month"].tolist() == [-1, -1, 11406, 11406, 11407, 11407, 11407, 11407, 11407,
+                                    11408, 11408, 11409, -1, -1, -1]
+    assert df["is_carry"].tolist()[:3] == [True, True, False]
+    assert df.loc[3, ["code", "name", "date"]].tolist() == ["2102", "應付帳款", "114/06/15"]
+    assert df.loc[9, "date"] == "114-08-01"
+    assert df.loc[13, ["date", "code", "name"]].tolist() == ["", "", ""]
+
+
+def test_balance_is_integer_cents():
+    df = _frame().df
+    assert df["balance"].tolist()[:5] == [0, 15000, 10000, 12050, 8025]
+    assert df["has_balance"].tolist()[8] is False
+    assert df["has_balance"].tolist()[10] is False
+
+
+def test_masks():
+    frame = _frame()
+    assert frame.month_upto_mask(11407).tolist() == [True] * 9 + [False] * 6
+    assert frame.month_window_mask(11407, 11408).tolist() == [False] * 9 + [True, True] + [False] * 4
+    assert frame.balance_subject_mask().tolist() == [
+        True, True, True, True, True, False, False, False, False, True, False, True, True, False, True]
+
+
+def test_from_sheet_matches_from_columns(tmp_path):
+    book = DualViewWorkbook.load(build_master(tmp_path / "科餘.xlsx"))
+    ws = book["分類帳"]
+    from_sheet = LedgerFrame.from_sheet(book, ws).df
+    columns = list(zip(*ws.iter_rows(min_row=2, max_col=9, values_only=True)))
+    from_columns = LedgerFrame.from_columns(
+        list(range(2, ws.max_row + 1)), columns[0], columns[2], columns[3], columns[8]).df
+    assert from_sheet.equals(from_columns)
+
+
+# ---------- scan 與原本逐列迴圈比對 ----------
+
+def _old_check_rows(rows, target_int):
+    """原本 _filter_valid_rows / _validate_row 的判斷 (逐列)"""
+    valid = []
+    for row_number, (a, c, d, i) in enumerate(rows, start=2):
+        a_val = str(a).strip() if a else ""
+        c_val = str(c).strip() if c else ""
+        d_val = str(d).strip() if d else ""
+        m = MONTH_RE.match(a_val)
+        if m:
+            if int(m.group(1) + m.group(2)) > target_int and a_val != "上期結轉":
+                continue
+        elif a_val != "上期結轉":
+            continue
+        try:
+            float(i)
+        except (TypeError, ValueError):
+            continue
+        if not c_val or c_val[0] not in ("1", "2") or not d_val:
+            continue
+        valid.append((row_number, d_val))
+    return valid
+
+
+def _old_latest_rows(valid):
+    """原本 _get_last_rows_by_item：每個項目保留最後一筆 (依項目首次出現順序)"""
+    latest = {}
+    for row_number, d_val in valid:
+        latest[d_val] = row_number
+    return list(latest.items())
+
+
+def _old_window_rows(rows, start_int, end_int):
+    """原本 _find_records_in_ledger 的月份區間判斷 (A、D 欄不可空白)"""
+    found = []
+    for row_number, (a, _, d, _) in enumerate(rows, start=2):
+        a_val = str(a).strip() if a else ""
+        d_val = str(d).strip() if d else ""
+        if not a_val or not d_val:
+            continue
+        m = MONTH_RE.match(a_val)
+        if m and start_int < int(m.group(1) + m.group(2)) <= end_int:
+            found.append(row_number)
+    return found
+
+
+@pytest.mark.parametrize("latest_int, make_int", [(11406, 11407), (11407, 11409), (11409, 11412), (11405, 11406)])
+def test_scan_matches_old_loops(latest_int, make_int):
+    scan = _frame().scan(latest_int, make_int)
+    valid = _old_check_rows(ROWS, latest_int)
+
+    assert scan.check_rows["row"].tolist() == [row for row, _ in valid]
+    assert list(zip(scan.latest_rows["name"], scan.latest_rows["row"])) == _old_latest_rows(valid)
+    window = scan.window_rows[scan.window_rows["name"] != ""]
+    assert window["row"].tolist() == _old_window_rows(ROWS, latest_int, make_int)
+
+
+def test_scan_on_master_ledger(tmp_path):
+    book = DualViewWorkbook.load(build_master(tmp_path / "科餘.xlsx"))
+    ws = book["分類帳"]
+    rows = [(r[0], r[2], r[3], r[8]) for r in ws.iter_rows(min_row=2, max_col=9, values_only=True)]
+    scan = LedgerFrame.from_sheet(book, ws).scan(11407, 11409)
+
+    # 上期結轉 + 6、7 月；月份邊界：7 月最後一列算在檢查範圍，8 月第一列起進入區間
+    assert scan.check_rows["row"].tolist() == [row for row, _ in _old_check_rows(rows, 11407)]
+    assert scan.latest_rows["name"].tolist() == ["現金", "應付帳款", "存貨"]
+    assert scan.latest_rows["date"].tolist() == ["114-07-05"] * 3
+    assert scan.window_rows["row"].tolist() == _old_window_rows(rows, 11407, 11409)
+    assert scan.window_rows["date"].iloc[0] == "114-08-01"
+    assert len(scan.window_rows) == 2 * 3 * 5
+
+
+def test_scan_without_make_month_has_empty_window():
+    scan = _frame().scan(11409)
+    assert scan.window_rows.empty
+    assert list(scan.window_rows.columns) == list(scan.check_rows.columns)
+
+
+def test_months_of():
+    frame = _frame()
+    assert frame.months_of([4, 11, 13]) == {4: "11406", 11: "11408", 13: "11409"}
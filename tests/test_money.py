@@ -0,0 +1,76 @@
+# tests/test_money.py
+from decimal import Decimal
+
+import numpy as np
+import pytest
+
+from core.services.money import format_cents, from_cents, to_cents, to_cents_array
+
+
+@pytest.mark.parametrize("value, cents", [
+    (0.145, 15),
+    (1.005, 101),
+    (-0.005, -1),
+    (-2.675, -268),
+    (1234567.895, 123456790),
+    (12, 1200),
+    (True, 100),
+    ("  12.3 ", 1230),
+    ("-0.125", -13),
+    (Decimal("0.115"), 12),
+    (np.float64(0.285), 29),
+])
+def test_to_cents_rounds_half_up(value, cents):
+    assert to_cents(value) == cents
+
+
+@pytest.mark.parametrize("value", [None, "", "  ", "abc", "1,000", float("nan"), float("inf"), object()])
+def test_to_cents_non_numeric(value):
+    assert to_cents(value) is None
+
+
+MIXED = [0.145, 1.005, -0.005, -2.675, 1234567.895, 12, "12.3", "-0.125", 0.285,
+         -0.0049999999, 0.0049999996, 0.0050000001, -0.0050000001, 1e15 + 0.5,
+         True, Decimal("0.115"), np.float64(0.285), np.int64(7), " 12.5 ", "1_000", "Infinity",
+         None, "", "abc", "1,000", float("nan"), float("inf"), float("-inf")]
+NUMBERS = [-0.0049999999, 0.0049999996, 0.145, None, 2.675, -1.005, 3, float("nan"), 100.0]
+
+
+@pytest.mark.parametrize("values", [MIXED, NUMBERS], ids=["mixed", "numbers"])
+def test_to_cents_array_matches_to_cents(values):
+    cents, valid = to_cents_array(values)
+
+    assert cents.dtype == np.int64
+    assert valid.tolist() == [to_cents(v) is not None for v in values]
+    assert cents.tolist() == [to_cents(v) or 0 for v in values]
+
+
+def test_to_cents_array_matches_to_cents_near_half():
+    # 乘 100 後非常接近 .5 的值最容易因浮點誤差進位方向不同
+    values = [k / 1000 + 0.005 for k in range(-20000, 20000, 7)] + [k / 100 + 1e-9 for k in range(-500, 500)]
+    cents, valid = to_cents_array(values)
+    assert valid.all()
+    assert cents.tolist() == [to_cents(v) for v in values]
+
+
+def test_to_cents_array_out_of_int64_range_is_invalid():
+    cents, valid = to_cents_array([2 ** 60, 1])
+    assert cents.tolist() == [0, 100]
+    assert valid.tolist() == [False, True]
+
+
+def test_to_cents_array_empty():
+    cents, valid = to_cents_array([])
+    assert cents.tolist() == [] and valid.tolist() == []
+
+
+@pytest.mark.parametrize("cents, text, value", [
+    (0, "0.00", 0),
+    (1200, "12.00", 12),
+    (-5, "-0.05", -0.05),
+    (123456, "1234.56", 1234.56),
+])
+def test_format_and_from_cents(cents, text, value):
+    assert format_cents(cents) == text
+    assert from_cents(cents) == value
+    assert to_cents(from_cents(cents)) == cents
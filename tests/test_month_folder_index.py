@@ -0,0 +1,66 @@
+# tests/test_month_folder_index.py
+import glob
+import os
+
+import pytest
+
+from core.services.month_folder_index import MonthFolderIndex
+
+FILES = [
+    "分類帳.xlsx",
+    "分類帳_0101.xlsx",
+    "分類帳明細.xlsx",
+    "~$分類帳.xlsx",
+    ".分類帳.xlsx",
+    "資產負債表.xls",
+    "資產負債表_備份_2.xlsx",
+    "A01_綜合損益表.xlsx",
+    "~$A01_綜合損益表.xlsx",
+    "綜合損益表期別.xlsx",
+    "綜合損益期別表.xlsx",
+    "A01_財產目錄_舊.xlsx",
+]
+
+
+def _glob_candidates(folder, module_name):
+    """原本的 glob 搜尋 (MonthFolderIndex 取代前的寫法)"""
+    valid_files = []
+    for path in glob.glob(os.path.join(folder, f"{module_name}*")):
+        filename = os.path.basename(path)
+        if filename.startswith("~$"):
+            continue
+        name_stem, _ = os.path.splitext(filename)
+        if name_stem == module_name or name_stem.startswith(module_name + "_"):
+            valid_files.append(path)
+    return valid_files
+
+
+def _glob_vendor_candidates(folder, vendor_id, module_name):
+    fallback = glob.glob(os.path.join(folder, f"{vendor_id}_{module_name}*"))
+    return [f for f in fallback if not os.path.basename(f).startswith("~$")]
+
+
+@pytest.fixture
+def month_folder(tmp_path):
+    for name in FILES:
+        (tmp_path / name).write_bytes(b"")
+    return str(tmp_path)
+
+
+@pytest.mark.parametrize("module_name", ["分類帳", "資產負債表", "綜合損益表", "綜合損益期別表", "財產目錄", "不存在"])
+def test_candidates_match_glob(month_folder, module_name):
+    index = MonthFolderIndex(month_folder)
+    assert sorted(index.candidates(module_name)) == sorted(_glob_candidates(month_folder, module_name))
+
+
+@pytest.mark.parametrize("module_name", ["綜合損益表", "財產目錄", "分類帳"])
+def test_vendor_candidates_match_glob(month_folder, module_name):
+    index = MonthFolderIndex(month_folder)
+    assert (sorted(index.vendor_candidates("A01", module_name))
+            == sorted(_glob_vendor_candidates(month_folder, "A01", module_name)))
+
+
+def test_candidates_are_copies(month_folder):
+    index = MonthFolderIndex(month_folder)
+    index.candidates("分類帳").clear()
+    assert len(index.candidates("分類帳")) == 2
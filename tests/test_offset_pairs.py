@@ -0,0 +1,108 @@
+# tests/test_offset_pairs.py
+import pytest
+from openpyxl import load_workbook
+
+from core.services.SubjectDeleteService import SubjectDeleteService
+from core.services.offset_matcher import OffsetPair, match_offsetting_rows
+from core.services.subject_update_service import SubjectUpdateService
+from core.services.workbook_session import WorkbookSession
+
+
+def _pairs(rows, remarks, f_vals, g_vals, same_remark=False):
+    return [(p.debit_row, p.credit_row, p.amount)
+            for p in match_offsetting_rows("現金", rows, remarks, f_vals, g_vals, same_remark=same_remark)]
+
+
+def test_fifo_pairing():
+    rows = [2, 3, 4, 5, 6, 7]
+    remarks = ["A", "B", "C", "D", "E", "F"]
+    f_vals = [100, 100, None, None, None, 100]
+    g_vals = [None, None, 100, 100, 100, None]
+    # 借方 2、3 依序配到貸方 4、5；貸方 6 等待後配到借方 7
+    assert _pairs(rows, remarks, f_vals, g_vals) == [(2, 4, 10000), (3, 5, 10000), (7, 6, 10000)]
+
+
+def test_credit_before_debit():
+    assert _pairs([2, 3], ["x", "y"], [None, "250.00"], [250, None]) == [(3, 2, 25000)]
+
+
+def test_rows_with_both_sides_or_zero_are_skipped():
+    rows = [2, 3, 4, 5, 6]
+    f_vals = [100, 0, "abc", None, 100]
+    g_vals = [100, None, None, 0, None]
+    # 第 2 列同列借貸相等、第 3/5 列金額為 0、第 4 列不是數字：都不參與
+    assert _pairs(rows, [""] * 5, f_vals, g_vals) == []
+    assert _pairs(rows + [7], [""] * 6, f_vals + [None], g_vals + [100]) == [(6, 7, 10000)]
+
+
+def test_amounts_compared_in_cents():
+    assert _pairs([2, 3], ["", ""], [0.1 + 0.2, None], [None, "0.30"]) == [(2, 3, 30)]
+    assert _pairs([2, 3], ["", ""], [100.004, None], [None, 100.006]) == []
+
+
+def test_same_remark():
+    rows = [2, 3, 4]
+    remarks = ["進貨", "薪資", " 進貨 "]
+    f_vals = [100, None, None]
+    g_vals = [None, 100, 100]
+    assert _pairs(rows, remarks, f_vals, g_vals) == [(2, 3, 10000)]
+    assert _pairs(rows, remarks, f_vals, g_vals, same_remark=True) == [(2, 4, 10000)]
+
+
+def test_describe():
+    pair = OffsetPair("現金", 5, 9, 123456, "進貨", "退貨")
+    assert pair.rows == (5, 9)
+    assert pair.describe() == "分頁「現金」第 5 列 借 1234.56（進貨） ↔ 第 9 列 貸 1234.56（退貨）"
+
+
+@pytest.fixture
+def updated_session(master_file, monkeypatch):
+    monkeypatch.setattr("core.services.subject_update_service.CONFIG._config_data",
+                        {"file_handling": {"overwrite": True}})
+    session = WorkbookSession(master_file, logger=lambda msg: None)
+    SubjectUpdateService(master_file, logger=lambda msg: None, session=session).run_copy_data("11409", "11407")
+    return session
+
+
+def test_find_and_delete_offset_pairs(master_file, updated_session):
+    logs = []
+    service = SubjectDeleteService(master_file, logger=logs.append, session=updated_session)
+    pairs = service.find_offset_pairs("11409", "11407")
+
+    # 每個分頁 6~9 月各一組「沖銷」250 借貸
+    assert len(pairs) == 12
+    cash = [p for p in pairs if p.sheet_title == "現金"]
+    assert [p.rows for p in cash] == [(3, 4), (8, 9), (13, 14), (18, 19)]
+
+    message = service.delete_offset_pairs(pairs)
+    assert message == "✅ 沖銷明細刪除完成。共處理 3 個分頁，刪除 24 列。"
+    updated_session.save()
+
+    wb = load_workbook(master_file)
+    assert "沖銷" not in [row[4] for row in wb["現金"].iter_rows(min_row=2, values_only=True)]
+    assert wb["現金"].max_row == 1 + 20 - 8
+    assert {row[6] for row in wb["更新清單_11409"].iter_rows(min_row=2, values_only=True)} == {"已刪除"}
+
+
+def test_pair_that_stops_matching_is_not_deleted(master_file, updated_session):
+    logs = []
+    service = SubjectDeleteService(master_file, logger=logs.append, session=updated_session)
+    pairs = service.find_offset_pairs("11409", "11407")
+
+    # 審閱期間貸方金額被改掉 → 該組略過，其餘照刪
+    ws = updated_session.wb["現金"]
+    ws["G9"] = 249
+    message = service.delete_offset_pairs(pairs)
+
+    assert message == "✅ 沖銷明細刪除完成。共處理 3 個分頁，刪除 22 列。"
+    assert "⚠️ 內容已變動，略過：分頁「現金」第 8 列 借 250.00（沖銷） ↔ 第 9 列 貸 250.00（沖銷）" in logs
+    assert [(row[4], row[5], row[6]) for row in ws.iter_rows(min_row=2, values_only=True) if row[4] == "沖銷"] == [
+        ("沖銷", 250, None), ("沖銷", None, 249)]
+
+
+def test_missing_sheet_is_skipped(master_file, updated_session):
+    logs = []
+    service = SubjectDeleteService(master_file, logger=logs.append, session=updated_session)
+    ghost = OffsetPair("不存在", 2, 3, 100, "", "")
+    assert service.delete_offset_pairs([ghost]) == "✅ 沖銷明細刪除完成。共處理 1 個分頁，刪除 0 列。"
+    assert "⚠️ 找不到分頁「不存在」，已略過 1 組配對。" in logs
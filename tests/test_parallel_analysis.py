@@ -0,0 +1,119 @@
+# tests/test_parallel_analysis.py
+import random
+
+import pytest
+
+from core.services import parallel_analysis
+from core.services.money import to_cents
+from core.services.parallel_analysis import find_balanced_groups_many, find_color_marks_many, parallel_options
+
+REMARKS = ["進貨", " 進貨 ", "沖銷A", "沖銷B", "薪資", "", None, "單據1", "單據2"]
+AMOUNTS = [100, 250, 100.5, 42, 0, None, "", "abc", "250", 3000.5, -100]
+
+
+def _sheets(seed, count=5, max_rows=60):
+    rng = random.Random(seed)
+    sheets = []
+    for s in range(count):
+        n = 0 if s == 1 else rng.randint(1, max_rows)  # 含一張空白分頁
+        rows = list(range(2, n + 2))
+        remarks = [rng.choice(REMARKS) for _ in rows]
+        f_vals = [rng.choice(AMOUNTS) for _ in rows]
+        g_vals = [rng.choice(AMOUNTS) for _ in rows]
+        sheets.append((rows, remarks, f_vals, g_vals))
+    return sheets
+
+
+def _old_balanced_groups(rows, remarks, f_vals, g_vals):
+    """逐列分組 (原本的 dict 寫法)：摘要去空白後分組，F 合計 == G 合計的群組"""
+    groups = {}
+    for row, remark, f, g in zip(rows, remarks, f_vals, g_vals):
+        key = str(remark).strip() if remark is not None else ""
+        if not key:
+            continue
+        group = groups.setdefault(key, [[], 0, 0])
+        group[0].append(row)
+        group[1] += to_cents(f) or 0
+        group[2] += to_cents(g) or 0
+    return [(key, group_rows, sf, sg) for key, (group_rows, sf, sg) in groups.items() if sf == sg]
+
+
+def _old_color_marks(e_vals, f_vals, g_vals):
+    """原本 _mark_sheet_colors 的判斷 (以「分」比對金額)"""
+    counts = {}
+    for v in e_vals:
+        counts[v] = counts.get(v, 0) + 1
+    duplicated = [i for i, v in enumerate(e_vals) if v and counts[v] >= 2]
+
+    f_cents = [to_cents(v) for v in f_vals]
+    g_cents = [to_cents(v) for v in g_vals]
+    f_set = {c for c in f_cents if c is not None}
+    g_set = {c for c in g_cents if c is not None}
+    offset = [i for i, (f, g) in enumerate(zip(f_cents, g_cents))
+              if (f is not None and f != 0 and f in g_set) or (g is not None and g != 0 and g in f_set)]
+    return duplicated, offset
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_balanced_groups_match_old_grouping(seed):
+    sheets = _sheets(seed)
+    assert find_balanced_groups_many(sheets, max_workers=1) == [_old_balanced_groups(*s) for s in sheets]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_color_marks_match_old_loop(seed):
+    sheets = [(remarks, f_vals, g_vals) for _, remarks, f_vals, g_vals in _sheets(seed)]
+    assert find_color_marks_many(sheets, max_workers=1) == [_old_color_marks(*s) for s in sheets]
+
+
+def test_balanced_groups_example():
+    rows = [2, 3, 4, 5, 6, 7]
+    remarks = ["沖銷", "進貨", " 沖銷", "", "進貨", "薪資"]
+    f_vals = [100.1, 5, None, 7, None, 0]
+    g_vals = [None, None, "100.10", 7, 5, None]
+    assert find_balanced_groups_many([(rows, remarks, f_vals, g_vals)]) == [[
+        ("沖銷", [2, 4], 10010, 10010),
+        ("進貨", [3, 6], 500, 500),
+        ("薪資", [7], 0, 0),
+    ]]
+
+
+def test_process_pool_matches_serial(monkeypatch):
+    """shared memory + process pool 路徑 (workers=2、門檻 1 列) 與單一 process 結果相同"""
+    pools = []
+
+    class _CountingPool(parallel_analysis.ProcessPoolExecutor):
+        def __init__(self, *args, **kwargs):
+            pools.append(kwargs.get("max_workers"))
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(parallel_analysis, "ProcessPoolExecutor", _CountingPool)
+    sheets = _sheets(seed=42, count=7, max_rows=400)
+    serial = find_balanced_groups_many(sheets, max_workers=1)
+    assert find_balanced_groups_many(sheets, max_workers=2, min_rows=1) == serial
+
+    color_sheets = [(remarks, f_vals, g_vals) for _, remarks, f_vals, g_vals in sheets]
+    serial = find_color_marks_many(color_sheets, max_workers=1)
+    assert find_color_marks_many(color_sheets, max_workers=2, min_rows=1) == serial
+    assert pools == [2, 2]
+
+    # 低於門檻時不啟動 process pool
+    find_balanced_groups_many(sheets, max_workers=2, min_rows=10 ** 6)
+    assert pools == [2, 2]
+
+
+class _Config:
+    def __init__(self, values):
+        self.values = values
+
+    def get(self, key, default=None):
+        return self.values.get(key, default)
+
+
+@pytest.mark.parametrize("values, expected", [
+    ({}, {"max_workers": 1, "min_rows": 20000}),
+    ({"performance.parallel_workers": 0}, {"max_workers": None, "min_rows": 20000}),
+    ({"performance.parallel_workers": 4, "performance.parallel_min_rows": 10}, {"max_workers": 4, "min_rows": 10}),
+])
+def test_parallel_options(values, expected):
+    assert parallel_options(_Config(values)) == expected
@@ -0,0 +1,71 @@
+# tests/test_paste_manifest.py
+from openpyxl import Workbook, load_workbook
+
+from core.services.paste_manifest import MANIFEST_SHEET, PasteManifest
+from core.services.paste_plan import PastePlan
+from core.services.sheet_name_index import SheetNameIndex
+
+LEDGER = {"module": "分類帳", "sheet": "分類帳", "check": "LEDGER_DATE", "append": True}
+SIDE = {"module": "綜合損益期別表", "sheet": "綜合損益表-月份比較", "src_col_end": "SIDE_CROP_2", "dest_col_start": 26}
+
+
+def _tasks(*tasks):
+    return PastePlan(list(tasks)).tasks
+
+
+def test_recorded_target_is_skipped_after_reload(tmp_path):
+    ledger, side = _tasks(LEDGER, SIDE)
+    wb = Workbook()
+    manifest = PasteManifest(SheetNameIndex(wb))
+    assert not manifest.is_current(ledger, "h1")
+
+    manifest.record(ledger, "分類帳.xlsx", "h1")
+    manifest.record(side, "綜合損益期別表.xlsx", "h2")
+    assert manifest.write() is True
+    assert manifest.write() is False  # 沒有新紀錄不重建
+
+    path = tmp_path / "科餘.xlsx"
+    wb.save(path)
+    wb = load_workbook(path)
+    assert wb[MANIFEST_SHEET].sheet_state == "hidden"
+
+    manifest = PasteManifest(SheetNameIndex(wb))
+    assert manifest.is_current(ledger, "h1")
+    assert manifest.is_current(side, "h2")
+    assert manifest.write() is False
+
+
+def test_changed_source_or_crop_invalidates():
+    ledger, side = _tasks(LEDGER, SIDE)
+    manifest = PasteManifest(SheetNameIndex(Workbook()))
+    manifest.record(ledger, "分類帳.xlsx", "h1")
+    manifest.record(side, "綜合損益期別表.xlsx", "h2")
+
+    # 來源內容不同
+    assert not manifest.is_current(ledger, "h1-changed")
+    # 裁剪設定不同 (append、src_col_end、src_indices)
+    (not_append,) = _tasks({**LEDGER, "append": False})
+    assert not manifest.is_current(not_append, "h1")
+    (cropped,) = _tasks({**SIDE, "src_col_end": 3})
+    assert not manifest.is_current(cropped, "h2")
+    # 貼入位置不同 → 不同的貼入目標
+    (moved,) = _tasks({**SIDE, "dest_col_start": 30})
+    assert not manifest.is_current(moved, "h2")
+
+
+def test_rewrite_replaces_previous_records():
+    (ledger,) = _tasks(LEDGER)
+    wb = Workbook()
+    names = SheetNameIndex(wb)
+    manifest = PasteManifest(names)
+    manifest.record(ledger, "分類帳.xlsx", "h1")
+    manifest.write()
+
+    manifest = PasteManifest(names)
+    manifest.record(ledger, "分類帳_v2.xlsx", "h3")
+    manifest.write()
+
+    assert wb.sheetnames.count(MANIFEST_SHEET) == 1
+    manifest = PasteManifest(names)
+    assert manifest.is_current(ledger, "h3")
+    assert not manifest.is_current(ledger, "h1")
@@ -0,0 +1,36 @@
+# tests/test_paste_write.py
+import pandas as pd
+import pytest
+
+from core.services.subject_paste_service import SubjectPasteService
+
+
+@pytest.fixture
+def service(make_session, monkeypatch):
+    monkeypatch.setattr("core.services.subject_paste_service.CONFIG._config_data",
+                        {"performance": {"source_cache_mb": 0}})
+    session = make_session({"資產負債表": {"A1": "舊", "B1": 1, "A2": "舊", "B2": 2, "G1": "保留"}})
+    logs = []
+    service = SubjectPasteService(logger=logs.append)
+    service.session = session
+    service.sheet_names = session.sheet_names
+    service.logs = logs
+    return service
+
+
+def _cells(service, *coords):
+    ws = service.session.wb["資產負債表"]
+    return [ws[coord].value for coord in coords]
+
+
+def test_write_logs_the_last_written_row(service):
+    df = pd.DataFrame([["現金", 100], ["存貨", 200], ["應付", 300]])
+    service._write_sheet_data_from_df(service.session.wb, df, "資產負債表", 1, 1, max_col_limit=6)
+    assert _cells(service, "A1", "B3", "G1") == ["現金", 300, "保留"]
+    assert service.logs == ["      ✅ 已更新 3 筆資料 (範圍: A1~B3)"]
+
+
+def test_empty_crop_only_clears_old_rows(service):
+    service._write_sheet_data_from_df(service.session.wb, pd.DataFrame(columns=[0, 1]), "資產負債表", 1, 1)
+    assert _cells(service, "A1", "B1", "A2", "B2", "G1") == [None, None, None, None, "保留"]
+    assert service.logs == ["      ⚠️ 來源裁剪後沒有資料，已清除分頁 [資產負債表] 原有內容"]
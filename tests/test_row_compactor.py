@@ -0,0 +1,74 @@
+# tests/test_row_compactor.py
+from openpyxl import Workbook
+from openpyxl.cell.cell import MergedCell
+
+from core.services.row_compactor import delete_rows_compact, merge_runs
+
+
+def test_merge_runs():
+    assert merge_runs([9, 3, 5, 4, 4]) == [(3, 5), (9, 9)]
+    assert merge_runs([]) == []
+
+
+def test_cells_and_row_dimensions_move_up():
+    wb = Workbook()
+    ws = wb.active
+    for r in range(1, 9):
+        ws.cell(row=r, column=1, value=r)
+    ws.row_dimensions[6].height = 30
+
+    assert delete_rows_compact(ws, [2, 3, 3, 5]) == 3
+    assert [ws.cell(row=r, column=1).value for r in range(1, 6)] == [1, 4, 6, 7, 8]
+    assert ws.max_row == 5
+    assert ws.row_dimensions[3].height == 30
+
+
+def test_merged_ranges_shrink_move_or_unmerge():
+    wb = Workbook()
+    ws = wb.active
+    for r in range(1, 11):
+        ws.cell(row=r, column=2, value=f"b{r}")
+    ws.merge_cells("E1:F1")   # 刪除列之上：不動
+    ws.merge_cells("B2:C4")   # 左上角被刪：縮成 B2:C3
+    ws.merge_cells("B6:C6")   # 整段被刪：取消合併
+    ws.merge_cells("D7:D8")   # 只剩一格：取消合併
+    ws.merge_cells("B9:C10")  # 整段上移
+
+    delete_rows_compact(ws, [2, 6, 8])
+
+    assert sorted(r.coord for r in ws.merged_cells.ranges) == ["B2:C3", "B6:C7", "E1:F1"]
+    assert not isinstance(ws["B2"], MergedCell)
+    assert ws["B2"].value is None  # 原左上角的值隨被刪列消失 (同 Excel)
+    assert isinstance(ws["C3"], MergedCell)
+    assert ws["B6"].value == "b9"
+    assert not isinstance(ws["D6"], MergedCell)
+
+
+def _grid(ws):
+    return {(c.row, c.column): (c.value, c.font.b, c.fill.fgColor.rgb)
+            for row in ws.iter_rows() for c in row if c.value is not None}
+
+
+def test_matches_delete_rows_bottom_up():
+    """與原本「由下往上逐列 ws.delete_rows(r, 1)」的結果相同 (值與樣式)"""
+    from openpyxl.styles import Font, PatternFill
+
+    rows_to_delete = [2, 3, 7, 8, 9, 15, 20]
+    sheets = []
+    for _ in range(2):
+        ws = Workbook().active
+        for r in range(1, 21):
+            for c in range(1, 5):
+                cell = ws.cell(row=r, column=c, value=f"{r}-{c}")
+                if r % 3 == 0:
+                    cell.font = Font(bold=True)
+                    cell.fill = PatternFill("solid", start_color="FFFFFF00")
+        sheets.append(ws)
+
+    compact, baseline = sheets
+    delete_rows_compact(compact, rows_to_delete)
+    for r in sorted(rows_to_delete, reverse=True):
+        baseline.delete_rows(r, 1)
+
+    assert _grid(compact) == _grid(baseline)
+    assert compact.max_row == baseline.max_row == 13
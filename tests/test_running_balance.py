@@ -0,0 +1,99 @@
+# tests/test_running_balance.py
+from openpyxl import Workbook
+
+from conftest import LEDGER_HEADERS
+from core.services.running_balance import balance_sign, balance_votes, recompute_running_balance
+from core.services.subject_update_service import SubjectUpdateService
+from core.services.workbook_session import WorkbookSession
+
+
+def _session(tmp_path, rows):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "科目"
+    ws.append(LEDGER_HEADERS)
+    for row in rows:
+        ws.append(row)
+    path = tmp_path / "科餘.xlsx"
+    wb.save(path)
+    return WorkbookSession(str(path), logger=lambda msg: None)
+
+
+def _row(date, debit, credit, balance, code="1101", name="現金"):
+    return [date, None, code, name, "摘要", debit, credit, None, balance]
+
+
+def _balances(session):
+    ws = session.wb["科目"]
+    return [session.book.value(ws.cell(row, 9)) for row in range(2, ws.max_row + 1)]
+
+
+def test_balance_sign():
+    assert [balance_sign(code) for code in ["1101", " 2102", "4101", None, ""]] == [1, -1, 0, 0, 0]
+
+
+def test_debit_subject(tmp_path):
+    # 第 4 列起是剛插入的分類帳餘額 (999 為錯誤值)；第 5 列為合計列，不是明細
+    session = _session(tmp_path, [
+        _row("114-07-01", 100, None, 100),
+        _row("114-07-02", None, 30, 70),
+        _row("114-08-01", "0.10", None, 999),
+        [None, None, None, None, "合計", "=SUM(F2:F4)", None, None, None],
+        _row("114-08-02", 0.2, 50, 20.3),
+    ])
+    ws = session.wb["科目"]
+    # 只有第 2→3 列的餘額差符合借方方向；999 前後的差額兩個方向都不符，不投票
+    assert balance_votes(session.book, ws) == (1, 0)
+    assert recompute_running_balance(session.book, ws, 1, 3, 70) == 1
+    assert _balances(session) == [100, 70, 70.1, None, 20.3]
+
+
+def test_credit_subject(tmp_path):
+    session = _session(tmp_path, [
+        _row("114-07-01", None, 500, 500, "2102", "應付帳款"),
+        _row("114-07-02", 200, None, 300, "2102", "應付帳款"),
+        _row("114-08-01", None, 42.5, 0, "2102", "應付帳款"),
+        _row("114-08-02", 100, 100, 0, "2102", "應付帳款"),  # 借貸相抵：不投票
+        _row("114-08-03", 10, None, "abc", "2102", "應付帳款"),  # 餘額不是數字：不投票
+    ])
+    ws = session.wb["科目"]
+    assert balance_votes(session.book, ws) == (0, 1)
+    assert recompute_running_balance(session.book, ws, -1, 3, 300) == 3
+    assert _balances(session) == [500, 300, 342.5, 342.5, 332.5]
+
+
+def test_too_few_rows_have_no_votes(tmp_path):
+    session = _session(tmp_path, [_row("114-07-01", 100, None, 100)])
+    assert balance_votes(session.book, session.wb["科目"]) == (0, 0)
+
+
+def test_formula_balance_is_not_overwritten(tmp_path):
+    session = _session(tmp_path, [
+        _row("114-07-01", 100, None, 100),
+        _row("114-08-01", 20, None, "=I2+F3-G3"),
+        _row("114-08-02", 5, None, 0),
+    ])
+    ws = session.wb["科目"]
+    assert recompute_running_balance(session.book, ws, 1, 2, 100) == 1
+    assert ws["I3"].value == "=I2+F3-G3"
+    assert ws["I4"].value == 125
+
+
+def test_mixed_votes_skip_recompute(tmp_path, monkeypatch):
+    monkeypatch.setattr("core.services.subject_update_service.CONFIG._config_data",
+                        {"file_handling": {"overwrite": True}})
+    # 1 開頭但餘額依貸方方向累計 (例如備抵科目)，其中一列又剛好符合借方方向
+    session = _session(tmp_path, [
+        _row("114-07-01", None, 100, 100, "1109", "累計折舊"),
+        _row("114-07-02", None, 50, 150, "1109", "累計折舊"),
+        _row("114-08-01", 30, None, 180, "1109", "累計折舊"),
+        _row("114-08-02", 7, None, 1, "1109", "累計折舊"),
+    ])
+    ws = session.wb["科目"]
+    assert balance_votes(session.book, ws) == (1, 1)
+
+    logs = []
+    service = SubjectUpdateService(session.file_path, logger=logs.append, session=session)
+    service._recompute_balances([(ws, "1109", 3, 150)])
+    assert _balances(session) == [100, 150, 180, 1]
+    assert logs == ["⚠️ 分頁「科目」I 欄推得的餘額方向與科目代號 1109 不一致(借方 1 筆、貸方 1 筆)，不重算累計餘額。"]
@@ -0,0 +1,118 @@
+# tests/test_source_cache.py
+import itertools
+import os
+
+import pandas as pd
+import pytest
+
+from core.services import source_cache
+from core.services.source_cache import SourceCache
+
+
+@pytest.fixture
+def reads(monkeypatch):
+    """計算來源檔被開啟讀取的次數 (快取自己的 index.json 不算)"""
+    opened = []
+    real_open = open
+
+    def counting_open(path, mode="r", *args, **kwargs):
+        if "b" in mode and "r" in mode:
+            opened.append(os.path.basename(path))
+        return real_open(path, mode, *args, **kwargs)
+
+    monkeypatch.setattr(source_cache, "open", counting_open, raising=False)
+    clock = itertools.count(1)
+    monkeypatch.setattr(source_cache.time, "time", lambda: next(clock))
+    return opened
+
+
+class _Parser:
+    """假的解析函式：DataFrame 內容為檔案位元組，並記錄呼叫次數"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, source):
+        self.calls += 1
+        return pd.DataFrame({"data": list(source.read())})
+
+
+def _write(path, content: bytes, mtime_ns=None):
+    path.write_bytes(content)
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+    return str(path)
+
+
+def test_miss_then_hit(tmp_path, reads):
+    cache = SourceCache(str(tmp_path / "cache"), 10 * 1024 * 1024)
+    parse = _Parser()
+    path = _write(tmp_path / "分類帳.xlsx", b"abc")
+
+    df, digest, hit = cache.load(path, parse)
+    assert (hit, parse.calls, df["data"].tolist()) == (False, 1, [97, 98, 99])
+    # 未命中時來源檔只讀一次，解析與雜湊共用
+    assert reads == ["分類帳.xlsx"]
+
+    # 新的實例 (下次執行) 由磁碟上的索引命中，不讀來源檔
+    again, again_digest, hit = SourceCache(str(tmp_path / "cache"), 10 * 1024 * 1024).load(path, parse)
+    assert (hit, parse.calls, again_digest) == (True, 1, digest)
+    assert again.equals(df)
+    assert reads == ["分類帳.xlsx"]
+
+
+def test_touched_file_with_same_content_is_a_hit(tmp_path, reads):
+    cache = SourceCache(str(tmp_path / "cache"), 10 * 1024 * 1024)
+    parse = _Parser()
+    path = _write(tmp_path / "分類帳.xlsx", b"abc", mtime_ns=1_000_000_000)
+    _, digest, _ = cache.load(path, parse)
+
+    _write(tmp_path / "分類帳.xlsx", b"abc", mtime_ns=2_000_000_000)
+    assert cache.load(path, parse)[1:] == (digest, True)
+    assert parse.calls == 1
+
+
+def test_stale_entry_is_parsed_again(tmp_path, reads):
+    cache = SourceCache(str(tmp_path / "cache"), 10 * 1024 * 1024)
+    parse = _Parser()
+    path = _write(tmp_path / "分類帳.xlsx", b"abc", mtime_ns=1_000_000_000)
+    _, old_digest, _ = cache.load(path, parse)
+    reads.clear()
+
+    _write(tmp_path / "分類帳.xlsx", b"abcd", mtime_ns=2_000_000_000)
+    df, digest, hit = cache.load(path, parse)
+    assert (hit, parse.calls, df["data"].tolist()) == (False, 2, [97, 98, 99, 100])
+    assert digest != old_digest
+    # 比對雜湊與重新解析共用同一次讀取
+    assert reads == ["分類帳.xlsx"]
+    assert cache.load(path, parse)[1:] == (digest, True)
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, reads):
+    cache_dir = tmp_path / "cache"
+    probe = SourceCache(str(tmp_path / "probe"), 10 * 1024 * 1024)
+    probe.load(_write(tmp_path / "probe.xlsx", b"x" * 100), _Parser())
+    entry_bytes = next(iter(probe._load_index().values()))["bytes"]
+
+    cache = SourceCache(str(cache_dir), int(entry_bytes * 2.5))  # 最多放得下兩筆
+    parse = _Parser()
+    a, b, c = (_write(tmp_path / f"{name}.xlsx", name.encode() * 100) for name in "abc")
+    cache.load(a, parse)
+    cache.load(b, parse)
+    assert cache.load(a, parse)[2] is True  # a 變成最近使用
+
+    cache.load(c, parse)  # 超過上限 → 淘汰最久未用的 b
+    assert parse.calls == 3
+    assert cache.load(a, parse)[2] is True
+    assert cache.load(c, parse)[2] is True
+    assert cache.load(b, parse)[2] is False
+    assert len(list(cache_dir.glob("*.pkl"))) == 2
+
+
+def test_entry_larger_than_the_limit_is_not_stored(tmp_path, reads):
+    cache = SourceCache(str(tmp_path / "cache"), 10)
+    parse = _Parser()
+    path = _write(tmp_path / "分類帳.xlsx", b"abc")
+    assert cache.load(path, parse)[2] is False
+    assert cache.load(path, parse)[2] is False
+    assert parse.calls == 2
@@ -0,0 +1,89 @@
+# tests/test_subject_update_rerun.py
+from collections import Counter
+
+import pytest
+from openpyxl import load_workbook
+
+from conftest import build_master, ledger_rows
+from core.services.SubjectDeleteService import SubjectDeleteService
+from core.services.row_fingerprint import row_fingerprint
+from core.services.subject_update_service import SubjectUpdateService
+from core.services.workbook_session import WorkbookSession
+
+
+@pytest.fixture(autouse=True)
+def overwrite_in_place(monkeypatch):
+    monkeypatch.setattr("core.services.subject_update_service.CONFIG._config_data",
+                        {"file_handling": {"overwrite": True}})
+
+
+def _service(path, logs=None, session=None):
+    return SubjectUpdateService(path, logger=(logs.append if logs is not None else lambda msg: None),
+                                session=session)
+
+
+def test_last_row_inside_window_is_compared_before_the_window(tmp_path):
+    # 分頁已經寫到 8 月 (例如上次更新後又重新執行同一個區間)
+    path = build_master(tmp_path / "科餘.xlsx", sheet_through="114-08")
+    logs = []
+    result = _service(path, logs).run_check("11407", "11409")
+
+    assert result["status"] == "success", result["message"]
+    assert any("末端已有本次區間的 5 筆明細，改以第 11 列餘額比對" in msg for msg in logs)
+
+
+def test_last_row_inside_window_still_reports_real_mismatch(tmp_path):
+    path = build_master(tmp_path / "科餘.xlsx", sheet_through="114-08")
+    wb = load_workbook(path)
+    wb["現金"]["I11"] = 1  # 7 月最後一列的餘額與分類帳不符
+    wb.save(path)
+
+    result = _service(path).run_check("11407", "11409")
+    assert result["status"] == "error"
+    assert "現金" in result["message"]
+
+
+def test_without_make_month_last_row_is_compared_as_is(tmp_path):
+    path = build_master(tmp_path / "科餘.xlsx", sheet_through="114-08")
+    assert _service(path).run_check("11407")["status"] == "error"
+
+
+def test_rerun_after_partial_delete(master_file):
+    session = WorkbookSession(master_file, logger=lambda msg: None)
+    _service(master_file, session=session).run_copy_data("11409", "11407")
+    SubjectDeleteService(master_file, logger=lambda msg: None, session=session).run_delete("11409", "11407")
+    session.save()
+
+    # 刪除模組刪掉了 6~9 月的「沖銷」列 (含本次區間的 4 列)，分頁末端只剩部分區間明細
+    tail = [row[4] for row in load_workbook(master_file)["現金"].iter_rows(min_row=8, values_only=True)]
+    assert tail == ["進貨", "薪資", "單據", "進貨", "薪資", "單據"]
+
+    logs = []
+    service = _service(master_file, logs)
+    result = service.run_check("11407", "11409")
+    assert result["status"] == "success", result["message"]
+    assert any("末端已有本次區間的 6 筆明細" in msg for msg in logs)
+
+    # 已知行為：被刪除模組刪掉的區間明細在分頁中已不存在，重新執行會再寫入 (之後再跑刪除模組即可)
+    service.run_copy_data("11409", "11407")
+    assert "⏭️ 現金 已有 6 筆相同明細，略過不重複寫入。" in logs
+    assert "📄 已插入 現金 第 14~17 列（共 4 筆）" in logs
+
+
+def test_last_before_consumes_duplicate_fingerprints(tmp_path):
+    path = build_master(tmp_path / "科餘.xlsx", sheet_through="114-08")
+    session = WorkbookSession(path, logger=lambda msg: None)
+    ws = session.wb["現金"]
+
+    august = [row for row in ledger_rows() if row[2] == "1101" and row[0].startswith("114-08")]
+    fingerprints = Counter(row_fingerprint(tuple(row[:7])) for row in august)
+    assert session.subject_index.last_before(ws, fingerprints) == (11, ws["I11"].value, 5)
+
+    # 同一筆明細在區間中只出現一次：分頁末端的兩筆相同明細只能抵掉一筆
+    ws.append(august[-1])
+    assert session.subject_index.last_before(ws, fingerprints)[0] == 16
+
+    # 整張分頁都是區間明細
+    everything = Counter(row_fingerprint(tuple(row[:7])) for row in ledger_rows() if row[2] == "1101")
+    everything[row_fingerprint(tuple(august[-1][:7]))] += 1
+    assert session.subject_index.last_before(ws, everything) == (1, None, 16)
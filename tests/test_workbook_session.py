@@ -0,0 +1,117 @@
+# tests/test_workbook_session.py
+import hashlib
+
+import pytest
+from openpyxl import load_workbook
+from openpyxl.reader.excel import ExcelReader
+from openpyxl.workbook.workbook import Workbook
+
+from core.controllers.excel_controller import ExcelController
+from core.services.SubjectDeleteService import SubjectDeleteService
+from core.services.subject_update_service import SubjectUpdateService
+from core.services.workbook_session import WorkbookSession
+
+
+@pytest.fixture
+def io_counter(monkeypatch):
+    """計算解析 xlsx (ExcelReader.read) 與存檔 (Workbook.save) 的次數"""
+    counts = {"read": 0, "save": 0}
+    original_read, original_save = ExcelReader.read, Workbook.save
+
+    def read(self, *args, **kwargs):
+        counts["read"] += 1
+        return original_read(self, *args, **kwargs)
+
+    def save(self, *args, **kwargs):
+        counts["save"] += 1
+        return original_save(self, *args, **kwargs)
+
+    monkeypatch.setattr(ExcelReader, "read", read)
+    monkeypatch.setattr(Workbook, "save", save)
+    return counts
+
+
+def _digest(path):
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def _sheet_rows(path, title):
+    return [row for row in load_workbook(path)[title].iter_rows(values_only=True)]
+
+
+def test_update_and_delete_share_one_load_and_one_save(master_file, io_counter, monkeypatch):
+    monkeypatch.setattr("core.services.subject_update_service.CONFIG._config_data",
+                        {"file_handling": {"overwrite": True}})
+    before = _digest(master_file)
+    session = WorkbookSession(master_file, logger=lambda msg: None)
+
+    SubjectUpdateService(master_file, logger=lambda msg: None, session=session).run_copy_data("11409", "11407")
+    SubjectDeleteService(master_file, logger=lambda msg: None, session=session).run_delete("11409", "11407")
+
+    # 兩個模組都只改記憶體，尚未寫檔
+    assert io_counter == {"read": 1, "save": 0}
+    assert _digest(master_file) == before
+
+    assert session.save() == master_file
+    assert io_counter == {"read": 1, "save": 1}
+
+    rows = _sheet_rows(master_file, "現金")
+    assert "更新清單_11409" in load_workbook(master_file).sheetnames
+    # 7 月以前 10 列 + 8、9 月各 5 列，刪除模組再刪掉互相抵銷的「沖銷」8 列
+    assert len(rows) == 1 + 10 + 10 - 8
+    assert [row[0] for row in rows[-3:]] == ["114-09-01", "114-09-04", "114-09-05"]
+
+
+class _FakeApp:
+    def __init__(self):
+        self.logs = []
+
+    def append_log(self, msg):
+        self.logs.append(msg)
+
+
+def test_controller_commit_session_saves_once(master_file, io_counter):
+    controller = ExcelController(_FakeApp())
+    session = controller.open_session(master_file)
+    ws = session.wb["現金"]
+    ws.append(["114-08-01", "V9", "1101", "現金", "手動", 1, None, None, None])
+
+    controller.commit_session()
+    assert controller.session is None
+    assert io_counter == {"read": 1, "save": 1}
+    assert _sheet_rows(master_file, "現金")[-1][4] == "手動"
+
+    controller.commit_session()  # 沒有工作階段時不動作
+    assert io_counter["save"] == 1
+
+
+def test_controller_discard_session_leaves_file_untouched(master_file, io_counter):
+    before = _digest(master_file)
+    app = _FakeApp()
+    controller = ExcelController(app)
+    session = controller.open_session(master_file)
+    session.wb["現金"].append(["114-08-01", "V9", "1101", "現金", "手動", 1, None, None, None])
+
+    controller.discard_session()
+    assert controller.session is None
+    assert io_counter == {"read": 1, "save": 0}
+    assert _digest(master_file) == before
+    assert any("已放棄" in msg for msg in app.logs)
+
+
+def test_session_is_not_loaded_until_used(master_file, io_counter):
+    session = WorkbookSession(master_file, logger=lambda msg: None)
+    assert session.save() is None
+    assert session.recalculate() == 0
+    assert io_counter == {"read": 0, "save": 0}
+
+    assert session.sheet_names.get("現金") is session.wb["現金"]
+    assert session.book is session.book
+    assert io_counter["read"] == 1
+
+
+def test_missing_file_raises(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        WorkbookSession(str(tmp_path / "不存在.xlsx"))
+